@@ -0,0 +1,28 @@
+"""
+Role checks for staff-only endpoints.
+
+The caller's role is read from the users table on every request rather than
+from the token, so a changed role takes effect straight away.
+"""
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from database import get_db_connection
+
+STAFF_ROLES = ('staff', 'course_lead', 'wellbeing_officer', 'admin')
+
+
+def staff_required(view):
+    """401 without a valid access token, 403 unless it belongs to a staff user"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        conn = get_db_connection()
+        try:
+            user = conn.execute('SELECT role FROM users WHERE id = ?', (get_jwt_identity(),)).fetchone()
+        finally:
+            conn.close()
+        if user is None or user['role'] not in STAFF_ROLES:
+            return jsonify({'error': 'Staff access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
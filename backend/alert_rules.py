@@ -0,0 +1,237 @@
+"""
+Incremental alert rules over wellbeing and attendance records.
+
+Each source table has a persisted watermark (the last record id evaluated),
+so a run only reads records added since the previous one. Candidate alerts
+are deduplicated against open (unread) alerts of the same type for the same
+student through the (student_id, is_read) alerts index, then inserted with
+one executemany().
+
+Thresholds live in AlertRuleConfig; set ALERT_RULES to a JSON object of
+field overrides, e.g. {"high_stress_at_or_above": 9, "disabled": ["low_sleep"]}.
+"""
+import json
+import os
+from dataclasses import dataclass, fields
+
+ALERT_TYPES = ('high_stress', 'low_sleep', 'concerning_mood', 'low_attendance')
+
+
+@dataclass
+class AlertRuleConfig:
+    """Thresholds and switches for the alert rules"""
+    high_stress_at_or_above: int = 8
+    low_sleep_at_or_below: int = 3
+    concerning_moods: tuple = ()           # case-insensitive; empty disables the rule
+    low_attendance_below: float = 0.70
+    attendance_window_days: int = 14
+    attendance_min_classes: int = 5
+    lookback_days: int = 7                 # records older than this never alert
+    disabled: tuple = ()                   # alert types to skip
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a config from user input, coercing values to the field types"""
+        types = {'high_stress_at_or_above': int, 'low_sleep_at_or_below': int,
+                 'attendance_window_days': int, 'attendance_min_classes': int,
+                 'lookback_days': int, 'low_attendance_below': float}
+        values = {}
+        for f in fields(cls):
+            if f.name in data and data[f.name] is not None:
+                value = data[f.name]
+                values[f.name] = tuple(value) if f.name in ('concerning_moods', 'disabled') \
+                    else types[f.name](value)
+        config = cls(**values)
+        config.validate()
+        return config
+
+    def validate(self):
+        unknown = set(self.disabled) - set(ALERT_TYPES)
+        if unknown:
+            raise ValueError(f'Unknown alert types: {", ".join(sorted(unknown))}')
+        if not 0 <= self.low_attendance_below <= 1:
+            raise ValueError('low_attendance_below must be between 0 and 1')
+        if self.attendance_window_days < 1 or self.lookback_days < 1:
+            raise ValueError('attendance_window_days and lookback_days must be positive')
+
+    def enabled(self, alert_type):
+        if alert_type == 'concerning_mood' and not self.concerning_moods:
+            return False
+        return alert_type not in self.disabled
+
+
+def load_config():
+    """Rule config from the ALERT_RULES environment variable, if set"""
+    raw = os.environ.get('ALERT_RULES')
+    return AlertRuleConfig.from_dict(json.loads(raw)) if raw else AlertRuleConfig()
+
+
+config = load_config()
+
+
+def configure(new_config):
+    """Replace the active rule config; returns the previous one"""
+    global config
+    previous, config = config, new_config
+    return previous
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _wellbeing_alerts(c, rules, after_id, upto_id):
+    """(student_id, alert_type, message) for new wellbeing records"""
+    conditions = []
+    params = []
+    if rules.enabled('high_stress'):
+        conditions.append('stress_level >= ?')
+        params.append(rules.high_stress_at_or_above)
+    if rules.enabled('low_sleep'):
+        conditions.append('sleep_level <= ?')
+        params.append(rules.low_sleep_at_or_below)
+    moods = [m.lower() for m in rules.concerning_moods]
+    if rules.enabled('concerning_mood'):
+        conditions.append('lower(mood) IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(moods))
+    if not conditions:
+        return
+
+    c.execute(f'''SELECT student_id, stress_level, sleep_level, mood
+                  FROM wellbeing_records
+                  WHERE id > ? AND id <= ?
+                  AND recorded_date >= datetime('now', '-' || ? || ' days')
+                  AND ({' OR '.join(conditions)})
+                  ORDER BY id''',
+              [after_id, upto_id, rules.lookback_days] + params)
+    for student_id, stress, sleep, mood in c.fetchall():
+        if (rules.enabled('high_stress') and _is_number(stress)
+                and stress >= rules.high_stress_at_or_above):
+            yield (student_id, 'high_stress',
+                   f'High stress level ({stress}/10) reported. Mood: {mood or "Not specified"}')
+        if (rules.enabled('low_sleep') and _is_number(sleep)
+                and sleep <= rules.low_sleep_at_or_below):
+            yield student_id, 'low_sleep', f'Low sleep quality ({sleep}/10) reported.'
+        if rules.enabled('concerning_mood') and mood and mood.lower() in moods:
+            yield student_id, 'concerning_mood', f'Concerning mood reported: {mood}.'
+
+
+def _attendance_alerts(c, rules, after_id, upto_id):
+    """low_attendance alerts for students with new attendance records"""
+    if not rules.enabled('low_attendance'):
+        return
+    # Only students touched by new records are re-rated, each over its own
+    # window through the (student_id, class_date) index
+    c.execute('''SELECT s.id, s.first_name, s.last_name,
+                        SUM(CASE WHEN a.present = 1 THEN 1 ELSE 0 END) AS present_count,
+                        COUNT(*) AS total_classes
+                 FROM students s
+                 JOIN attendance a ON a.student_id = s.id
+                 WHERE s.id IN (SELECT DISTINCT student_id FROM attendance
+                                WHERE id > ? AND id <= ?
+                                AND class_date >= date('now', '-' || ? || ' days'))
+                 AND a.class_date >= date('now', '-' || ? || ' days')
+                 GROUP BY s.id
+                 HAVING COUNT(*) >= ?
+                 AND CAST(present_count AS FLOAT) / COUNT(*) < ?''',
+              (after_id, upto_id, rules.attendance_window_days, rules.attendance_window_days,
+               rules.attendance_min_classes, rules.low_attendance_below))
+    for student_id, first, last, present, total in c.fetchall():
+        rate = present / total
+        yield (student_id, 'low_attendance',
+               f'Low attendance ({round(rate * 100, 1)}%) - below '
+               f'{round(rules.low_attendance_below * 100)}% threshold. '
+               f'Student {first} {last} requires intervention.')
+
+
+# source -> (table, date column the first run looks back over, evaluator)
+SOURCES = {
+    'wellbeing': ('wellbeing_records', "recorded_date >= datetime('now', '-' || ? || ' days')",
+                  _wellbeing_alerts),
+    'attendance': ('attendance', "class_date >= date('now', '-' || ? || ' days')",
+                   _attendance_alerts),
+}
+
+
+def _watermark(c, source, rules):
+    """Last evaluated record id; the first run starts `lookback_days` back"""
+    c.execute('SELECT last_id FROM alert_watermarks WHERE source = ?', (source,))
+    row = c.fetchone()
+    if row is not None:
+        return row[0]
+    table, recent, _ = SOURCES[source]
+    c.execute(f'SELECT MIN(id) - 1 FROM {table} WHERE {recent}', (rules.lookback_days,))
+    start = c.fetchone()[0]
+    if start is None:
+        c.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        start = c.fetchone()[0]
+    return start
+
+
+def _set_watermark(c, source, last_id):
+    c.execute('''INSERT INTO alert_watermarks (source, last_id) VALUES (?, ?)
+                 ON CONFLICT(source) DO UPDATE
+                 SET last_id = excluded.last_id, updated_at = CURRENT_TIMESTAMP''',
+              (source, last_id))
+
+
+def mark_processed(c, sources=tuple(SOURCES)):
+    """Advance watermarks past every existing record without evaluating it"""
+    for source in sources:
+        table = SOURCES[source][0]
+        c.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        _set_watermark(c, source, c.fetchone()[0])
+
+
+def evaluate(c, sources=tuple(SOURCES), rules=None):
+    """Evaluate records added since the watermarks and insert new alerts
+
+    Must run inside a write transaction so that concurrent runs see each
+    other's watermarks. Returns {alerts_created, processed, alerts}.
+    """
+    rules = rules or config
+    candidates = {}
+    processed = {}
+    for source in sources:
+        table, _, evaluator = SOURCES[source]
+        after_id = _watermark(c, source, rules)
+        c.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        upto_id = c.fetchone()[0]
+        processed[source] = max(upto_id - after_id, 0)
+        if upto_id <= after_id:
+            continue
+        # Several new records of one kind for a student raise one alert
+        for student_id, alert_type, message in evaluator(c, rules, after_id, upto_id):
+            candidates[(student_id, alert_type)] = message
+        _set_watermark(c, source, upto_id)
+
+    alerts = []
+    if candidates:
+        c.execute('''SELECT student_id, alert_type FROM alerts
+                     WHERE is_read = 0
+                     AND student_id IN (SELECT value FROM json_each(?))''',
+                  (json.dumps(sorted({student_id for student_id, _ in candidates})),))
+        open_alerts = {tuple(row) for row in c.fetchall()}
+        alerts = [(student_id, alert_type, message)
+                  for (student_id, alert_type), message in candidates.items()
+                  if (student_id, alert_type) not in open_alerts]
+        c.executemany('INSERT INTO alerts (student_id, alert_type, message) VALUES (?, ?, ?)', alerts)
+
+    return {
+        'alerts_created': len(alerts),
+        'processed': processed,
+        'alerts': [{'student_id': s, 'alert_type': t, 'message': m} for s, t, m in alerts],
+    }
+
+
+def run(conn, sources=tuple(SOURCES), rules=None):
+    """evaluate() in its own write transaction"""
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        result = evaluate(c, sources, rules)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
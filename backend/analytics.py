@@ -0,0 +1,74 @@
+"""
+Shared analytics queries.
+
+Fact tables are aggregated per student first and only the small per-student
+results are joined, so a student's attendance rows never multiply with their
+grades. Functions return (query, params) for execution or streaming.
+"""
+
+# Per-student attendance, optionally limited to the last `days` days
+ATTENDANCE_BY_STUDENT = '''
+    SELECT student_id,
+           SUM(CASE WHEN present = 1 THEN 1 ELSE 0 END) AS present_count,
+           COUNT(*) AS total_classes
+    FROM attendance
+    {where}
+    GROUP BY student_id
+'''
+
+GRADES_BY_STUDENT = '''
+    SELECT student_id,
+           AVG(grade) AS avg_grade,
+           MIN(grade) AS min_grade,
+           MAX(grade) AS max_grade,
+           COUNT(*) AS grade_count
+    FROM grades
+    GROUP BY student_id
+'''
+
+
+def _attendance_by_student(days=None):
+    if days is None:
+        return ATTENDANCE_BY_STUDENT.format(where=''), []
+    return (ATTENDANCE_BY_STUDENT.format(where="WHERE class_date >= date('now', '-' || ? || ' days')"),
+            [days])
+
+
+def performance_by_attendance():
+    """Every student's average grade alongside their overall attendance rate"""
+    att, params = _attendance_by_student()
+    query = f'''
+        WITH att AS ({att}), gr AS ({GRADES_BY_STUDENT})
+        SELECT s.id, s.first_name, s.last_name,
+               gr.avg_grade,
+               CAST(att.present_count AS FLOAT) / NULLIF(att.total_classes, 0) AS attendance_rate,
+               COALESCE(att.total_classes, 0) AS total_attendance_records
+        FROM students s
+        LEFT JOIN gr ON gr.student_id = s.id
+        LEFT JOIN att ON att.student_id = s.id
+        ORDER BY gr.avg_grade DESC
+    '''
+    return query, params
+
+
+def attendance_grades_correlation(days):
+    """Attendance rate over the last `days` days and grade summary per student
+
+    Only students with attendance in the window are included.
+    """
+    att, params = _attendance_by_student(days)
+    query = f'''
+        WITH att AS ({att}), gr AS ({GRADES_BY_STUDENT})
+        SELECT s.id, s.first_name, s.last_name,
+               att.present_count,
+               att.total_classes,
+               CAST(att.present_count AS FLOAT) / att.total_classes AS attendance_rate,
+               gr.avg_grade,
+               gr.min_grade,
+               gr.max_grade
+        FROM att
+        JOIN students s ON s.id = att.student_id
+        LEFT JOIN gr ON gr.student_id = att.student_id
+        ORDER BY attendance_rate DESC
+    '''
+    return query, params
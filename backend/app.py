@@ -1,53 +1,115 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, jsonify, request
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
-import json
-from datetime import datetime, timedelta
-from database import init_db, seed_sample_data
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config['JWT_SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)
-
-CORS(app)
-jwt = JWTManager(app)
-
-# Initialize database
-init_db()
-
-# Import routes
-from routes import auth, wellbeing, attendance, grades, alerts
-
-# Register blueprints
-app.register_blueprint(auth.bp)
-app.register_blueprint(wellbeing.bp)
-app.register_blueprint(attendance.bp)
-app.register_blueprint(grades.bp)
-app.register_blueprint(alerts.bp)
-
-@app.route('/health', methods=['GET'])
+from flask_jwt_extended import JWTManager
+import os
+from datetime import timedelta
+from database import init_db, init_app, get_pool, seed_sample_data
+import cache
+import hashing
+import notifications
+import write_queue
+from responses import compress_response
+
+DEFAULT_CONFIG = {
+    'JWT_SECRET_KEY': os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production'),
+    'JWT_ACCESS_TOKEN_EXPIRES': timedelta(days=30),
+    # Create/upgrade the schema while building the app. wsgi.py turns this
+    # off and checks the schema once per deployment instead.
+    'INIT_DB': True,
+}
+
+# Health, metrics and seeding endpoints plus app-wide error handlers
+bp = Blueprint('core', __name__)
+
+def create_app(config=None):
+    """Build the Flask app; `config` overrides DEFAULT_CONFIG"""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+
+    # The SPA is served from another origin; let it read the paging cursor
+    CORS(app, expose_headers=['X-Next-Cursor'])
+    JWTManager(app)
+
+    # Initialize database and return pooled connections after each request
+    if app.config['INIT_DB']:
+        init_db()
+    init_app(app)
+    app.after_request(compress_response)
+
+    from routes import auth, wellbeing, attendance, grades, alerts, exports
+
+    app.register_blueprint(bp)
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(wellbeing.bp)
+    app.register_blueprint(attendance.bp)
+    app.register_blueprint(grades.bp)
+    app.register_blueprint(alerts.bp)
+    app.register_blueprint(exports.bp)
+    return app
+
+def __getattr__(name):
+    # `from app import app` builds the default app on first use, so importing
+    # create_app (as wsgi.py does) has no side effects
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+@bp.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy'}), 200
 
-@app.route('/api/seed-data', methods=['POST'])
+@bp.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Runtime metrics for the connection pool, caches, queues, hashing, alert streams and jobs"""
+    import scheduler
+
+    return jsonify({
+        'db_pool': get_pool().stats(),
+        'response_cache': cache.stats(),
+        'write_queue': write_queue.stats(),
+        'alert_stream': notifications.hub.stats(),
+        'password_hashing': hashing.stats(),
+        'scheduler': {
+            'process': scheduler.stats(),
+            'jobs': scheduler.job_status()
+        }
+    }), 200
+
+@bp.route('/api/seed-data', methods=['POST'])
 def seed_data():
-    """Endpoint to seed sample data"""
+    """Endpoint to seed sample data, optionally at a custom scale"""
+    from seeding import SeedConfig
+
+    try:
+        config = SeedConfig.from_dict(request.get_json(silent=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
-        seed_sample_data()
-        return jsonify({'message': 'Sample data seeded successfully'}), 200
+        summary = seed_sample_data(config)
+        cache.invalidate('students', 'wellbeing_records', 'attendance', 'grades', 'alerts')
+        if summary is None:
+            return jsonify({'message': 'Sample data already exists'}), 200
+        return jsonify({'message': 'Sample data seeded successfully', **summary}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Not found'}), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
-    app.run(debug=False, port=5001, host='127.0.0.1')
+    # Development server. Production runs wsgi.py under gunicorn (see start_server.sh).
+    # Periodic jobs (alert rules, maintenance) run in-process unless disabled,
+    # e.g. when a separate `python scheduler.py` worker is used instead
+    if os.environ.get('SCHEDULER_ENABLED', '1') != '0':
+        import scheduler
+        scheduler.start()
+    create_app().run(debug=False, port=5001, host='127.0.0.1')
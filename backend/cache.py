@@ -0,0 +1,190 @@
+"""
+In-process response cache for dashboard aggregate endpoints.
+
+Each cached view gets its own TTL and LRU bound and declares the tables it
+reads. Entries are keyed on those tables' table_versions (see versioning.py),
+so a write by any process, including other workers, the CLIs and the
+scheduler, turns the next request into a miss. Write endpoints in this
+process also call invalidate() with the tables they touch, which drops every
+dependent entry straight away. Concurrent misses for the same URL wait for the
+first request to finish instead of all running the query.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from flask import current_app, request
+import database
+import versioning
+
+# How long followers wait for an in-flight miss before computing themselves
+SINGLE_FLIGHT_TIMEOUT = 30
+
+_caches = {}
+_generations = defaultdict(int)
+_generations_lock = threading.Lock()
+
+
+class ResponseCache:
+    """TTL + LRU store of rendered responses for one endpoint"""
+
+    def __init__(self, name, ttl, maxsize, tables):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.tables = tuple(tables)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self):
+        """Combined write generation of the tables this cache depends on"""
+        with _generations_lock:
+            return tuple(_generations[t] for t in self.tables)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now or entry[1] != self.generation():
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, generation, payload):
+        """Store payload unless a write happened since `generation` was read"""
+        with self._lock:
+            if generation != self.generation():
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, generation, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def begin(self, key):
+        """Claim a miss; returns (is_leader, event to wait on or set)"""
+        with self._lock:
+            event = self._inflight.get(key)
+            if event is not None:
+                return False, event
+            event = self._inflight[key] = threading.Event()
+            return True, event
+
+    def finish(self, key, event):
+        with self._lock:
+            if self._inflight.get(key) is event:
+                del self._inflight[key]
+        event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'maxsize': self.maxsize,
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+def invalidate(*tables):
+    """Drop cached responses that read any of `tables`"""
+    with _generations_lock:
+        for table in tables:
+            _generations[table] += 1
+    for cache in list(_caches.values()):
+        if set(cache.tables) & set(tables):
+            cache.clear()
+
+
+def stats():
+    """Hit/miss counters for every cached endpoint"""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def _serve(payload):
+    body, mimetype = payload
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+def _tee(iterable, on_complete):
+    """Pass a streamed body through while collecting it for the cache"""
+    chunks = []
+    completed = False
+    try:
+        for chunk in iterable:
+            chunks.append(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+        completed = True
+    finally:
+        on_complete(b''.join(chunks) if completed else None)
+
+
+def cached(ttl, maxsize=128, tables=()):
+    """Cache successful GET responses of a view, keyed by path, query string
+    and the table versions the view reads"""
+    def decorator(view):
+        name = f'{view.__module__}.{view.__name__}'
+        cache = _caches[name] = ResponseCache(name, ttl, maxsize, tables)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = versioning.request_versions(cache.tables)
+            key = (database.DB_PATH, request.full_path, tuple(sorted(versions.items())))
+            payload = cache.get(key)
+            if payload is not None:
+                cache.record(hit=True)
+                return _serve(payload)
+
+            leader, event = cache.begin(key)
+            if not leader:
+                event.wait(SINGLE_FLIGHT_TIMEOUT)
+                payload = cache.get(key)
+                if payload is not None:
+                    cache.record(hit=True)
+                    return _serve(payload)
+
+            cache.record(hit=False)
+            generation = cache.generation()
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except Exception:
+                if leader:
+                    cache.finish(key, event)
+                raise
+            response.headers['X-Cache'] = 'MISS'
+
+            def complete(body):
+                if body is not None and response.status_code == 200:
+                    cache.put(key, generation, (body, response.mimetype))
+                if leader:
+                    cache.finish(key, event)
+
+            if response.is_streamed:
+                # Followers are released once the stream has been fully sent
+                response.response = _tee(response.response, complete)
+            else:
+                complete(response.get_data())
+            return response
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -1,19 +1,221 @@
 import sqlite3
 import os
+import threading
+import time
 from datetime import datetime
-from werkzeug.security import generate_password_hash
+from flask import g, has_app_context
+from migrations import apply_migrations, schema_is_current
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'wellbeing.db')
+DB_PATH = os.environ.get('DB_PATH', os.path.join(os.path.dirname(__file__), 'wellbeing.db'))
+
+# Pool configuration (overridable through the environment)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 16))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer, and NORMAL sync is durable across application crashes in WAL mode.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('temp_store', 'MEMORY'),
+    ('cache_size', -16000),
+    ('mmap_size', 268435456),
+)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class PooledConnection:
+    """Proxy for a pooled sqlite3 connection; close() returns it to the pool"""
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, '_conn', None)
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections shared by request threads"""
+
+    def __init__(self, path, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout,
+                               check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self):
+        """Check out a connection, waiting up to `timeout` seconds for one"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        conn = None
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout('Timed out waiting for a database connection')
+                waited = True
+                self._cond.wait(remaining)
+            wait = time.perf_counter() - start
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            if waited:
+                self._waits += 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    def close(self):
+        """Close idle connections; checked-out ones close when released"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Pool size and wait-time metrics"""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(self._total_wait * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide pool, rebuilding it if DB_PATH has changed"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+def close_pool():
+    """Close the process-wide pool, e.g. before forking worker processes"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
 
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Get a pooled database connection; close() returns it to the pool"""
+    conn = get_pool().acquire()
+    if has_app_context():
+        g.setdefault('_db_connections', []).append(conn)
     return conn
 
+def close_db_connections(exc=None):
+    """Return any connections still checked out by this app context"""
+    for conn in g.pop('_db_connections', []):
+        conn.close()
+
+def init_app(app):
+    """Register the teardown hook that hands connections back to the pool"""
+    app.teardown_appcontext(close_db_connections)
+
 def init_db():
     """Initialize database with schema"""
     conn = get_db_connection()
+    # Fast path for every start after the first: one header read, no DDL
+    if schema_is_current(conn):
+        conn.close()
+        return
     c = conn.cursor()
     
     # Users table
@@ -106,151 +308,46 @@ def init_db():
     )''')
     
     conn.commit()
+
+    # Bring indexes and derived tables up to date
+    apply_migrations(conn)
     conn.close()
 
-def seed_sample_data():
-    """Seed database with sample data for testing"""
+def seed_sample_data(config=None):
+    """Seed database with sample data for testing
+
+    `config` is a seeding.SeedConfig; the default matches the demo dataset
+    (30,000 students, 500 with two weeks of daily records).
+    """
+    from seeding import seed
+
     conn = get_db_connection()
-    c = conn.cursor()
-    
     try:
-        # Add sample users with properly hashed passwords
-        hashed_pw = generate_password_hash('password123')
-        c.execute('''INSERT INTO users (username, password, email, role) 
-                     VALUES (?, ?, ?, ?)''',
-                  ('kayla', hashed_pw, 'kayla@university.edu', 'staff'))
-        c.execute('''INSERT INTO users (username, password, email, role) 
-                     VALUES (?, ?, ?, ?)''',
-                  ('abigail', generate_password_hash('password123'), 'abigail@university.edu', 'staff'))
-        c.execute('''INSERT INTO users (username, password, email, role) 
-                     VALUES (?, ?, ?, ?)''',
-                  ('john', generate_password_hash('password123'), 'john@university.edu', 'staff'))
-        
-        # Generate 30,000 students with random names
-        import random
-        
-        first_names = [
-            'Emma', 'Liam', 'Olivia', 'Noah', 'Ava', 'Ethan', 'Sophia', 'Mason', 'Isabella', 'William',
-            'Mia', 'James', 'Charlotte', 'Benjamin', 'Amelia', 'Lucas', 'Harper', 'Henry', 'Evelyn', 'Alexander',
-            'Abigail', 'Michael', 'Emily', 'Daniel', 'Elizabeth', 'Jacob', 'Sofia', 'Logan', 'Avery', 'Jackson',
-            'Ella', 'Sebastian', 'Scarlett', 'Aiden', 'Grace', 'Matthew', 'Chloe', 'Samuel', 'Victoria', 'David',
-            'Riley', 'Joseph', 'Aria', 'Carter', 'Lily', 'Owen', 'Aurora', 'Wyatt', 'Zoey', 'John',
-            'Penelope', 'Jack', 'Layla', 'Luke', 'Nora', 'Jayden', 'Camila', 'Dylan', 'Hannah', 'Grayson',
-            'Zoe', 'Levi', 'Lillian', 'Isaac', 'Addison', 'Gabriel', 'Eleanor', 'Julian', 'Natalie', 'Mateo',
-            'Luna', 'Anthony', 'Savannah', 'Jaxon', 'Brooklyn', 'Lincoln', 'Leah', 'Joshua', 'Stella', 'Christopher',
-            'Hazel', 'Andrew', 'Ellie', 'Theodore', 'Paisley', 'Caleb', 'Audrey', 'Ryan', 'Skylar', 'Asher',
-            'Violet', 'Nathan', 'Claire', 'Thomas', 'Bella', 'Leo', 'Lucy', 'Isaiah', 'Anna', 'Charles'
-        ]
-        
-        last_names = [
-            'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
-            'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
-            'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
-            'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Flores',
-            'Green', 'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell', 'Mitchell', 'Carter', 'Roberts',
-            'Gomez', 'Phillips', 'Evans', 'Turner', 'Diaz', 'Parker', 'Cruz', 'Edwards', 'Collins', 'Reyes',
-            'Stewart', 'Morris', 'Morales', 'Murphy', 'Cook', 'Rogers', 'Gutierrez', 'Ortiz', 'Morgan', 'Cooper',
-            'Peterson', 'Bailey', 'Reed', 'Kelly', 'Howard', 'Ramos', 'Kim', 'Cox', 'Ward', 'Richardson',
-            'Watson', 'Brooks', 'Chavez', 'Wood', 'James', 'Bennett', 'Gray', 'Mendoza', 'Ruiz', 'Hughes',
-            'Price', 'Alvarez', 'Castillo', 'Sanders', 'Patel', 'Myers', 'Long', 'Ross', 'Foster', 'Jimenez'
-        ]
-        
-        print("Adding 30,000 students...")
-        students_data = []
-        for i in range(1, 30001):
-            first_name = random.choice(first_names)
-            last_name = random.choice(last_names)
-            email = f'{first_name.lower()}.{last_name.lower()}{i}@university.edu'
-            students_data.append((f'STU{10000+i}', first_name, last_name, email))
-        
-        c.executemany('''INSERT INTO students (student_id, first_name, last_name, email) 
-                         VALUES (?, ?, ?, ?)''', students_data)
-        print("Students added.")
-        
-        # Add wellbeing records for a sample of students (not all 30K to keep DB manageable)
-        print("Adding wellbeing records for sample students...")
-        sample_students = random.sample(range(1, 30001), 500)  # Sample 500 students for detailed records
-        
-        for i in sample_students:
-            for day in range(0, 14):
-                stress = random.randint(1, 10)
-                sleep = random.randint(3, 10)
-                c.execute('''INSERT INTO wellbeing_records (student_id, sleep_level, stress_level, mood, recorded_date) 
-                             VALUES (?, ?, ?, ?, datetime('now', '-' || ? || ' days'))''',
-                          (i, sleep, stress, 
-                           random.choice(['Happy', 'Neutral', 'Stressed', 'Anxious']), day))
-                
-                # Create alerts for high stress (>8) on recent days only (today or yesterday)
-                if stress > 8 and day <= 1:
-                    c.execute('''INSERT INTO alerts (student_id, alert_type, message, created_date)
-                                 VALUES (?, 'high_stress', ?, datetime('now', '-' || ? || ' days'))''',
-                              (i, f'High stress level ({stress}/10) reported. Immediate attention may be needed.', day))
-                
-                # Create alerts for low sleep (<=3) on recent days
-                if sleep <= 3 and day <= 1:
-                    c.execute('''INSERT INTO alerts (student_id, alert_type, message, created_date)
-                                 VALUES (?, 'low_sleep', ?, datetime('now', '-' || ? || ' days'))''',
-                              (i, f'Low sleep quality ({sleep}/10) reported. Student may need support.', day))
-        print("Wellbeing records added.")
-        
-        # Add attendance records for sample students
-        print("Adding attendance records...")
-        student_attendance = {i: {'present': 0, 'total': 0} for i in sample_students}
-        low_attendance_students = random.sample(sample_students, 50)  # 50 students with low attendance
-        
-        for i in sample_students:
-            for day in range(0, 14):
-                present = random.random() > 0.2  # 80% base attendance
-                # Make some students have lower attendance (< 70%)
-                if i in low_attendance_students:
-                    present = random.random() > 0.5  # ~50% attendance
-                c.execute('''INSERT INTO attendance (student_id, class_date, present) 
-                             VALUES (?, date('now', '-' || ? || ' days'), ?)''',
-                          (i, day, present))
-                student_attendance[i]['total'] += 1
-                if present:
-                    student_attendance[i]['present'] += 1
-        
-        # Create low attendance alerts for students with < 70% attendance
-        for student_id, data in student_attendance.items():
-            if data['total'] > 0:
-                rate = data['present'] / data['total']
-                if rate < 0.70:
-                    c.execute('''SELECT first_name, last_name FROM students WHERE id = ?''', (student_id,))
-                    student = c.fetchone()
-                    if student:
-                        attendance_pct = round(rate * 100, 1)
-                        c.execute('''INSERT INTO alerts (student_id, alert_type, message)
-                                     VALUES (?, 'low_attendance', ?)''',
-                                  (student_id, f'Low attendance ({attendance_pct}%) - below 70% threshold. Student {student[0]} {student[1]} requires intervention.'))
-        print("Attendance records added.")
-        
-        # Add assignments
-        c.execute('''INSERT INTO assignments (title, description, due_date) 
-                     VALUES (?, ?, date('2024-12-20'))''',
-                  ('Assignment 1', 'First assignment', ))
-        c.execute('''INSERT INTO assignments (title, description, due_date) 
-                     VALUES (?, ?, date('2024-12-27'))''',
-                  ('Assignment 2', 'Second assignment', ))
-        
-        # Add grades for sample students
-        print("Adding grades...")
-        grades_data = []
-        for i in sample_students:
-            grade1 = random.randint(40, 100)
-            grade2 = random.randint(40, 100)
-            grades_data.append((i, 1, grade1))
-            grades_data.append((i, 2, grade2))
-        c.executemany('''INSERT INTO grades (student_id, assignment_id, grade) 
-                         VALUES (?, ?, ?)''', grades_data)
-        
-        conn.commit()
-        print("Sample data seeded successfully with 30,000 students!")
+        return seed(conn, config)
     except sqlite3.IntegrityError:
         print("Sample data already exists")
     finally:
         conn.close()
 
 if __name__ == '__main__':
+    import argparse
+    from seeding import SeedConfig
+
+    parser = argparse.ArgumentParser(description='Initialise and seed the wellbeing database')
+    parser.add_argument('--students', type=int, default=SeedConfig.students)
+    parser.add_argument('--days', type=int, default=SeedConfig.days)
+    parser.add_argument('--tracked-fraction', type=float, default=SeedConfig.tracked_fraction,
+                        help='fraction of students with daily wellbeing and attendance records')
+    parser.add_argument('--survey-rate', type=float, default=SeedConfig.survey_rate,
+                        help='chance a tracked student submits a survey on a given day')
+    parser.add_argument('--seed', type=int, default=None, help='RNG seed for a reproducible dataset')
+    parser.add_argument('--workers', type=int, default=1, help='processes generating rows')
+    parser.add_argument('--init-only', action='store_true', help='create the schema without seeding')
+    args = parser.parse_args()
+
     init_db()
-    seed_sample_data()
+    if not args.init_only:
+        seed_sample_data(SeedConfig(students=args.students, days=args.days,
+                                    tracked_fraction=args.tracked_fraction,
+                                    survey_rate=args.survey_rate,
+                                    seed=args.seed, workers=args.workers))
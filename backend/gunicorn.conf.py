@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the production server (start_server.sh).
+
+Worker processes scale CPU-bound work across cores; threads per worker cover
+requests that mostly wait on SQLite or hold a Server-Sent Events stream open
+(each /api/alerts/stream client holds a thread for up to 5 minutes, for at
+most ALERT_STREAM_MAX clients per worker; the rest poll).
+
+Graceful reloads: `kill -HUP <master>` replaces workers after they finish
+their in-flight requests (up to graceful_timeout). With preloading the code is
+loaded once in the master, so a code deploy needs `kill -USR2 <master>`
+(start a new master), then `-WINCH` and `-QUIT` the old one; set
+GUNICORN_PRELOAD=0 to let HUP pick up new code instead.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_class = 'gthread'
+
+# Load the app (and check the schema) once in the master, then fork
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork, so background jobs start in each worker.
+    # Job leases (see scheduler.py) keep a job to one run at a time.
+    if os.environ.get('SCHEDULER_ENABLED', '1') != '0':
+        import scheduler
+        scheduler.start()
@@ -0,0 +1,268 @@
+"""
+Password hashing on a bounded process pool.
+
+PBKDF2 is deliberately CPU-bound, so hashing on request threads lets a login
+surge starve every other endpoint served by the same worker process (and,
+through the GIL, every other thread in it). Hashes run on a small pool of
+worker processes instead. At most MAX_PENDING hash jobs may be queued or
+running at once: past that, callers get HashingBusy straight away, and a job
+that does not finish within HASH_TIMEOUT raises HashingTimeout. Routes turn
+both into 503 responses with Retry-After.
+
+Set PASSWORD_HASH_WORKERS=0 to hash inline on the calling thread.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Hash parameters for new and upgraded passwords; stored hashes made with
+# anything else are rehashed at the next successful login
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+# Latency samples kept per operation for percentiles
+LATENCY_WINDOW = 1024
+
+
+class HashingBusy(RuntimeError):
+    """Too many hash jobs are already queued"""
+
+
+class HashingTimeout(RuntimeError):
+    """A hash job did not finish in time"""
+
+
+def hash_password(password, method=None):
+    return generate_password_hash(password, method=method or HASH_METHOD)
+
+
+def verify_password(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True if `pwhash` was made with other parameters than HASH_METHOD"""
+    return pwhash.split('$', 1)[0] != HASH_METHOD
+
+
+class LatencyStats:
+    """Count, failures and latency percentiles of one operation"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms, failed=False):
+        with self._lock:
+            self.count += 1
+            self.failures += 1 if failed else 0
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self._samples.append(elapsed_ms)
+
+    def to_dict(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count, failures, total_ms, max_ms = self.count, self.failures, self.total_ms, self.max_ms
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 2) if samples else 0.0
+
+        return {
+            'count': count,
+            'failures': failures,
+            'avg_ms': round(total_ms / count, 2) if count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(max_ms, 2),
+        }
+
+
+def _process_pool(workers):
+    # Imported on first use: multiprocessing adds noticeably to app startup
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(workers, multiprocessing.get_context('spawn'))
+
+
+class HashPool:
+    """Process pool for hash jobs with a cap on queued work"""
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=MAX_PENDING, timeout=HASH_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self._rejected = 0
+        self._timeouts = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Workers are spawned rather than forked so they do not
+                # inherit the request threads' locks and open connections
+                self._executor = _process_pool(self.workers)
+            return self._executor
+
+    def _acquire(self, timeout=None):
+        acquired = (self._slots.acquire(blocking=False) if timeout is None
+                    else self._slots.acquire(timeout=timeout))
+        with self._lock:
+            if not acquired:
+                self._rejected += 1
+            else:
+                self._pending += 1
+        if not acquired:
+            raise HashingBusy('Too many password hashes queued')
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _submit(self, executor, func, args):
+        try:
+            return executor.submit(func, *args)
+        except Exception:
+            self._release()
+            raise
+
+    def _settle(self, future):
+        """Result of a submitted job, freeing its slot
+
+        A job that times out may still be running and cancel() cannot stop
+        it, so its slot is only freed once it has actually finished.
+        """
+        try:
+            result = future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            future.add_done_callback(self._release)
+            with self._lock:
+                self._timeouts += 1
+            raise HashingTimeout('Password hashing timed out') from None
+        except BaseException:
+            self._release()
+            raise
+        self._release()
+        return result
+
+    def run(self, func, *args):
+        """func(*args) on a worker process (or inline without workers)"""
+        self._acquire()
+        if self.workers <= 0:
+            try:
+                return func(*args)
+            finally:
+                self._release()
+        return self._settle(self._submit(self._get_executor(), func, args))
+
+    def map(self, func, arglists, window=None):
+        """[func(*args) for args in arglists], at most `window` jobs (default
+        half the workers) at a time so that logins keep the other workers
+
+        Bulk callers wait up to `timeout` for a free queue slot rather than
+        failing at once; HashingBusy if none frees up.
+        """
+        if self.workers <= 0:
+            return [func(*args) for args in arglists]
+        window = window or max(1, self.workers // 2)
+        executor = self._get_executor()
+        results = [None] * len(arglists)
+        inflight = deque()
+        try:
+            for i, args in enumerate(arglists):
+                if len(inflight) >= window:
+                    j, future = inflight.popleft()
+                    results[j] = self._settle(future)
+                self._acquire(self.timeout)
+                inflight.append((i, self._submit(executor, func, args)))
+            while inflight:
+                j, future = inflight.popleft()
+                results[j] = self._settle(future)
+        finally:
+            # Jobs left behind by an error keep their slots until they end
+            for _, future in inflight:
+                future.cancel()
+                future.add_done_callback(self._release)
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+            }
+
+
+pool = HashPool()
+
+# End-to-end latencies recorded by the auth routes, plus the pool jobs
+latency = {name: LatencyStats() for name in ('login', 'register', 'hash', 'verify')}
+
+
+def _timed(name, func, *args):
+    start = time.perf_counter()
+    failed = True
+    try:
+        result = pool.run(func, *args)
+        failed = False
+        return result
+    finally:
+        latency[name].record((time.perf_counter() - start) * 1000, failed)
+
+
+def hash_password_async(password):
+    """hash_password() on the pool; raises HashingBusy or HashingTimeout"""
+    return _timed('hash', hash_password, password, HASH_METHOD)
+
+
+def verify_password_async(pwhash, password):
+    """verify_password() on the pool; raises HashingBusy or HashingTimeout"""
+    return _timed('verify', verify_password, pwhash, password)
+
+
+def bulk_executor(workers):
+    """A process pool for bulk hashing, separate from the login pool so an
+    enrolment run does not queue ahead of logins; None for zero workers"""
+    if workers <= 0:
+        return None
+    return _process_pool(workers)
+
+
+def hash_many(passwords, executor=None, workers=1, method=None):
+    """Hashes of `passwords`, in order, spread across the executor's `workers`"""
+    method = method or HASH_METHOD
+    if executor is None:
+        return [hash_password(p, method) for p in passwords]
+    # A few tasks per worker keeps them all busy with little pickling overhead
+    chunksize = max(1, len(passwords) // (max(workers, 1) * 4))
+    return list(executor.map(hash_password, passwords, [method] * len(passwords), chunksize=chunksize))
+
+
+def stats():
+    return {'pool': pool.stats(), 'latency': {name: s.to_dict() for name, s in latency.items()}}
@@ -0,0 +1,232 @@
+"""
+Streaming CSV import of attendance registers and gradebooks.
+
+Files are read one row at a time and written in chunked transactions, so
+memory stays flat however large the file is. Student codes (STU10001) are
+resolved through an in-memory map of the students table, loaded once per
+import. Rejected rows are counted and a bounded sample is kept for the
+report; the CLI can also write every rejected row to a separate CSV.
+
+Usage:
+    python importer.py attendance register.csv [--rejects rejected.csv]
+    python importer.py grades gradebook.csv --chunk-size 10000
+"""
+import csv
+import io
+import time
+from dataclasses import dataclass, field, asdict
+
+import ingest
+
+# Rows written per transaction
+IMPORT_CHUNK_SIZE = 5000
+
+# Rejected rows kept in the summary; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+
+PRESENT_VALUES = {'1': 1, 'true': 1, 'yes': 1, 'y': 1, 'present': 1,
+                  '0': 0, 'false': 0, 'no': 0, 'n': 0, 'absent': 0}
+
+
+def _attendance_record(row):
+    present = (row.get('present') or '1').strip().lower()
+    if present not in PRESENT_VALUES:
+        raise ValueError(f'present must be one of {", ".join(sorted(PRESENT_VALUES))}')
+    return ingest.attendance_row({'student_id': row['student_id'],
+                                  'class_date': (row.get('class_date') or '').strip(),
+                                  'present': PRESENT_VALUES[present]})
+
+
+def _grade_record(row):
+    return ingest.grade_row({'student_id': row['student_id'],
+                             'assignment_id': (row.get('assignment_id') or '').strip() or None,
+                             'grade': (row.get('grade') or '').strip(),
+                             'feedback': row.get('feedback') or None})
+
+
+@dataclass(frozen=True)
+class ImportKind:
+    table: str
+    columns: tuple
+    build: object
+    insert: str
+
+
+KINDS = {
+    'attendance': ImportKind(
+        'attendance', ('student_id', 'class_date'), _attendance_record,
+        'INSERT INTO attendance (student_id, class_date, present) VALUES (?, ?, ?)'),
+    'grades': ImportKind(
+        'grades', ('student_id', 'assignment_id', 'grade'), _grade_record,
+        'INSERT INTO grades (student_id, assignment_id, grade, feedback) VALUES (?, ?, ?, ?)'),
+}
+
+
+class CSVImportError(ValueError):
+    """The file cannot be imported at all (unknown kind, missing columns)"""
+
+
+@dataclass
+class ImportSummary:
+    kind: str
+    rows: int = 0
+    imported: int = 0
+    rejected: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    rejects: list = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def student_lookup(c):
+    """Map of student code to internal id for every student"""
+    c.execute('SELECT student_id, id FROM students')
+    return dict(c.fetchall())
+
+
+def import_csv(conn, kind, stream, chunk_size=IMPORT_CHUNK_SIZE,
+               progress=None, on_reject=None):
+    """Import CSV rows of `kind` from the text stream; returns an ImportSummary
+
+    `progress(summary)` is called after each committed chunk and
+    `on_reject(line, row, error)` for every rejected row.
+    """
+    spec = KINDS.get(kind)
+    if spec is None:
+        raise CSVImportError(f'Unknown import kind: {kind}')
+
+    reader = csv.DictReader(stream)
+    missing = [column for column in spec.columns if column not in (reader.fieldnames or ())]
+    if missing:
+        raise CSVImportError(f'Missing columns: {", ".join(missing)}')
+
+    c = conn.cursor()
+    students = student_lookup(c)
+    assignments = None
+    if kind == 'grades':
+        c.execute('SELECT id FROM assignments')
+        assignments = {row[0] for row in c.fetchall()}
+
+    summary = ImportSummary(kind)
+    started = time.perf_counter()
+    chunk = []
+
+    def reject(line, row, error):
+        summary.rejected += 1
+        if len(summary.rejects) < MAX_REPORTED_REJECTS:
+            summary.rejects.append({'line': line, 'error': error})
+        if on_reject:
+            on_reject(line, row, error)
+
+    def flush():
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            c.executemany(spec.insert, chunk)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        summary.imported += len(chunk)
+        summary.chunks += 1
+        chunk.clear()
+        if progress:
+            progress(summary)
+
+    for row in reader:
+        summary.rows += 1
+        line = reader.line_num
+        code = (row.get('student_id') or '').strip()
+        student_pk = students.get(code)
+        if student_pk is None:
+            reject(line, row, f'Unknown student {code}' if code else 'student_id is required')
+            continue
+        try:
+            record = spec.build({**row, 'student_id': student_pk})
+        except ValueError as e:
+            reject(line, row, str(e))
+            continue
+        if assignments is not None and record[1] not in assignments:
+            reject(line, row, f'Unknown assignment {record[1]}')
+            continue
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+    summary.seconds = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def text_stream(binary):
+    """Decode an uploaded byte stream as CSV text (UTF-8, optional BOM)"""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def import_request(conn, kind):
+    """Import the CSV uploaded with the current request; returns (body, status)
+
+    Accepts a multipart `file` field or a raw text/csv body. Werkzeug spools
+    large uploads to disk, so neither is held in memory.
+    """
+    from flask import request
+
+    upload = request.files.get('file')
+    stream = text_stream(upload.stream if upload else request.stream)
+    chunk_size = request.args.get('chunk_size', IMPORT_CHUNK_SIZE, type=int)
+    try:
+        summary = import_csv(conn, kind, stream, max(chunk_size, 1))
+    except CSVImportError as e:
+        return {'error': str(e)}, 400
+    except UnicodeDecodeError:
+        return {'error': 'File is not UTF-8 encoded CSV'}, 400
+    return summary.to_dict(), 200
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from database import init_db, get_db_connection
+
+    parser = argparse.ArgumentParser(description='Import attendance or grades from a CSV file')
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('path', help="CSV file, or '-' for stdin")
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                        help='rows committed per transaction')
+    parser.add_argument('--rejects', help='write rejected rows and reasons to this CSV file')
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    rejects_file = open(args.rejects, 'w', newline='') if args.rejects else None
+    writer = None
+
+    def on_reject(line, row, error):
+        global writer
+        if rejects_file is None:
+            return
+        if writer is None:
+            columns = [k for k in row if k is not None]
+            writer = csv.DictWriter(rejects_file, fieldnames=['line', 'error', *columns],
+                                    extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow({'line': line, 'error': error, **row})
+
+    def progress(summary):
+        print(f'  {summary.imported:,} imported, {summary.rejected:,} rejected', flush=True)
+
+    source = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8-sig')
+    try:
+        summary = import_csv(conn, args.kind, source, args.chunk_size, progress, on_reject)
+    except CSVImportError as e:
+        parser.error(str(e))
+    finally:
+        source.close()
+        if rejects_file:
+            rejects_file.close()
+        conn.close()
+
+    print(f'{summary.imported:,} of {summary.rows:,} rows imported into {args.kind} '
+          f'in {summary.seconds}s ({summary.rejected:,} rejected)')
@@ -0,0 +1,167 @@
+"""
+Batch ingestion for attendance registers, grade sheets and wellbeing surveys.
+
+A batch is validated as a whole first: every row is checked and referenced
+students/assignments are looked up with one query each. Only a fully valid
+batch is written, with executemany() inside a single transaction, so a
+300-student register costs one request and one commit.
+"""
+import json
+from datetime import date
+
+# Largest batch accepted in one request
+MAX_BATCH_SIZE = 5000
+
+
+class BatchError(ValueError):
+    """The request body is not a usable batch"""
+
+
+def parse_batch(data):
+    """Records of a batch body: a JSON array or {"records": [...]}"""
+    records = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(records, list) or not records:
+        raise BatchError('Expected a non-empty array of records')
+    if len(records) > MAX_BATCH_SIZE:
+        raise BatchError(f'Batch exceeds {MAX_BATCH_SIZE} records')
+    return records
+
+
+def _integer(record, field, required=True, low=None, high=None):
+    value = record.get(field)
+    if value is None:
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'{field} must be an integer')
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be an integer') from None
+    if number != value and str(number) != str(value):
+        raise ValueError(f'{field} must be an integer')
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ValueError(f'{field} must be between {low} and {high}')
+    return number
+
+
+def _date(record, field):
+    value = record.get(field)
+    if not value:
+        raise ValueError(f'{field} is required')
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ValueError(f'{field} must be a YYYY-MM-DD date') from None
+
+
+def _number(record, field):
+    value = record.get(field)
+    if value is None or value == '' or isinstance(value, bool):
+        raise ValueError(f'{field} is required')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be a number') from None
+
+
+def attendance_row(record):
+    present = record.get('present', True)
+    if not isinstance(present, (bool, int)) or present not in (0, 1):
+        raise ValueError('present must be a boolean')
+    return (_integer(record, 'student_id'), _date(record, 'class_date'), int(present))
+
+
+def grade_row(record):
+    return (_integer(record, 'student_id'), _integer(record, 'assignment_id'),
+            _number(record, 'grade'), record.get('feedback'))
+
+
+def wellbeing_row(record):
+    notes_parts = []
+    if record.get('comments'):
+        notes_parts.append(f"Comments: {record.get('comments')}")
+    if record.get('requests'):
+        notes_parts.append(f"Requests: {record.get('requests')}")
+    notes = "\n".join(notes_parts) if notes_parts else record.get('notes')
+    return (_integer(record, 'student_id'),
+            _integer(record, 'sleep_level', required=False, low=0, high=10),
+            _integer(record, 'stress_level', required=False, low=0, high=10),
+            record.get('mood'),
+            notes)
+
+
+def _existing_ids(c, table, ids):
+    c.execute(f'SELECT id FROM {table} WHERE id IN (SELECT value FROM json_each(?))',
+              (json.dumps(sorted(ids)),))
+    return {row[0] for row in c.fetchall()}
+
+
+def validate(c, records, build, references=(('students', 0),)):
+    """Build insert rows from records, checking each and its foreign keys
+
+    `references` pairs a table with the row position holding its id.
+    Returns (rows, errors) where errors is a list of {index, error}.
+    """
+    rows = [None] * len(records)
+    errors = []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'index': index, 'error': 'Record must be an object'})
+            continue
+        try:
+            rows[index] = build(record)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    for table, position in references:
+        wanted = {row[position] for row in rows if row is not None}
+        missing = wanted - _existing_ids(c, table, wanted)
+        for index, row in enumerate(rows):
+            if row is not None and row[position] in missing:
+                errors.append({'index': index, 'error': f'Unknown {table[:-1]} {row[position]}'})
+                rows[index] = None
+
+    errors.sort(key=lambda e: e['index'])
+    return rows, errors
+
+
+def insert_many(c, query, rows):
+    """executemany() `rows` and return their new ids, in order
+
+    Must run inside a write transaction: ids of an AUTOINCREMENT table are
+    then consecutive and end at last_insert_rowid().
+    """
+    c.executemany(query, rows)
+    last = c.execute('SELECT last_insert_rowid()').fetchone()[0]
+    return list(range(last - len(rows) + 1, last + 1))
+
+
+def write_batch(conn, records, build, query, references=(('students', 0),), side_effects=None):
+    """Validate and insert a whole batch; returns (response body, status)
+
+    `side_effects(c, rows)` runs in the same transaction after the insert
+    and returns extra fields for the response body.
+    """
+    c = conn.cursor()
+    rows, errors = validate(c, records, build, references)
+    if errors:
+        return {'error': 'Invalid records', 'inserted': 0, 'errors': errors}, 400
+
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        ids = insert_many(c, query, rows)
+        extra = side_effects(c, rows) if side_effects else {}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    body = {
+        'message': f'{len(ids)} records created',
+        'inserted': len(ids),
+        'results': [{'index': i, 'record_id': record_id} for i, record_id in enumerate(ids)],
+    }
+    body.update(extra)
+    return body, 201
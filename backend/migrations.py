@@ -0,0 +1,462 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once, in order, inside its own write transaction and is
+recorded in the schema_version table. Steps are idempotent (IF NOT EXISTS) so
+existing production databases can be upgraded in place without a rebuild.
+"""
+import sqlite3
+
+
+def backfill_wellbeing_latest(c):
+    """Rebuild student_wellbeing_latest from the full wellbeing history"""
+    c.execute('DELETE FROM student_wellbeing_latest')
+    c.execute('''INSERT INTO student_wellbeing_latest
+                     (student_id, record_id, last_submission, latest_stress, latest_mood, latest_sleep)
+                 SELECT student_id, id, recorded_date, stress_level, mood, sleep_level
+                 FROM (SELECT *, ROW_NUMBER() OVER (
+                           PARTITION BY student_id ORDER BY recorded_date DESC, id DESC) AS rn
+                       FROM wellbeing_records)
+                 WHERE rn = 1''')
+
+
+# Daily wellbeing rollups: one row per day and one per (student, day), each
+# holding count/sum/min/max per measure so averages over a window only touch
+# one row per bucket instead of every record.
+ROLLUP_MEASURES = (('stress', 'stress_level'), ('sleep', 'sleep_level'))
+ROLLUPS = {
+    'wellbeing_daily_rollup': ('day',),
+    'wellbeing_student_daily_rollup': ('student_id', 'day'),
+}
+
+
+def _rollup_columns():
+    columns = ['record_count']
+    for measure, _ in ROLLUP_MEASURES:
+        columns += [f'{measure}_sum', f'{measure}_count', f'{measure}_min', f'{measure}_max']
+    return columns
+
+
+def _rollup_aggregates():
+    """SELECT expressions aggregating wellbeing_records into rollup columns"""
+    exprs = ['COUNT(*)']
+    for _, column in ROLLUP_MEASURES:
+        exprs += [f'COALESCE(SUM({column}), 0)', f'COUNT({column})', f'MIN({column})', f'MAX({column})']
+    return exprs
+
+
+def _rollup_table_sql(table, keys):
+    key_defs = ', '.join(f'{k} {"DATE" if k == "day" else "INTEGER"} NOT NULL' for k in keys)
+    measures = ', '.join(f'{c} INTEGER' for c in _rollup_columns())
+    return (f'CREATE TABLE IF NOT EXISTS {table} ({key_defs}, {measures}, '
+            f'PRIMARY KEY ({", ".join(keys)}))')
+
+
+def _rollup_add_sql(table, keys):
+    """Upsert folding the NEW wellbeing row into its bucket"""
+    key_values = {'day': 'date(NEW.recorded_date)', 'student_id': 'NEW.student_id'}
+    values = ['1']
+    updates = ['record_count = record_count + 1']
+    for measure, column in ROLLUP_MEASURES:
+        values += [f'COALESCE(NEW.{column}, 0)', f'NEW.{column} IS NOT NULL', f'NEW.{column}', f'NEW.{column}']
+        updates += [
+            f'{measure}_sum = {measure}_sum + excluded.{measure}_sum',
+            f'{measure}_count = {measure}_count + excluded.{measure}_count',
+            f'{measure}_min = COALESCE(MIN({measure}_min, excluded.{measure}_min), {measure}_min, excluded.{measure}_min)',
+            f'{measure}_max = COALESCE(MAX({measure}_max, excluded.{measure}_max), {measure}_max, excluded.{measure}_max)',
+        ]
+    return (f'INSERT INTO {table} ({", ".join(keys)}, {", ".join(_rollup_columns())}) '
+            f'VALUES ({", ".join(key_values[k] for k in keys)}, {", ".join(values)}) '
+            f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {", ".join(updates)};')
+
+
+def _rollup_recompute_sql(table, keys, row):
+    """Rebuild the bucket holding the OLD/NEW row from source records"""
+    where = [f"recorded_date >= date({row}.recorded_date)",
+             f"recorded_date < date({row}.recorded_date, '+1 day')"]
+    match = [f'day = date({row}.recorded_date)']
+    if 'student_id' in keys:
+        where.insert(0, f'student_id = {row}.student_id')
+        match.insert(0, f'student_id = {row}.student_id')
+    return (f'DELETE FROM {table} WHERE {" AND ".join(match)}; '
+            f'INSERT INTO {table} ({", ".join(keys)}, {", ".join(_rollup_columns())}) '
+            f'SELECT {", ".join(keys).replace("day", "date(recorded_date)")}, {", ".join(_rollup_aggregates())} '
+            f'FROM wellbeing_records WHERE {" AND ".join(where)} '
+            f'GROUP BY {", ".join(keys).replace("day", "date(recorded_date)")};')
+
+
+def _rollup_trigger_sql(event, rows):
+    body = []
+    for table, keys in ROLLUPS.items():
+        if event == 'INSERT':
+            body.append(_rollup_add_sql(table, keys))
+        else:
+            body.extend(_rollup_recompute_sql(table, keys, row) for row in rows)
+    return (f'CREATE TRIGGER IF NOT EXISTS trg_wellbeing_rollup_{event.lower()} '
+            f'AFTER {event} ON wellbeing_records BEGIN {" ".join(body)} END')
+
+
+def backfill_wellbeing_rollups(c):
+    """Rebuild both daily rollups from the full wellbeing history"""
+    for table, keys in ROLLUPS.items():
+        group = ', '.join(keys).replace('day', 'date(recorded_date)')
+        c.execute(f'DELETE FROM {table}')
+        c.execute(f'''INSERT INTO {table} ({", ".join(keys)}, {", ".join(_rollup_columns())})
+                      SELECT {group}, {", ".join(_rollup_aggregates())}
+                      FROM wellbeing_records GROUP BY {group}''')
+
+
+STUDENT_SEARCH_COLUMNS = 'first_name, last_name, student_id, email'
+
+
+def create_student_search(c):
+    """Trigram FTS5 index over student names, codes and emails
+
+    Skipped when SQLite is built without FTS5; searches then fall back to LIKE.
+    """
+    cols = STUDENT_SEARCH_COLUMNS
+    new_values = ', '.join(f'NEW.{col.strip()}' for col in cols.split(','))
+    old_values = ', '.join(f'OLD.{col.strip()}' for col in cols.split(','))
+    try:
+        c.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS students_fts
+                      USING fts5({cols}, content='students', content_rowid='id',
+                                 tokenize='trigram')''')
+    except sqlite3.OperationalError:
+        return
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_students_fts_insert AFTER INSERT ON students
+                  BEGIN
+                      INSERT INTO students_fts (rowid, {cols}) VALUES (NEW.id, {new_values});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_students_fts_delete AFTER DELETE ON students
+                  BEGIN
+                      INSERT INTO students_fts (students_fts, rowid, {cols})
+                      VALUES ('delete', OLD.id, {old_values});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_students_fts_update AFTER UPDATE ON students
+                  BEGIN
+                      INSERT INTO students_fts (students_fts, rowid, {cols})
+                      VALUES ('delete', OLD.id, {old_values});
+                      INSERT INTO students_fts (rowid, {cols}) VALUES (NEW.id, {new_values});
+                  END''')
+    backfill_student_search(c)
+
+
+def backfill_student_search(c):
+    """Rebuild the student search index from the students table"""
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'students_fts'")
+    if c.fetchone():
+        c.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+
+
+def backfill_alert_counts(c):
+    """Recount alert_unread_counts from the alerts table"""
+    c.execute('DELETE FROM alert_unread_counts')
+    c.execute('''INSERT INTO alert_unread_counts (alert_type, unread)
+                 SELECT alert_type, COUNT(*) FROM alerts WHERE is_read = 0 GROUP BY alert_type''')
+
+
+def _alert_count_sql(row, delta):
+    """Statement adding `delta` to the counter of `row` (OLD/NEW) if it is unread"""
+    return (f'''INSERT INTO alert_unread_counts (alert_type, unread)
+               SELECT {row}.alert_type, {delta} WHERE {row}.is_read = 0
+               ON CONFLICT (alert_type) DO UPDATE SET unread = unread + excluded.unread;''')
+
+
+# Tables whose writes bump a row in table_versions, used for HTTP validators
+VERSIONED_TABLES = ('students', 'wellbeing_records', 'attendance', 'assignments', 'grades', 'alerts')
+
+
+def create_table_versions(c):
+    """Per-table change counters bumped by triggers on every write"""
+    c.execute('''CREATE TABLE IF NOT EXISTS table_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    for table in VERSIONED_TABLES:
+        c.execute('INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                          AFTER {event} ON {table}
+                          BEGIN
+                              UPDATE table_versions
+                              SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                              WHERE table_name = '{table}';
+                          END''')
+
+
+def touch_table_versions(c):
+    """Bump every table version, e.g. after a load that bypassed the triggers"""
+    c.execute('''UPDATE table_versions
+                 SET version = version + 1, updated_at = CURRENT_TIMESTAMP''')
+
+
+# (version, description, steps) - steps are SQL strings or callables taking a cursor
+MIGRATIONS = [
+    (1, 'Indexes on hot query columns', [
+        '''CREATE INDEX IF NOT EXISTS idx_wellbeing_student_date
+           ON wellbeing_records (student_id, recorded_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_wellbeing_recorded_date
+           ON wellbeing_records (recorded_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_attendance_student_date
+           ON attendance (student_id, class_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_attendance_class_date
+           ON attendance (class_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_alerts_read_created
+           ON alerts (is_read, created_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_alerts_unread_created
+           ON alerts (created_date) WHERE is_read = 0''',
+        '''CREATE INDEX IF NOT EXISTS idx_alerts_student
+           ON alerts (student_id, is_read, created_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_grades_student
+           ON grades (student_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_grades_assignment
+           ON grades (assignment_id)''',
+    ]),
+    (2, 'Per-student latest wellbeing summary', [
+        '''CREATE TABLE IF NOT EXISTS student_wellbeing_latest (
+            student_id INTEGER PRIMARY KEY,
+            record_id INTEGER NOT NULL,
+            last_submission TIMESTAMP,
+            latest_stress INTEGER,
+            latest_mood TEXT,
+            latest_sleep INTEGER,
+            FOREIGN KEY (student_id) REFERENCES students(id)
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_wellbeing_latest_insert
+           AFTER INSERT ON wellbeing_records
+           BEGIN
+               INSERT INTO student_wellbeing_latest
+                   (student_id, record_id, last_submission, latest_stress, latest_mood, latest_sleep)
+               VALUES (NEW.student_id, NEW.id, NEW.recorded_date, NEW.stress_level, NEW.mood, NEW.sleep_level)
+               ON CONFLICT (student_id) DO UPDATE SET
+                   record_id = excluded.record_id,
+                   last_submission = excluded.last_submission,
+                   latest_stress = excluded.latest_stress,
+                   latest_mood = excluded.latest_mood,
+                   latest_sleep = excluded.latest_sleep
+               WHERE (excluded.last_submission, excluded.record_id) >
+                     (student_wellbeing_latest.last_submission, student_wellbeing_latest.record_id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_wellbeing_latest_update
+           AFTER UPDATE ON wellbeing_records
+           BEGIN
+               DELETE FROM student_wellbeing_latest WHERE student_id IN (OLD.student_id, NEW.student_id);
+               INSERT INTO student_wellbeing_latest
+                   (student_id, record_id, last_submission, latest_stress, latest_mood, latest_sleep)
+               SELECT student_id, id, recorded_date, stress_level, mood, sleep_level
+               FROM wellbeing_records
+               WHERE id = (SELECT id FROM wellbeing_records WHERE student_id = OLD.student_id
+                           ORDER BY recorded_date DESC, id DESC LIMIT 1)
+                  OR id = (SELECT id FROM wellbeing_records WHERE student_id = NEW.student_id
+                           ORDER BY recorded_date DESC, id DESC LIMIT 1);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_wellbeing_latest_delete
+           AFTER DELETE ON wellbeing_records
+           BEGIN
+               DELETE FROM student_wellbeing_latest WHERE student_id = OLD.student_id;
+               INSERT INTO student_wellbeing_latest
+                   (student_id, record_id, last_submission, latest_stress, latest_mood, latest_sleep)
+               SELECT student_id, id, recorded_date, stress_level, mood, sleep_level
+               FROM wellbeing_records
+               WHERE id = (SELECT id FROM wellbeing_records WHERE student_id = OLD.student_id
+                           ORDER BY recorded_date DESC, id DESC LIMIT 1);
+           END''',
+        backfill_wellbeing_latest,
+    ]),
+    (3, 'Daily wellbeing rollups', [
+        *(_rollup_table_sql(table, keys) for table, keys in ROLLUPS.items()),
+        '''CREATE INDEX IF NOT EXISTS idx_student_daily_rollup_day
+           ON wellbeing_student_daily_rollup (day, student_id)''',
+        _rollup_trigger_sql('INSERT', ['NEW']),
+        _rollup_trigger_sql('UPDATE', ['OLD', 'NEW']),
+        _rollup_trigger_sql('DELETE', ['OLD']),
+        backfill_wellbeing_rollups,
+    ]),
+    (4, 'Full-text student search index', [
+        create_student_search,
+    ]),
+    (5, 'Keyset pagination index for student listings', [
+        '''CREATE INDEX IF NOT EXISTS idx_students_name
+           ON students (last_name, first_name, id)''',
+    ]),
+    (6, 'Per-table change versions', [
+        create_table_versions,
+    ]),
+    (7, 'Date-ordered index for grade exports', [
+        '''CREATE INDEX IF NOT EXISTS idx_grades_graded_date
+           ON grades (graded_date)''',
+    ]),
+    (8, 'Alert rule watermarks', [
+        '''CREATE TABLE IF NOT EXISTS alert_watermarks (
+            source TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    ]),
+    (9, 'Scheduled job leases and run history', [
+        '''CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            owner TEXT,
+            lease_expires REAL NOT NULL DEFAULT 0,
+            runs INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            last_started TIMESTAMP,
+            last_duration_ms REAL,
+            last_error TEXT
+        )''',
+    ]),
+    (10, 'Unread alert counters and type-filtered unread index', [
+        '''CREATE TABLE IF NOT EXISTS alert_unread_counts (
+            alert_type TEXT PRIMARY KEY,
+            unread INTEGER NOT NULL DEFAULT 0
+        )''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_alert_counts_insert AFTER INSERT ON alerts
+           BEGIN
+               {_alert_count_sql('NEW', 1)}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_alert_counts_update
+           AFTER UPDATE OF is_read, alert_type ON alerts
+           BEGIN
+               {_alert_count_sql('OLD', -1)}
+               {_alert_count_sql('NEW', 1)}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_alert_counts_delete AFTER DELETE ON alerts
+           BEGIN
+               {_alert_count_sql('OLD', -1)}
+           END''',
+        '''CREATE INDEX IF NOT EXISTS idx_alerts_unread_type
+           ON alerts (alert_type, created_date) WHERE is_read = 0''',
+        backfill_alert_counts,
+    ]),
+    (11, 'Record of indexes and triggers dropped for bulk loads', [
+        '''CREATE TABLE IF NOT EXISTS deferred_ddl (
+            name TEXT PRIMARY KEY,
+            sql TEXT NOT NULL
+        )''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# Derived tables normally maintained by triggers; bulk loads that drop the
+# triggers call rebuild_derived() afterwards instead
+DERIVED_BACKFILLS = [backfill_wellbeing_latest, backfill_wellbeing_rollups, backfill_student_search,
+                     backfill_alert_counts, touch_table_versions]
+
+
+def rebuild_derived(c):
+    """Recompute every trigger-maintained table from source rows"""
+    for backfill in DERIVED_BACKFILLS:
+        backfill(c)
+
+
+def ensure_version_table(conn):
+    """Create the schema_version bookkeeping table"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    conn.commit()
+
+
+def current_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def defer_ddl(c, objects):
+    """Drop indexes and triggers for a bulk load, given (type, name, sql) rows
+
+    Their DDL is kept in deferred_ddl in the same transaction, so if the load
+    dies before restore_deferred_ddl() the next init_db() puts them back.
+    """
+    for kind, name, sql in objects:
+        c.execute('INSERT OR REPLACE INTO deferred_ddl (name, sql) VALUES (?, ?)', (name, sql))
+        c.execute(f'DROP {kind.upper()} "{name}"')
+
+
+def restore_deferred_ddl(c):
+    """Recreate whatever deferred_ddl lists and is missing and, if anything
+    was, recompute the trigger-maintained tables; returns the count"""
+    c.execute('SELECT name, sql FROM deferred_ddl')
+    deferred = c.fetchall()
+    c.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")
+    existing = {row[0] for row in c.fetchall()}
+    missing = [sql for name, sql in deferred if name not in existing]
+    for sql in missing:
+        c.execute(sql)
+    if missing:
+        rebuild_derived(c)
+    c.execute('DELETE FROM deferred_ddl')
+    return len(missing)
+
+
+def schema_is_current(conn):
+    """True if the database is stamped as fully migrated and no bulk load
+    left indexes or triggers dropped (no DDL either way)"""
+    if conn.execute('PRAGMA user_version').fetchone()[0] != LATEST_VERSION:
+        return False
+    return conn.execute('SELECT 1 FROM deferred_ddl LIMIT 1').fetchone() is None
+
+
+def apply_migrations(conn):
+    """Apply pending migrations in order; returns the versions applied
+
+    Once everything is applied the database header's user_version is set to
+    LATEST_VERSION, which lets later startups skip the schema check.
+    """
+    ensure_version_table(conn)
+    applied = []
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+
+        # Take the write lock first so concurrent workers apply each step once
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            c = conn.cursor()
+            for step in steps:
+                if callable(step):
+                    step(c)
+                else:
+                    c.execute(step)
+            c.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                      (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    if current_version(conn) == LATEST_VERSION:
+        if conn.execute('SELECT 1 FROM deferred_ddl LIMIT 1').fetchone():
+            # A bulk load was interrupted before it rebuilt what it dropped
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                restore_deferred_ddl(conn.cursor())
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        conn.execute(f'PRAGMA user_version = {LATEST_VERSION}')
+    return applied
+
+
+if __name__ == '__main__':
+    from database import get_db_connection, init_db
+
+    init_db()
+    conn = get_db_connection()
+    try:
+        for row in conn.execute('SELECT version, description, applied_at FROM schema_version ORDER BY version'):
+            print(f"{row['version']:>4}  {row['applied_at']}  {row['description']}")
+    finally:
+        conn.close()
@@ -0,0 +1,101 @@
+"""
+In-process notification hub for alert changes.
+
+Writers publish after they commit: 'alert' when new alerts exist and
+'alert_read' with the ids that were acknowledged. Subscribers (the SSE
+stream) block on a condition variable between events, so an idle dashboard
+costs a sleeping thread and a keepalive every HEARTBEAT_SECONDS. New alert
+rows are always read back from the database by id, so a missed doorbell only
+delays delivery until the next heartbeat. This also picks up alerts written
+by other processes, such as a standalone scheduler worker.
+
+Acknowledgements made by other processes never reach this hub. Streams
+check the alerts table version instead (see the stream route). If it moved
+by more than the events they delivered, they send 'resync'.
+
+Each open stream holds a server thread, so only MAX_STREAMS per process are
+held open. Further clients get one catch-up round per connection and then
+reconnect every POLL_RETRY_MS, which turns them into cheap long polls.
+"""
+import os
+import threading
+from collections import deque
+
+# Events kept for subscribers that fall behind
+HUB_BUFFER_SIZE = 1024
+
+# Keepalive interval of idle streams; each one also re-checks the database
+HEARTBEAT_SECONDS = 15
+# Streams end after this long and the browser reconnects with Last-Event-ID,
+# so long-lived connections do not pin a worker forever
+STREAM_MAX_SECONDS = 300
+RETRY_MS = 3000
+
+# Streams held open per process; keep it well below the server's threads
+MAX_STREAMS = int(os.environ.get('ALERT_STREAM_MAX', 4))
+POLL_RETRY_MS = HEARTBEAT_SECONDS * 1000
+
+
+class Hub:
+    """Sequence-numbered ring buffer of events with blocking waits"""
+
+    def __init__(self, maxlen=HUB_BUFFER_SIZE):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._subscribers = 0
+
+    @property
+    def seq(self):
+        with self._cond:
+            return self._seq
+
+    def publish(self, kind, data=None):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, kind, data))
+            self._cond.notify_all()
+            return self._seq
+
+    def wait(self, seq, timeout):
+        """Events after `seq`, waiting up to `timeout` seconds for one
+
+        Returns (latest seq, events, complete); complete is False when some
+        events after `seq` have already been dropped from the buffer.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+            events = [e for e in self._events if e[0] > seq]
+            complete = not events or events[0][0] == seq + 1
+            return self._seq, events, complete
+
+    def subscribe(self, limit=None):
+        """Register a subscriber unless `limit` are already registered"""
+        with self._cond:
+            if limit is not None and self._subscribers >= limit:
+                return False
+            self._subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def stats(self):
+        with self._cond:
+            return {'seq': self._seq, 'buffered': len(self._events), 'subscribers': self._subscribers}
+
+
+hub = Hub()
+
+
+def publish_alerts(count=1):
+    """Announce newly committed alerts"""
+    if count:
+        hub.publish('alert')
+
+
+def publish_read(alert_ids):
+    """Announce alerts that were marked read"""
+    if alert_ids:
+        hub.publish('alert_read', list(alert_ids))
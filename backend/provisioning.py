@@ -0,0 +1,418 @@
+"""
+Bulk provisioning of student accounts from an enrolment roster.
+
+The roster CSV is streamed in chunks. Each chunk is checked for duplicates
+(within the chunk and against existing students and accounts, one query per
+key), its passwords are hashed across a pool of worker processes, and its
+users and students rows are then written together in one transaction with
+students.user_id linking them. Students that already exist without an
+account get one and are linked. Duplicates and invalid rows are rejected and
+reported without stopping the run.
+
+Roster columns: student_id, first_name, last_name, email and optionally
+username (defaults to the student code) and password. Rows without a
+password get a random one. Generated passwords are handed out chunk by chunk
+and never collected for the whole run. The CLI writes them to the
+--credentials file and the endpoint streams them in its response body.
+
+PBKDF2 at the default parameters costs ~0.3 s of CPU per password, so a
+30k roster needs ~2.5 CPU hours. Spread it with --workers, or use a cheaper
+--hash-method for the initial passwords: logins rehash them to
+PASSWORD_HASH_METHOD (see hashing.py). The endpoint is for staff only. It
+accepts at most MAX_REQUEST_ROWS rows, hashes on the shared, bounded login
+pool and never links existing students: that only happens from the CLI.
+
+Usage:
+    python provisioning.py roster.csv --workers 16 --credentials initial.csv
+"""
+import csv
+import io
+import json
+import os
+import secrets
+import time
+from dataclasses import dataclass, field, asdict
+
+import hashing
+import ingest
+
+# Roster rows hashed and written per transaction
+PROVISION_CHUNK_SIZE = 1000
+
+PROVISION_WORKERS = int(os.environ.get('PROVISION_WORKERS', os.cpu_count() or 1))
+
+# Rejected rows kept in the summary; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+
+# Most roster rows accepted by the endpoint; larger rosters go through the CLI
+MAX_REQUEST_ROWS = int(os.environ.get('PROVISION_MAX_REQUEST_ROWS', 500))
+
+REQUIRED_COLUMNS = ('student_id', 'first_name', 'last_name', 'email')
+
+
+class RosterError(ValueError):
+    """The roster cannot be provisioned at all (missing columns)"""
+
+
+class RosterTooLarge(RosterError):
+    """The roster has more rows than one request may provision"""
+
+
+@dataclass
+class ProvisionSummary:
+    rows: int = 0
+    created: int = 0
+    linked: int = 0
+    rejected: int = 0
+    duplicates: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    generated: int = 0
+    rejects: list = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class Duplicate(ValueError):
+    """The row clashes with another roster row or an existing record"""
+
+
+def roster_entry(row):
+    """Validated fields of one roster row"""
+    entry = {key: (row.get(key) or '').strip() for key in (*REQUIRED_COLUMNS, 'username')}
+    for key in REQUIRED_COLUMNS:
+        if not entry[key]:
+            raise ValueError(f'{key} is required')
+    if '@' not in entry['email']:
+        raise ValueError('email is not a valid address')
+    entry['username'] = entry['username'] or entry['student_id']
+    entry['password'] = row.get('password') or None
+    return entry
+
+
+def _lookup(c, query, values):
+    c.execute(query, (json.dumps(sorted(set(values))),))
+    return c.fetchall()
+
+
+def find_conflicts(c, entries, link_existing=True):
+    """Check entries against existing students and accounts
+
+    Returns ({index: Duplicate}, {index: student pk to link}). Without
+    `link_existing`, existing students without an account are conflicts too.
+    """
+    codes = {row[0]: row for row in _lookup(
+        c, 'SELECT student_id, id, user_id, email FROM students '
+           'WHERE student_id IN (SELECT value FROM json_each(?))', [e['student_id'] for e in entries])}
+    student_emails = {row[0]: row[1] for row in _lookup(
+        c, 'SELECT email, student_id FROM students WHERE email IN (SELECT value FROM json_each(?))',
+        [e['email'] for e in entries])}
+    usernames = {row[0] for row in _lookup(
+        c, 'SELECT username FROM users WHERE username IN (SELECT value FROM json_each(?))',
+        [e['username'] for e in entries])}
+    user_emails = {row[0] for row in _lookup(
+        c, 'SELECT email FROM users WHERE email IN (SELECT value FROM json_each(?))',
+        [e['email'] for e in entries])}
+
+    conflicts, links = {}, {}
+    for i, entry in enumerate(entries):
+        existing = codes.get(entry['student_id'])
+        if existing is not None and existing['user_id'] is not None:
+            conflicts[i] = Duplicate(f"Student {entry['student_id']} already has an account")
+        elif existing is not None and existing['email'] != entry['email']:
+            conflicts[i] = Duplicate(f"Student {entry['student_id']} exists with another email")
+        elif existing is None and entry['email'] in student_emails:
+            conflicts[i] = Duplicate(f"Email {entry['email']} belongs to student {student_emails[entry['email']]}")
+        elif entry['username'] in usernames:
+            conflicts[i] = Duplicate(f"Username {entry['username']} is taken")
+        elif entry['email'] in user_emails:
+            conflicts[i] = Duplicate(f"Email {entry['email']} already has an account")
+        elif existing is not None and not link_existing:
+            conflicts[i] = Duplicate(f"Student {entry['student_id']} already exists; "
+                                     "link it with provisioning.py")
+        elif existing is not None:
+            links[i] = existing['id']
+    return conflicts, links
+
+
+def open_roster(stream):
+    """csv.DictReader over `stream`; raises RosterError if columns are missing"""
+    reader = csv.DictReader(stream)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise RosterError(f'Missing columns: {", ".join(missing)}')
+    return reader
+
+
+def _claim(entries):
+    """Index of each entry repeating a key of an earlier one -> Duplicate"""
+    claimed = {key: set() for key in ('student_id', 'username', 'email')}
+    repeats = {}
+    for i, entry in enumerate(entries):
+        key = next((key for key, values in claimed.items() if entry[key] in values), None)
+        if key is not None:
+            repeats[i] = Duplicate(f'{key} {entry[key]} appears earlier in the roster')
+            continue
+        for key, values in claimed.items():
+            values.add(entry[key])
+    return repeats
+
+
+def iter_provision(conn, reader, chunk_size=PROVISION_CHUNK_SIZE, workers=PROVISION_WORKERS,
+                   hash_method=None, on_reject=None, shared_pool=False, link_existing=True):
+    """Provision the rows of an open_roster() reader chunk by chunk
+
+    Yields (summary, generated) after each committed chunk, where generated
+    lists (entry, password) for the chunk's random passwords.
+    `on_reject(line, row, error)` is called for every rejected row. With
+    `shared_pool` passwords are hashed on hashing.pool, a slice of workers
+    at a time, instead of a pool of `workers` processes of its own.
+    Existing students are only linked to new accounts with `link_existing`.
+    """
+    c = conn.cursor()
+    summary = ProvisionSummary()
+    started = time.perf_counter()
+    chunk = []
+
+    def reject(line, row, error):
+        summary.rejected += 1
+        summary.duplicates += 1 if isinstance(error, Duplicate) else 0
+        if len(summary.rejects) < MAX_REPORTED_REJECTS:
+            summary.rejects.append({'line': line, 'error': str(error)})
+        if on_reject:
+            on_reject(line, row, str(error))
+
+    def hash_all(passwords):
+        if shared_pool:
+            return hashing.pool.map(hashing.hash_password, [(p, hash_method) for p in passwords])
+        return hashing.hash_many(passwords, executor, workers, hash_method)
+
+    def flush():
+        items = list(chunk)
+        chunk.clear()
+        # Keys of earlier chunks are already in the database, so only rows
+        # that are written claim them; a rejected row never blocks a later one
+        conflicts, _ = find_conflicts(c, [entry for _, _, entry in items], link_existing)
+        accepted = [i for i in range(len(items)) if i not in conflicts]
+        for j, error in _claim([items[i][2] for i in accepted]).items():
+            conflicts[accepted[j]] = error
+        for i in sorted(conflicts):
+            reject(items[i][0], items[i][1], conflicts[i])
+        items = [item for i, item in enumerate(items) if i not in conflicts]
+        if not items:
+            return []
+        passwords = [entry['password'] or secrets.token_urlsafe(9) for _, _, entry in items]
+        # Hash outside the transaction; it is by far the slowest step
+        hashes = hash_all(passwords)
+
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-check under the write lock in case another writer got there first
+            conflicts, links = find_conflicts(c, [entry for _, _, entry in items], link_existing)
+            rows = [(entry, password, pwhash, links.get(i))
+                    for i, ((_, _, entry), password, pwhash) in enumerate(zip(items, passwords, hashes))
+                    if i not in conflicts]
+            user_ids = ingest.insert_many(
+                c, 'INSERT INTO users (username, password, email, role) VALUES (?, ?, ?, ?)',
+                [(entry['username'], pwhash, entry['email'], 'student') for entry, _, pwhash, _ in rows]
+            ) if rows else []
+            c.executemany('''INSERT INTO students (user_id, student_id, first_name, last_name, email)
+                             VALUES (?, ?, ?, ?, ?)''',
+                          [(user_id, entry['student_id'], entry['first_name'], entry['last_name'], entry['email'])
+                           for (entry, _, _, link), user_id in zip(rows, user_ids) if link is None])
+            c.executemany('UPDATE students SET user_id = ? WHERE id = ? AND user_id IS NULL',
+                          [(user_id, link) for (_, _, _, link), user_id in zip(rows, user_ids)
+                           if link is not None])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        for i, error in conflicts.items():
+            reject(items[i][0], items[i][1], error)
+        linked = sum(1 for *_, link in rows if link is not None)
+        summary.linked += linked
+        summary.created += len(rows) - linked
+        summary.chunks += 1
+        generated = [(entry, password) for entry, password, _, _ in rows if entry['password'] is None]
+        summary.generated += len(generated)
+        return generated
+
+    executor = None if shared_pool else hashing.bulk_executor(workers)
+    try:
+        for row in reader:
+            summary.rows += 1
+            line = reader.line_num
+            try:
+                entry = roster_entry(row)
+            except ValueError as e:
+                reject(line, row, e)
+                continue
+            chunk.append((line, row, entry))
+            if len(chunk) >= chunk_size:
+                generated = flush()
+                summary.seconds = round(time.perf_counter() - started, 3)
+                yield summary, generated
+        generated = flush() if chunk else []
+        summary.seconds = round(time.perf_counter() - started, 3)
+        yield summary, generated
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def provision(conn, stream, chunk_size=PROVISION_CHUNK_SIZE, workers=PROVISION_WORKERS,
+              hash_method=None, progress=None, on_reject=None, on_credential=None):
+    """Create and link accounts for every roster row; returns a ProvisionSummary
+
+    `progress(summary)` is called after each committed chunk,
+    `on_reject(line, row, error)` for every rejected row and
+    `on_credential(entry, password)` for every generated password (which
+    are otherwise only counted).
+    """
+    summary = None
+    for summary, generated in iter_provision(conn, open_roster(stream), chunk_size, workers,
+                                             hash_method, on_reject):
+        if on_credential:
+            for entry, password in generated:
+                on_credential(entry, password)
+        if progress:
+            progress(summary)
+    return summary
+
+
+def _read_roster(stream, max_rows):
+    """The whole uploaded roster as a text buffer, keeping its line numbers
+
+    Counts parsed CSV records (blank lines skipped, quoted line breaks kept
+    within their record) and raises RosterTooLarge as soon as there are
+    more than `max_rows` after the header.
+    """
+    lines = []
+
+    def recorded():
+        for line in stream:
+            lines.append(line)
+            yield line
+
+    # The header is the first non-empty record
+    records = -1
+    for record in csv.reader(recorded()):
+        records += 1 if record else 0
+        if records > max_rows:
+            raise RosterTooLarge(f'Roster exceeds {max_rows} rows; use provisioning.py for larger rosters')
+    return io.StringIO(''.join(lines))
+
+
+def provision_request():
+    """Provision the roster uploaded with the current request
+
+    Accepts a multipart `file` field or a raw text/csv body, like the CSV
+    imports, of at most MAX_REQUEST_ROWS rows. Rows for students that
+    already exist are rejected rather than linked. Returns a streamed response
+    whose body lists generated passwords in `credentials` as each chunk
+    commits, followed by the summary, or an error response for a rejected
+    roster.
+    """
+    from flask import Response, jsonify, request, stream_with_context
+    from cache import invalidate
+    from database import get_db_connection
+    from importer import text_stream
+
+    upload = request.files.get('file')
+    stream = text_stream(upload.stream if upload else request.stream)
+    chunk_size = max(request.args.get('chunk_size', PROVISION_CHUNK_SIZE, type=int), 1)
+    try:
+        reader = open_roster(_read_roster(stream, MAX_REQUEST_ROWS))
+    except RosterTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except RosterError as e:
+        return jsonify({'error': str(e)}), 400
+    except UnicodeDecodeError:
+        return jsonify({'error': 'File is not UTF-8 encoded CSV'}), 400
+
+    def generate():
+        conn = get_db_connection()
+        summary, error, separator = ProvisionSummary(), None, ''
+        try:
+            yield '{"credentials":['
+            try:
+                for summary, generated in iter_provision(conn, reader, chunk_size, shared_pool=True,
+                                                         link_existing=False):
+                    for entry, password in generated:
+                        yield separator + json.dumps({'student_id': entry['student_id'],
+                                                      'username': entry['username'], 'password': password})
+                        separator = ','
+            except (hashing.HashingBusy, hashing.HashingTimeout) as e:
+                # Chunks already committed stay; the summary says how far it got
+                error = str(e)
+            body = summary.to_dict()
+            if error:
+                body['error'] = error
+            yield '],' + json.dumps(body)[1:]
+        finally:
+            conn.close()
+            if summary.created or summary.linked:
+                invalidate('students')
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from database import init_db, get_db_connection
+
+    parser = argparse.ArgumentParser(description='Create student accounts from an enrolment roster CSV')
+    parser.add_argument('path', help="CSV file, or '-' for stdin")
+    parser.add_argument('--workers', type=int, default=PROVISION_WORKERS,
+                        help='hashing processes (0 hashes inline)')
+    parser.add_argument('--chunk-size', type=int, default=PROVISION_CHUNK_SIZE,
+                        help='rows committed per transaction')
+    parser.add_argument('--hash-method', default=None,
+                        help=f'werkzeug hash method for initial passwords (default {hashing.HASH_METHOD})')
+    parser.add_argument('--credentials', help='write generated passwords to this CSV file')
+    parser.add_argument('--rejects', help='write rejected rows and reasons to this CSV file')
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    credentials_file = open(args.credentials, 'w', newline='') if args.credentials else None
+    rejects_file = open(args.rejects, 'w', newline='') if args.rejects else None
+    credentials = csv.writer(credentials_file) if credentials_file else None
+    if credentials:
+        credentials.writerow(['student_id', 'username', 'password'])
+    rejects = csv.writer(rejects_file) if rejects_file else None
+    if rejects:
+        rejects.writerow(['line', 'error', *REQUIRED_COLUMNS, 'username'])
+
+    def on_credential(entry, password):
+        if credentials:
+            credentials.writerow([entry['student_id'], entry['username'], password])
+
+    def on_reject(line, row, error):
+        if rejects:
+            rejects.writerow([line, error, *(row.get(k) for k in (*REQUIRED_COLUMNS, 'username'))])
+
+    def progress(summary):
+        print(f'  {summary.created + summary.linked:,} accounts, {summary.rejected:,} rejected', flush=True)
+
+    source = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8-sig')
+    try:
+        summary = provision(conn, source, args.chunk_size, args.workers, args.hash_method,
+                            progress, on_reject, on_credential if credentials else None)
+    except RosterError as e:
+        parser.error(str(e))
+    finally:
+        source.close()
+        for f in (credentials_file, rejects_file):
+            if f:
+                f.close()
+        conn.close()
+
+    print(f'{summary.created:,} accounts created and {summary.linked:,} linked to existing students '
+          f'from {summary.rows:,} rows in {summary.seconds}s '
+          f'({summary.rejected:,} rejected, {summary.duplicates:,} duplicates)')
+    if summary.generated and not credentials:
+        print(f'{summary.generated:,} generated passwords were not saved; use --credentials')
@@ -0,0 +1,152 @@
+"""
+Helpers for large responses streamed straight from a SQLite cursor.
+
+The query runs inside the response generator and rows are serialized in
+fetchmany() batches, so headers go out immediately and memory stays flat
+regardless of how many rows the query returns. Chart endpoints can instead
+ask for a columnar body, exports are streamed as CSV, and large bodies are
+compressed when the client accepts gzip or deflate.
+"""
+import csv
+import gzip
+import io
+import json
+import zlib
+from flask import Response, jsonify, request, stream_with_context
+
+STREAM_BATCH_SIZE = 1000
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_TYPES = ('application/json', 'text/csv', 'text/plain')
+
+
+def iter_json_rows(cursor, batch_size=STREAM_BATCH_SIZE):
+    """Yield comma-separated JSON row objects, one batch of rows at a time"""
+    columns = [d[0] for d in cursor.description]
+    separator = ''
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield separator + ','.join(
+            json.dumps(dict(zip(columns, row)), separators=(',', ':')) for row in rows)
+        separator = ','
+
+
+def stream_query(conn, query, params=(), batch_size=STREAM_BATCH_SIZE):
+    """Stream the rows of `query` as a JSON array; closes `conn` when done"""
+    def generate():
+        try:
+            # Send the opening bracket before SQLite starts producing rows
+            yield '['
+            cursor = conn.execute(query, params)
+            yield from iter_json_rows(cursor, batch_size)
+            yield ']'
+        finally:
+            conn.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def iter_csv_rows(cursor, batch_size=STREAM_BATCH_SIZE):
+    """Yield a CSV header line, then CSV text for each batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([d[0] for d in cursor.description])
+    while True:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        writer.writerows(rows)
+
+
+def stream_csv(conn, query, params=(), filename='export.csv', batch_size=STREAM_BATCH_SIZE):
+    """Stream the rows of `query` as a CSV download; closes `conn` when done"""
+    def generate():
+        try:
+            cursor = conn.execute(query, params)
+            yield from iter_csv_rows(cursor, batch_size)
+        finally:
+            conn.close()
+
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def columnar_query(conn, query, params=(), batch_size=STREAM_BATCH_SIZE):
+    """Run `query` and return {columns, data: {column: [values]}}
+
+    Key names appear once instead of once per row, which shrinks wide chart
+    payloads several times over before compression.
+    """
+    try:
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        values = [[] for _ in columns]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for column_values, column in zip(values, zip(*rows)):
+                column_values.extend(column)
+    finally:
+        conn.close()
+    return jsonify({'columns': columns, 'data': dict(zip(columns, values))})
+
+
+def query_response(conn, query, params=()):
+    """Rows of `query` in the format the client asked for (?format=columnar)"""
+    if request.args.get('format') == 'columnar':
+        return columnar_query(conn, query, params)
+    return stream_query(conn, query, params)
+
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    for encoding in sorted(('gzip', 'deflate'), key=lambda e: -accepted[e]):
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+def _compress_stream(chunks, encoding):
+    # wbits 31 writes a gzip container, 15 a zlib one (HTTP "deflate")
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """after_request hook: gzip/deflate large JSON and CSV bodies"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < MIN_COMPRESS_SIZE:
+            return response
+        if encoding == 'gzip':
+            response.set_data(gzip.compress(body, COMPRESS_LEVEL))
+        else:
+            response.set_data(zlib.compress(body, COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,8 +1,19 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from database import get_db_connection
+from versioning import conditional
+from cache import invalidate
+import alert_rules
+import notifications
+import base64
+import json
+import time
+from datetime import date
 
 bp = Blueprint('alerts', __name__, url_prefix='/api/alerts')
 
+UNREAD_COLUMNS = '''a.id, a.student_id, a.alert_type, a.message, a.created_date,
+                 s.first_name, s.last_name, s.student_id as sid'''
+
 @bp.route('/create', methods=['POST'])
 def create_alert():
     """Create an alert for a student"""
@@ -21,10 +32,13 @@ def create_alert():
     conn.commit()
     alert_id = c.lastrowid
     conn.close()
+    invalidate('alerts')
+    notifications.publish_alerts()
     
     return jsonify({'message': 'Alert created', 'alert_id': alert_id}), 201
 
 @bp.route('/student/<int:student_id>', methods=['GET'])
+@conditional('alerts')
 def get_student_alerts(student_id):
     """Get all alerts for a student"""
     include_read = request.args.get('include_read', False, type=bool)
@@ -48,23 +62,205 @@ def get_student_alerts(student_id):
     
     return jsonify([dict(a) for a in alerts]), 200
 
+# Page size of the unread feed when `limit` is not given, and its maximum
+UNREAD_PAGE_SIZE = 100
+MAX_UNREAD_PAGE_SIZE = 500
+
+def _encode_cursor(created_date, alert_id):
+    """Opaque keyset cursor for the alert after which the next page starts"""
+    raw = json.dumps([created_date, alert_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    """Inverse of _encode_cursor; raises ValueError on malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_date, alert_id = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(created_date, str) or not isinstance(alert_id, int):
+        raise ValueError('Invalid cursor')
+    return [created_date, alert_id]
+
 @bp.route('/unread', methods=['GET'])
+@conditional('alerts', 'students')
 def get_unread_alerts():
-    """Get all unread alerts for staff"""
+    """Get unread alerts for staff, newest first (keyset paginated)
+
+    Filters: `alert_type` (repeatable or comma-separated) and `student_id`.
+    The cursor for the next page is returned in the X-Next-Cursor header and
+    passed back as `after`.
+    """
+    limit = request.args.get('limit', UNREAD_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_UNREAD_PAGE_SIZE))
+    alert_types = [t for arg in request.args.getlist('alert_type') for t in arg.split(',') if t]
+    student_id = request.args.get('student_id', type=int)
+    after = request.args.get('after', type=str)
+
+    conditions = ['a.is_read = 0']
+    params = []
+    if alert_types:
+        conditions.append(f"a.alert_type IN ({', '.join('?' * len(alert_types))})")
+        params += alert_types
+    if student_id is not None:
+        conditions.append('a.student_id = ?')
+        params.append(student_id)
+    if after:
+        try:
+            params += _decode_cursor(after)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        conditions.append('(a.created_date, a.id) < (?, ?)')
+
     conn = get_db_connection()
     c = conn.cursor()
     
-    c.execute('''SELECT a.id, a.student_id, a.alert_type, a.message, a.created_date,
-                 s.first_name, s.last_name, s.student_id as sid
+    c.execute(f'''SELECT {UNREAD_COLUMNS}
                  FROM alerts a
                  JOIN students s ON a.student_id = s.id
-                 WHERE a.is_read = 0
-                 ORDER BY a.created_date DESC''')
+                 WHERE {' AND '.join(conditions)}
+                 ORDER BY a.created_date DESC, a.id DESC
+                 LIMIT ?''', params + [limit])
     
     alerts = c.fetchall()
     conn.close()
     
-    return jsonify([dict(a) for a in alerts]), 200
+    response = jsonify([dict(a) for a in alerts])
+    if len(alerts) == limit:
+        last = alerts[-1]
+        response.headers['X-Next-Cursor'] = _encode_cursor(last['created_date'], last['id'])
+    return response, 200
+
+@bp.route('/unread/counts', methods=['GET'])
+@conditional('alerts')
+def get_unread_counts():
+    """Unread alert counts by type, read from the trigger-maintained counters"""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''SELECT alert_type, unread FROM alert_unread_counts
+                               WHERE unread > 0 ORDER BY alert_type''').fetchall()
+    finally:
+        conn.close()
+    by_type = {row['alert_type']: row['unread'] for row in rows}
+    return jsonify({'total': sum(by_type.values()), 'by_type': by_type}), 200
+
+# Most alerts sent per database read while a stream catches up
+STREAM_BATCH_SIZE = 500
+
+def _latest_alert_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM alerts').fetchone()[0]
+
+def _alerts_after(alert_id):
+    """Unread alerts newer than `alert_id`, oldest first, the id to resume
+    after and the alerts table version they were read at"""
+    conn = get_db_connection()
+    try:
+        # One read transaction, so the version matches the rows exactly
+        conn.execute('BEGIN')
+        version = conn.execute("SELECT version FROM table_versions WHERE table_name = 'alerts'").fetchone()[0]
+        # Bound the scan first so alerts committed in between are not skipped
+        latest = _latest_alert_id(conn)
+        rows = conn.execute(f'''SELECT {UNREAD_COLUMNS}
+                                FROM alerts a
+                                JOIN students s ON a.student_id = s.id
+                                WHERE a.id > ? AND a.id <= ? AND a.is_read = 0
+                                ORDER BY a.id
+                                LIMIT ?''', (alert_id, latest, STREAM_BATCH_SIZE)).fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+    if len(rows) == STREAM_BATCH_SIZE:
+        latest = rows[-1]['id']
+    return [dict(r) for r in rows], max(latest, alert_id), version
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+def _parse_event_id(value):
+    """(alert id, alerts version or None) from Last-Event-ID
+
+    Alert events carry their alert id. The markers sent after each version
+    check carry "<alert id>:<version>", so a reconnecting client also tells
+    the stream which version it is up to date with.
+    """
+    alert_id, _, version = (value or '').partition(':')
+    try:
+        return int(alert_id), int(version) if version else None
+    except ValueError:
+        return None, None
+
+@bp.route('/stream', methods=['GET'])
+def stream_alerts():
+    """Server-Sent Events feed of new and acknowledged alerts
+
+    Resumes after `since_id` or the Last-Event-ID header; without either it
+    starts at the newest alert, after the client has loaded /unread.
+    Beyond notifications.MAX_STREAMS open streams per process, clients get
+    one catch-up round per connection and reconnect after POLL_RETRY_MS.
+    """
+    since_id, known = _parse_event_id(request.headers.get('Last-Event-ID'))
+    if since_id is None:
+        since_id = request.args.get('since_id', type=int)
+    if since_id is None:
+        conn = get_db_connection()
+        since_id = _latest_alert_id(conn)
+        conn.close()
+    # Take the hub position now so events published while connecting are kept
+    seq = notifications.hub.seq
+    hub = notifications.hub
+    streaming = hub.subscribe(notifications.MAX_STREAMS)
+
+    def generate(seq=seq, last_id=since_id, known=known):
+        try:
+            yield f'retry: {notifications.RETRY_MS if streaming else notifications.POLL_RETRY_MS}\n\n'
+            deadline = time.monotonic() + notifications.STREAM_MAX_SECONDS
+            verify_at = time.monotonic() + notifications.HEARTBEAT_SECONDS
+            check, verify, read = True, True, []
+            # Alerts version changes explained by events sent since the last check
+            changes = 0
+            while True:
+                # New rows first, so a client sees an alert before its acknowledgement
+                while check:
+                    alerts, next_id, version = _alerts_after(last_id)
+                    for alert in alerts:
+                        yield _sse('alert', alert, alert['id'])
+                    changes += len(alerts)
+                    check = len(alerts) == STREAM_BATCH_SIZE
+                    last_id = next_id
+                if read:
+                    yield _sse('alert_read', {'ids': read})
+                    changes += len(read)
+                if verify:
+                    # Anything else changed alerts in another process, most
+                    # likely an acknowledgement that was never published here
+                    if known is not None and version != known + changes:
+                        yield _sse('resync', {})
+                    known, changes, verify = version, 0, False
+                    verify_at = time.monotonic() + notifications.HEARTBEAT_SECONDS
+                    yield f'id: {last_id}:{known}\n: keepalive\n\n'
+
+                remaining = deadline - time.monotonic()
+                if not streaming or remaining <= 0:
+                    return
+                seq, events, complete = hub.wait(seq, min(notifications.HEARTBEAT_SECONDS, remaining))
+                read = [i for _, kind, ids in events if kind == 'alert_read' for i in ids]
+                check = any(kind == 'alert' for _, kind, _ in events)
+                if not complete:
+                    # Missed acknowledgements cannot be replayed
+                    yield _sse('resync', {})
+                    check, verify, known = True, True, None
+                if not events or time.monotonic() >= verify_at:
+                    # Idle, or due: pick up alerts written by other processes
+                    # and check the version
+                    check = verify = True
+        finally:
+            if streaming:
+                hub.unsubscribe()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @bp.route('/mark-read/<int:alert_id>', methods=['PUT'])
 def mark_alert_read(alert_id):
@@ -73,48 +269,120 @@ def mark_alert_read(alert_id):
     c = conn.cursor()
     
     c.execute('''UPDATE alerts SET is_read = 1 WHERE id = ?''', (alert_id,))
+    updated = c.rowcount
     
     conn.commit()
     conn.close()
+    invalidate('alerts')
+    if updated:
+        notifications.publish_read([alert_id])
     
     return jsonify({'message': 'Alert marked as read'}), 200
 
-@bp.route('/check-wellbeing', methods=['GET'])
-def check_wellbeing_alerts():
-    """Check for students needing alerts based on wellbeing data"""
+# Most ids accepted by one bulk acknowledgement
+MAX_ACKNOWLEDGE_IDS = 5000
+
+def _acknowledge_conditions(data):
+    """WHERE conditions and params selecting the alerts a bulk request names
+
+    Raises ValueError for a malformed body or one that selects nothing.
+    """
+    conditions, params = ['is_read = 0'], []
+
+    ids = data.get('ids')
+    if ids is not None:
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            raise ValueError('ids must be a non-empty array of integers')
+        if len(ids) > MAX_ACKNOWLEDGE_IDS:
+            raise ValueError(f'At most {MAX_ACKNOWLEDGE_IDS} ids per request')
+        conditions.append('id IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(ids))
+
+    student_id = data.get('student_id')
+    if student_id is not None:
+        if not isinstance(student_id, int) or isinstance(student_id, bool):
+            raise ValueError('student_id must be an integer')
+        conditions.append('student_id = ?')
+        params.append(student_id)
+
+    alert_types = data.get('alert_type')
+    if alert_types is not None:
+        if isinstance(alert_types, str):
+            alert_types = [alert_types]
+        if not isinstance(alert_types, list) or not alert_types or not all(isinstance(t, str) for t in alert_types):
+            raise ValueError('alert_type must be a string or an array of strings')
+        conditions.append(f"alert_type IN ({', '.join('?' * len(alert_types))})")
+        params += alert_types
+
+    older_than = data.get('older_than')
+    if older_than is not None:
+        try:
+            older_than = date.fromisoformat(str(older_than)).isoformat()
+        except ValueError:
+            raise ValueError('older_than must be a YYYY-MM-DD date') from None
+        conditions.append('created_date < ?')
+        params.append(older_than)
+
+    if len(conditions) == 1:
+        raise ValueError('Provide ids or at least one of student_id, alert_type, older_than')
+    return conditions, params
+
+@bp.route('/mark-read', methods=['POST'])
+def mark_alerts_read():
+    """Mark every unread alert matching ids and/or filters as read in one transaction"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        conditions, params = _acknowledge_conditions(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Find students with high stress or low sleep in last 7 days
-    c.execute('''SELECT DISTINCT s.id, s.first_name, s.last_name,
-                 wr.stress_level, wr.sleep_level, wr.recorded_date
+    try:
+        # One statement: the unread counters are updated by trigger in the
+        # same transaction
+        rows = conn.execute(f'''UPDATE alerts SET is_read = 1
+                                WHERE {' AND '.join(conditions)}
+                                RETURNING id, alert_type''', params).fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+
+    by_type = {}
+    for row in rows:
+        by_type[row['alert_type']] = by_type.get(row['alert_type'], 0) + 1
+    if rows:
+        invalidate('alerts')
+        notifications.publish_read(sorted(row['id'] for row in rows))
+
+    return jsonify({'message': 'Alerts marked as read', 'updated': len(rows), 'by_type': by_type}), 200
+
+def _alerted_students(c, alerts):
+    """Each newly alerted student with their latest wellbeing reading, in the
+    shape of the `students` list this endpoint has always returned"""
+    c.execute('''SELECT s.id, s.first_name, s.last_name,
+                        l.latest_stress AS stress_level, l.latest_sleep AS sleep_level,
+                        l.last_submission AS recorded_date
                  FROM students s
-                 JOIN wellbeing_records wr ON s.id = wr.student_id
-                 WHERE (wr.stress_level > 7 OR wr.sleep_level < 4)
-                 AND wr.recorded_date >= datetime('now', '-7 days')
-                 AND NOT EXISTS (
-                     SELECT 1 FROM alerts a 
-                     WHERE a.student_id = s.id 
-                     AND a.is_read = 0
-                     AND a.created_date >= datetime('now', '-1 day')
-                 )
-                 ORDER BY wr.recorded_date DESC''')
-    
-    students = c.fetchall()
-    
-    # Create alerts for these students
-    for student in students:
-        alert_type = 'high_stress' if student['stress_level'] > 7 else 'low_sleep'
-        message = f"Student {student['first_name']} has {'high stress levels' if alert_type == 'high_stress' else 'low sleep levels'}"
-        
-        c.execute('''INSERT INTO alerts (student_id, alert_type, message) 
-                     VALUES (?, ?, ?)''',
-                  (student['id'], alert_type, message))
-    
-    conn.commit()
-    conn.close()
+                 LEFT JOIN student_wellbeing_latest l ON l.student_id = s.id
+                 WHERE s.id IN (SELECT value FROM json_each(?))
+                 ORDER BY l.last_submission DESC, s.id''',
+              (json.dumps(sorted({a['student_id'] for a in alerts})),))
+    return [dict(row) for row in c.fetchall()]
+
+@bp.route('/check-wellbeing', methods=['GET', 'POST'])
+def check_wellbeing_alerts():
+    """Run the alert rules over wellbeing and attendance records added since the last run"""
+    conn = get_db_connection()
+    try:
+        result = alert_rules.run(conn)
+        result['students'] = _alerted_students(conn.cursor(), result['alerts'])
+    finally:
+        conn.close()
+    if result['alerts_created']:
+        invalidate('alerts')
+        notifications.publish_alerts(result['alerts_created'])
     
-    return jsonify({
-        'alerts_created': len(students),
-        'students': [dict(s) for s in students]
-    }), 200
+    return jsonify(result), 200
@@ -1,5 +1,11 @@
 from flask import Blueprint, jsonify, request
 from database import get_db_connection
+from versioning import conditional
+from responses import query_response
+import analytics
+import ingest
+import importer
+from cache import cached, invalidate
 
 bp = Blueprint('attendance', __name__, url_prefix='/api/attendance')
 
@@ -21,10 +27,46 @@ def record_attendance():
     conn.commit()
     record_id = c.lastrowid
     conn.close()
+    invalidate('attendance')
     
     return jsonify({'message': 'Attendance recorded', 'record_id': record_id}), 201
 
+@bp.route('/record-batch', methods=['POST'])
+def record_attendance_batch():
+    """Record a whole register in one transaction"""
+    try:
+        records = ingest.parse_batch(request.get_json(silent=True))
+    except ingest.BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    try:
+        body, status = ingest.write_batch(
+            conn, records, ingest.attendance_row,
+            '''INSERT INTO attendance (student_id, class_date, present)
+               VALUES (?, ?, ?)''')
+    finally:
+        conn.close()
+    if status == 201:
+        invalidate('attendance')
+    
+    return jsonify(body), status
+
+@bp.route('/import', methods=['POST'])
+def import_attendance():
+    """Import an attendance register CSV (student codes, see importer.py)"""
+    conn = get_db_connection()
+    try:
+        body, status = importer.import_request(conn, 'attendance')
+    finally:
+        conn.close()
+    if body.get('imported'):
+        invalidate('attendance')
+    
+    return jsonify(body), status
+
 @bp.route('/student/<int:student_id>', methods=['GET'])
+@conditional('attendance')
 def get_student_attendance(student_id):
     """Get attendance records for a student"""
     days = request.args.get('days', 30, type=int)
@@ -44,6 +86,7 @@ def get_student_attendance(student_id):
     return jsonify([dict(r) for r in records]), 200
 
 @bp.route('/absent-students', methods=['GET'])
+@conditional('attendance', 'students')
 def get_absent_students():
     """Get list of students who were absent"""
     days = request.args.get('days', 30, type=int)
@@ -71,34 +114,21 @@ def get_absent_students():
     return jsonify([dict(s) for s in students]), 200
 
 @bp.route('/attendance-grades-correlation', methods=['GET'])
+@conditional('attendance', 'grades', 'students')
 def get_attendance_grades_correlation():
     """Get correlation between attendance and grades"""
     days = request.args.get('days', 30, type=int)
     
     conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT s.id, s.first_name, s.last_name,
-                 COUNT(CASE WHEN a.present = 1 THEN 1 END) as present_count,
-                 COUNT(*) as total_classes,
-                 CAST(COUNT(CASE WHEN a.present = 1 THEN 1 END) AS FLOAT) / COUNT(*) as attendance_rate,
-                 AVG(g.grade) as avg_grade,
-                 MIN(g.grade) as min_grade,
-                 MAX(g.grade) as max_grade
-                 FROM students s
-                 LEFT JOIN attendance a ON s.id = a.student_id
-                 LEFT JOIN grades g ON s.id = g.student_id
-                 WHERE a.class_date >= date('now', '-' || ? || ' days')
-                 GROUP BY s.id
-                 ORDER BY attendance_rate DESC''',
-              (days,))
-    
-    data = c.fetchall()
-    conn.close()
     
-    return jsonify([dict(d) for d in data]), 200
+    # One row per student: stream it (or send it columnar) rather than
+    # materializing a list of dicts
+    query, params = analytics.attendance_grades_correlation(days)
+    return query_response(conn, query, params)
 
 @bp.route('/summary', methods=['GET'])
+@conditional('attendance')
+@cached(ttl=60, tables=['attendance'])
 def get_attendance_summary():
     """Get attendance summary statistics"""
     conn = get_db_connection()
@@ -1,11 +1,18 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import create_access_token
-from werkzeug.security import generate_password_hash, check_password_hash
 from database import get_db_connection
+from access import staff_required
+import hashing
 import sqlite3
+import time
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+def _hashing_unavailable(e):
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -14,12 +21,15 @@ def register():
     if not data or not data.get('username') or not data.get('password') or not data.get('email'):
         return jsonify({'error': 'Missing required fields'}), 400
     
+    start = time.perf_counter()
+    status = 500
     conn = None
     try:
+        # Hash before taking a connection; it is the slow part
+        hashed_password = hashing.hash_password_async(data['password'])
         conn = get_db_connection()
         c = conn.cursor()
         
-        hashed_password = generate_password_hash(data['password'])
         c.execute('''INSERT INTO users (username, password, email, role) 
                      VALUES (?, ?, ?, ?)''',
                   (data['username'], hashed_password, data['email'], data.get('role', 'student')))
@@ -27,15 +37,29 @@ def register():
         conn.commit()
         user_id = c.lastrowid
         
+        status = 201
         return jsonify({'message': 'User registered successfully', 'user_id': user_id}), 201
     
+    except (hashing.HashingBusy, hashing.HashingTimeout) as e:
+        status = 503
+        return _hashing_unavailable(e)
     except sqlite3.IntegrityError as e:
+        status = 409
         return jsonify({'error': 'Username or email already exists'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
         if conn:
             conn.close()
+        hashing.latency['register'].record((time.perf_counter() - start) * 1000, status >= 500)
+
+@bp.route('/provision', methods=['POST'])
+@staff_required
+def provision_accounts():
+    """Create linked student accounts from a roster CSV (see provisioning.py)"""
+    import provisioning
+
+    return provisioning.provision_request()
 
 @bp.route('/login', methods=['POST'])
 def login():
@@ -45,6 +69,8 @@ def login():
     if not data or not data.get('username') or not data.get('password'):
         return jsonify({'error': 'Missing username or password'}), 400
     
+    start = time.perf_counter()
+    status = 500
     conn = None
     try:
         conn = get_db_connection()
@@ -52,9 +78,15 @@ def login():
         
         c.execute('SELECT * FROM users WHERE username = ?', (data['username'],))
         user = c.fetchone()
+        # Do not hold a pooled connection while waiting for the hash
+        conn.close()
+        conn = None
         
-        if user and check_password_hash(user['password'], data['password']):
-            access_token = create_access_token(identity=user['id'])
+        if user and hashing.verify_password_async(user['password'], data['password']):
+            if hashing.needs_rehash(user['password']):
+                _rehash(user, data['password'])
+            status = 200
+            access_token = create_access_token(identity=str(user['id']))
             return jsonify({
                 'access_token': access_token,
                 'user_id': user['id'],
@@ -62,12 +94,33 @@ def login():
                 'role': user['role']
             }), 200
         
+        status = 401
         return jsonify({'error': 'Invalid username or password'}), 401
+    except (hashing.HashingBusy, hashing.HashingTimeout) as e:
+        status = 503
+        return _hashing_unavailable(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
         if conn:
             conn.close()
+        hashing.latency['login'].record((time.perf_counter() - start) * 1000, status >= 500)
+
+def _rehash(user, password):
+    """Upgrade a stored hash to the current parameters; best effort"""
+    try:
+        new_hash = hashing.hash_password_async(password)
+    except (hashing.HashingBusy, hashing.HashingTimeout):
+        # Try again at the next login rather than delay this one
+        return
+    conn = get_db_connection()
+    try:
+        # Only if the password did not change in the meantime
+        conn.execute('UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                     (new_hash, user['id'], user['password']))
+        conn.commit()
+    finally:
+        conn.close()
 
 @bp.route('/profile', methods=['GET'])
 def get_profile():
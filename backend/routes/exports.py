@@ -0,0 +1,93 @@
+from flask import Blueprint, jsonify, request
+from database import get_db_connection
+from access import staff_required
+from responses import stream_csv
+from datetime import date
+import analytics
+
+bp = Blueprint('exports', __name__, url_prefix='/api/export')
+
+# Raw record exports joined to student names, each ordered by an indexed
+# date column so rows stream straight off the index without a sort.
+# Free-text mental health notes are never exported in bulk.
+EXPORTS = {
+    'wellbeing': ('''SELECT w.id, s.student_id AS student_code, s.first_name, s.last_name,
+                            w.recorded_date, w.sleep_level, w.stress_level, w.mood
+                     FROM wellbeing_records w
+                     JOIN students s ON s.id = w.student_id''',
+                  'w.recorded_date', 'w.id'),
+    'attendance': ('''SELECT a.id, s.student_id AS student_code, s.first_name, s.last_name,
+                             a.class_date, a.present, a.recorded_date
+                      FROM attendance a
+                      JOIN students s ON s.id = a.student_id''',
+                   'a.class_date', 'a.id'),
+    'grades': ('''SELECT g.id, s.student_id AS student_code, s.first_name, s.last_name,
+                         g.assignment_id, asg.title AS assignment_title, g.grade,
+                         g.feedback, g.graded_date
+                  FROM grades g
+                  JOIN students s ON s.id = g.student_id
+                  JOIN assignments asg ON asg.id = g.assignment_id''',
+               'g.graded_date', 'g.id'),
+}
+
+# Per-student analytics; these take a cohort but no date range
+ANALYTICS_EXPORTS = {
+    'performance': analytics.performance_by_attendance,
+}
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date') from None
+
+def _cohort_condition(cohort):
+    """Students enrolled in the given calendar year"""
+    return "s.enrolled_date >= ? AND s.enrolled_date < ?", [f'{cohort}-01-01', f'{cohort + 1}-01-01']
+
+@bp.route('/<dataset>.csv', methods=['GET'])
+@staff_required
+def export_csv(dataset):
+    """Stream a dataset as CSV, filtered by date range (from/to) and cohort"""
+    if dataset not in EXPORTS and dataset not in ANALYTICS_EXPORTS:
+        return jsonify({'error': f'Unknown export: {dataset}'}), 404
+
+    try:
+        start = _date_arg('from')
+        end = _date_arg('to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cohort = request.args.get('cohort', type=int)
+
+    conditions = []
+    params = []
+    if cohort is not None:
+        condition, cohort_params = _cohort_condition(cohort)
+        conditions.append(condition)
+        params += cohort_params
+
+    if dataset in ANALYTICS_EXPORTS:
+        if start or end:
+            return jsonify({'error': f'{dataset} does not support date filters'}), 400
+        inner, inner_params = ANALYTICS_EXPORTS[dataset]()
+        query = f'''SELECT p.* FROM ({inner}) p
+                    JOIN students s ON s.id = p.id
+                    {f"WHERE {' AND '.join(conditions)}" if conditions else ""}'''
+        params = inner_params + params
+    else:
+        select, date_column, id_column = EXPORTS[dataset]
+        if start:
+            conditions.append(f"{date_column} >= ?")
+            params.append(start)
+        if end:
+            conditions.append(f"{date_column} < date(?, '+1 day')")
+            params.append(end)
+        query = f'''{select}
+                    {f"WHERE {' AND '.join(conditions)}" if conditions else ""}
+                    ORDER BY {date_column}, {id_column}'''
+
+    filename = '_'.join(part for part in (dataset, cohort and str(cohort), start, end) if part)
+    return stream_csv(get_db_connection(), query, params, filename=f'{filename}.csv')
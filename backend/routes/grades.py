@@ -1,5 +1,11 @@
 from flask import Blueprint, jsonify, request
 from database import get_db_connection
+from versioning import conditional
+from responses import stream_query
+import analytics
+import ingest
+import importer
+from cache import cached, invalidate
 
 bp = Blueprint('grades', __name__, url_prefix='/api/grades')
 
@@ -21,10 +27,47 @@ def record_grade():
     conn.commit()
     grade_id = c.lastrowid
     conn.close()
+    invalidate('grades')
     
     return jsonify({'message': 'Grade recorded', 'grade_id': grade_id}), 201
 
+@bp.route('/record-batch', methods=['POST'])
+def record_grade_batch():
+    """Record a batch of grades in one transaction"""
+    try:
+        records = ingest.parse_batch(request.get_json(silent=True))
+    except ingest.BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    try:
+        body, status = ingest.write_batch(
+            conn, records, ingest.grade_row,
+            '''INSERT INTO grades (student_id, assignment_id, grade, feedback)
+               VALUES (?, ?, ?, ?)''',
+            references=(('students', 0), ('assignments', 1)))
+    finally:
+        conn.close()
+    if status == 201:
+        invalidate('grades')
+    
+    return jsonify(body), status
+
+@bp.route('/import', methods=['POST'])
+def import_grades():
+    """Import a gradebook CSV (student codes, see importer.py)"""
+    conn = get_db_connection()
+    try:
+        body, status = importer.import_request(conn, 'grades')
+    finally:
+        conn.close()
+    if body.get('imported'):
+        invalidate('grades')
+    
+    return jsonify(body), status
+
 @bp.route('/student/<int:student_id>', methods=['GET'])
+@conditional('grades', 'assignments')
 def get_student_grades(student_id):
     """Get all grades for a student"""
     conn = get_db_connection()
@@ -44,6 +87,7 @@ def get_student_grades(student_id):
     return jsonify([dict(g) for g in grades]), 200
 
 @bp.route('/assignment/<int:assignment_id>', methods=['GET'])
+@conditional('grades', 'students')
 def get_assignment_grades(assignment_id):
     """Get all grades for an assignment"""
     conn = get_db_connection()
@@ -63,6 +107,8 @@ def get_assignment_grades(assignment_id):
     return jsonify([dict(g) for g in grades]), 200
 
 @bp.route('/statistics', methods=['GET'])
+@conditional('grades')
+@cached(ttl=60, tables=['grades'])
 def get_grade_statistics():
     """Get statistics about grades"""
     conn = get_db_connection()
@@ -82,23 +128,11 @@ def get_grade_statistics():
     return jsonify(dict(stats)), 200
 
 @bp.route('/performance-by-attendance', methods=['GET'])
+@conditional('grades', 'attendance', 'students')
 def get_performance_by_attendance():
     """Correlate grades with attendance"""
     conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT s.id, s.first_name, s.last_name,
-                 AVG(g.grade) as avg_grade,
-                 CAST(COUNT(CASE WHEN a.present = 1 THEN 1 END) AS FLOAT) / 
-                    NULLIF(COUNT(*), 0) as attendance_rate,
-                 COUNT(DISTINCT a.id) as total_attendance_records
-                 FROM students s
-                 LEFT JOIN grades g ON s.id = g.student_id
-                 LEFT JOIN attendance a ON s.id = a.student_id
-                 GROUP BY s.id
-                 ORDER BY avg_grade DESC''')
-    
-    data = c.fetchall()
-    conn.close()
     
-    return jsonify([dict(d) for d in data]), 200
+    # One row per student: stream it rather than materializing the list
+    query, params = analytics.performance_by_attendance()
+    return stream_query(conn, query, params)
@@ -1,10 +1,31 @@
 from flask import Blueprint, jsonify, request
 from database import get_db_connection
+import database
+from versioning import conditional, request_versions
+from responses import query_response
+from cache import cached, invalidate
+import ingest
+import alert_rules
+import write_queue
+import notifications
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import base64
 import json
+import threading
+import time
 
 bp = Blueprint('wellbeing', __name__, url_prefix='/api/wellbeing')
 
+# Shortest search term the trigram index can match
+MIN_INDEXED_SEARCH = 3
+
+# Search result totals are cached briefly so each keystroke runs one query
+SEARCH_COUNT_TTL = 30
+SEARCH_COUNT_CACHE_SIZE = 512
+_count_cache = OrderedDict()
+_count_lock = threading.Lock()
+
 @bp.route('/record', methods=['POST'])
 def record_wellbeing():
     """Record wellbeing data for a student"""
@@ -16,55 +37,91 @@ def record_wellbeing():
     # Get student_id - could be user_id for logged in students
     student_id = data.get('student_id')
     
+    # Combine comments and requests into notes
+    notes_parts = []
+    if data.get('comments'):
+        notes_parts.append(f"Comments: {data.get('comments')}")
+    if data.get('requests'):
+        notes_parts.append(f"Requests: {data.get('requests')}")
+    notes = "\n".join(notes_parts) if notes_parts else data.get('notes')
+    
+    params = (student_id or 1,  # Default to 1 if no student_id provided
+              data.get('sleep_level'),
+              data.get('stress_level'),
+              data.get('mood'),
+              notes)
+    
     conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Combine comments and requests into notes
-        notes_parts = []
-        if data.get('comments'):
-            notes_parts.append(f"Comments: {data.get('comments')}")
-        if data.get('requests'):
-            notes_parts.append(f"Requests: {data.get('requests')}")
-        notes = "\n".join(notes_parts) if notes_parts else data.get('notes')
-        
-        c.execute('''INSERT INTO wellbeing_records 
-                     (student_id, sleep_level, stress_level, mood, mental_health_notes) 
-                     VALUES (?, ?, ?, ?, ?)''',
-                  (student_id or 1,  # Default to 1 if no student_id provided
-                   data.get('sleep_level'),
-                   data.get('stress_level'),
-                   data.get('mood'),
-                   notes))
-        
-        conn.commit()
-        record_id = c.lastrowid
-        
-        # Create alert if stress is high or sleep is low
-        if data.get('stress_level') and int(data.get('stress_level')) >= 8:
-            c.execute('''INSERT INTO alerts (student_id, alert_type, message)
-                         VALUES (?, ?, ?)''',
-                      (student_id or 1, 'high_stress', 
-                       f'High stress level ({data.get("stress_level")}/10) reported. Mood: {data.get("mood", "Not specified")}'))
-            conn.commit()
-        
-        if data.get('sleep_level') and int(data.get('sleep_level')) <= 3:
-            c.execute('''INSERT INTO alerts (student_id, alert_type, message)
-                         VALUES (?, ?, ?)''',
-                      (student_id or 1, 'low_sleep', 
-                       f'Low sleep quality ({data.get("sleep_level")}/10) reported.'))
+        if write_queue.WRITE_BEHIND:
+            # Group-committed with other submissions by the writer thread
+            future = write_queue.get_queue(
+                'wellbeing', after_batch=_evaluate_alerts,
+                after_commit=notifications.publish_alerts
+            ).submit(lambda c: _insert_wellbeing(c, params))
+            record_id = future.result(timeout=write_queue.RESULT_TIMEOUT)
+        else:
+            conn = get_db_connection()
+            c = conn.cursor()
+            record_id = _insert_wellbeing(c, params)
+            
+            # Run the alert rules over new records in the same transaction, so
+            # high stress or low sleep raises an alert unless one is already open
+            created = _evaluate_alerts(c)
             conn.commit()
+            notifications.publish_alerts(created)
         
         return jsonify({'message': 'Wellbeing record created', 'record_id': record_id}), 201
     
+    except write_queue.QueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
         if conn:
             conn.close()
+        invalidate('wellbeing_records', 'alerts')
+
+def _insert_wellbeing(c, params):
+    c.execute('''INSERT INTO wellbeing_records 
+                 (student_id, sleep_level, stress_level, mood, mental_health_notes) 
+                 VALUES (?, ?, ?, ?, ?)''', params)
+    return c.lastrowid
+
+def _evaluate_alerts(c):
+    """Run the wellbeing alert rules; returns how many alerts were created"""
+    return alert_rules.evaluate(c, ['wellbeing'])['alerts_created']
+
+def _batch_alerts(c, rows):
+    """Run the alert rules over the batch inside its transaction"""
+    return {'alerts_created': _evaluate_alerts(c)}
+
+@bp.route('/record-batch', methods=['POST'])
+def record_wellbeing_batch():
+    """Record a batch of wellbeing surveys in one transaction"""
+    try:
+        records = ingest.parse_batch(request.get_json(silent=True))
+    except ingest.BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    try:
+        body, status = ingest.write_batch(
+            conn, records, ingest.wellbeing_row,
+            '''INSERT INTO wellbeing_records
+               (student_id, sleep_level, stress_level, mood, mental_health_notes)
+               VALUES (?, ?, ?, ?, ?)''',
+            side_effects=_batch_alerts)
+    finally:
+        conn.close()
+    if status == 201:
+        invalidate('wellbeing_records', 'alerts')
+        notifications.publish_alerts(body['alerts_created'])
+    
+    return jsonify(body), status
 
 @bp.route('/records/<int:student_id>', methods=['GET'])
+@conditional('wellbeing_records')
 def get_student_wellbeing(student_id):
     """Get wellbeing records for a student"""
     conn = get_db_connection()
@@ -85,20 +142,24 @@ def get_student_wellbeing(student_id):
     return jsonify([dict(r) for r in records]), 200
 
 @bp.route('/alerts', methods=['GET'])
+@conditional('wellbeing_records', 'students')
+@cached(ttl=15, tables=['wellbeing_records', 'students'])
 def get_alerts():
     """Get alerts for low sleep or high stress"""
     conn = get_db_connection()
     c = conn.cursor()
     
-    # Get students with high stress (>7) or low sleep (<4) in last 7 days
+    # Get students with high stress or low sleep (per the alert rule
+    # thresholds) in last 7 days
+    rules = alert_rules.config
     c.execute('''SELECT DISTINCT s.id, s.first_name, s.last_name, 
                  wr.stress_level, wr.sleep_level, wr.recorded_date
                  FROM students s
                  JOIN wellbeing_records wr ON s.id = wr.student_id
-                 WHERE (wr.stress_level > ? OR wr.sleep_level < ?)
+                 WHERE (wr.stress_level >= ? OR wr.sleep_level <= ?)
                  AND wr.recorded_date >= datetime('now', '-7 days')
                  ORDER BY wr.recorded_date DESC''',
-              (7, 4))
+              (rules.high_stress_at_or_above, rules.low_sleep_at_or_below))
     
     alerts = c.fetchall()
     conn.close()
@@ -106,56 +167,93 @@ def get_alerts():
     return jsonify([dict(a) for a in alerts]), 200
 
 @bp.route('/stress-over-time', methods=['GET'])
+@conditional('wellbeing_records')
 def get_stress_over_time():
     """Get stress levels over time for line chart"""
     student_id = request.args.get('student_id', type=int)
     days = request.args.get('days', 30, type=int)
     
     conn = get_db_connection()
-    c = conn.cursor()
     
     if student_id:
-        c.execute('''SELECT recorded_date, stress_level 
+        return query_response(conn, '''SELECT recorded_date, stress_level 
                      FROM wellbeing_records
                      WHERE student_id = ?
                      AND recorded_date >= datetime('now', '-' || ? || ' days')
                      ORDER BY recorded_date ASC''',
                   (student_id, days))
-    else:
-        # Get average stress level across all students by day
-        c.execute('''SELECT date(recorded_date) as date, AVG(stress_level) as avg_stress
-                     FROM wellbeing_records
-                     WHERE recorded_date >= datetime('now', '-' || ? || ' days')
-                     GROUP BY date(recorded_date)
-                     ORDER BY recorded_date ASC''',
-                  (days,))
-    
-    records = c.fetchall()
-    conn.close()
     
-    return jsonify([dict(r) for r in records]), 200
+    # Get average stress level across all students by day from the
+    # daily rollup, so cost grows with days in the window, not records
+    return query_response(conn, '''SELECT day as date, CAST(stress_sum AS FLOAT) / stress_count as avg_stress
+                 FROM wellbeing_daily_rollup
+                 WHERE day >= date('now', '-' || ? || ' days')
+                 ORDER BY day ASC''',
+              (days,))
 
 @bp.route('/heatmap-data', methods=['GET'])
+@conditional('wellbeing_records', 'students')
+@cached(ttl=30, tables=['wellbeing_records', 'students'])
 def get_heatmap_data():
     """Get stress level heatmap data"""
     conn = get_db_connection()
-    c = conn.cursor()
     
-    c.execute('''SELECT s.id, s.first_name, s.last_name,
-                 AVG(wr.stress_level) as avg_stress,
-                 MIN(wr.sleep_level) as min_sleep,
-                 COUNT(*) as record_count
-                 FROM students s
-                 LEFT JOIN wellbeing_records wr ON s.id = wr.student_id
-                 WHERE wr.recorded_date >= datetime('now', '-30 days')
-                 GROUP BY s.id''')
-    
-    data = c.fetchall()
-    conn.close()
-    
-    return jsonify([dict(d) for d in data]), 200
+    # Combine per-student daily rollups rather than re-aggregating raw records;
+    # one row per student, so stream it (or send it columnar) instead of
+    # building a list of dicts
+    return query_response(conn, '''SELECT s.id, s.first_name, s.last_name,
+                 CAST(SUM(r.stress_sum) AS FLOAT) / SUM(r.stress_count) as avg_stress,
+                 MIN(r.sleep_min) as min_sleep,
+                 SUM(r.record_count) as record_count
+                 FROM wellbeing_student_daily_rollup r
+                 JOIN students s ON s.id = r.student_id
+                 WHERE r.day >= date('now', '-30 days')
+                 GROUP BY r.student_id
+                 ORDER BY r.student_id''')
+
+def _has_search_index(c):
+    """Whether the students_fts index exists (SQLite may lack FTS5)"""
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'students_fts'")
+    return c.fetchone() is not None
+
+def _cached_count(c, search, query, params):
+    """Total matching students, cached per term until students change or TTL expires"""
+    # The table version moves on every insert, update and delete
+    key = (database.DB_PATH, search, request_versions(['students'])['students'])
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(key)
+        if hit and now - hit[1] < SEARCH_COUNT_TTL:
+            _count_cache.move_to_end(key)
+            return hit[0]
+
+    c.execute(query, params)
+    total = c.fetchone()[0]
+    with _count_lock:
+        _count_cache[key] = (total, now)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > SEARCH_COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return total
+
+def _encode_cursor(last_name, first_name, student_pk):
+    """Opaque keyset cursor for the row after which the next page starts"""
+    raw = json.dumps([last_name, first_name, student_pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    """Inverse of _encode_cursor; raises ValueError on malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        last_name, first_name, student_pk = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(student_pk, int):
+        raise ValueError('Invalid cursor')
+    return [last_name, first_name, student_pk]
 
 @bp.route('/students-status', methods=['GET'])
+@conditional('students', 'wellbeing_records')
 def get_students_status():
     """Get students with their wellbeing form status (paginated)"""
     conn = None
@@ -163,26 +261,51 @@ def get_students_status():
         conn = get_db_connection()
         c = conn.cursor()
         
-        # Pagination parameters
+        # Pagination parameters. Passing `after` (empty for the first page)
+        # switches to keyset pagination, which costs the same on any page.
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
-        search = request.args.get('search', '', type=str)
+        search = request.args.get('search', '', type=str).strip()
+        after = request.args.get('after', type=str)
         offset = (page - 1) * per_page
         
-        # Build search condition
-        search_condition = ""
+        # Build search condition. Terms of three or more characters go through
+        # the trigram full-text index; shorter ones fall back to LIKE.
+        search_join = ""
+        conditions = []
         params = []
-        if search:
-            search_condition = "WHERE s.first_name LIKE ? OR s.last_name LIKE ? OR s.student_id LIKE ? OR s.email LIKE ?"
+        ranked = False
+        if search and len(search) >= MIN_INDEXED_SEARCH and _has_search_index(c):
+            search_join = "JOIN students_fts f ON f.rowid = s.id"
+            conditions.append("students_fts MATCH ?")
+            params = ['"' + search.replace('"', '""') + '"']
+            ranked = after is None
+        elif search:
+            conditions.append("(s.first_name LIKE ? OR s.last_name LIKE ? OR s.student_id LIKE ? OR s.email LIKE ?)")
             search_term = f'%{search}%'
             params = [search_term, search_term, search_term, search_term]
         
-        # Get total count
-        count_query = f'SELECT COUNT(*) FROM students s {search_condition}'
-        c.execute(count_query, params)
-        total = c.fetchone()[0]
+        # Get total count (cached per search term)
+        search_condition = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        count_query = f'SELECT COUNT(*) FROM students s {search_join} {search_condition}'
+        total = _cached_count(c, search, count_query, params)
+        
+        page_params = [per_page, offset]
+        if after is not None:
+            page, page_params = None, [per_page]
+            if after:
+                try:
+                    conditions.append("(s.last_name, s.first_name, s.id) > (?, ?, ?)")
+                    params = params + _decode_cursor(after)
+                except ValueError:
+                    return jsonify({'error': 'Invalid cursor'}), 400
         
-        # Get paginated students with their latest wellbeing data
+        order_by = "s.last_name, s.first_name, s.id"
+        if ranked:
+            order_by = "f.rank, " + order_by
+        
+        # Get paginated students with their latest wellbeing data, read from
+        # the trigger-maintained summary table (one indexed lookup per row)
         query = f'''
             SELECT 
                 s.id,
@@ -190,35 +313,35 @@ def get_students_status():
                 s.first_name,
                 s.last_name,
                 s.email,
-                (SELECT COUNT(*) > 0 FROM wellbeing_records wr 
-                 WHERE wr.student_id = s.id 
-                 AND date(wr.recorded_date) = date('now')) as has_filled_today,
-                (SELECT MAX(recorded_date) FROM wellbeing_records wr 
-                 WHERE wr.student_id = s.id) as last_submission,
-                (SELECT stress_level FROM wellbeing_records wr 
-                 WHERE wr.student_id = s.id 
-                 ORDER BY recorded_date DESC LIMIT 1) as latest_stress,
-                (SELECT mood FROM wellbeing_records wr 
-                 WHERE wr.student_id = s.id 
-                 ORDER BY recorded_date DESC LIMIT 1) as latest_mood,
-                (SELECT sleep_level FROM wellbeing_records wr 
-                 WHERE wr.student_id = s.id 
-                 ORDER BY recorded_date DESC LIMIT 1) as latest_sleep
+                COALESCE(date(l.last_submission) = date('now'), 0) as has_filled_today,
+                l.last_submission,
+                l.latest_stress,
+                l.latest_mood,
+                l.latest_sleep
             FROM students s
-            {search_condition}
-            ORDER BY s.last_name, s.first_name
-            LIMIT ? OFFSET ?
+            {search_join}
+            LEFT JOIN student_wellbeing_latest l ON l.student_id = s.id
+            {f"WHERE {' AND '.join(conditions)}" if conditions else ""}
+            ORDER BY {order_by}
+            LIMIT ? {"" if page is None else "OFFSET ?"}
         '''
         
-        c.execute(query, params + [per_page, offset])
+        c.execute(query, params + page_params)
         students = c.fetchall()
         
+        # Cursors follow name order, so ranked search pages do not get one
+        next_cursor = None
+        if students and len(students) == per_page and not ranked:
+            last = students[-1]
+            next_cursor = _encode_cursor(last['last_name'], last['first_name'], last['id'])
+        
         return jsonify({
             'students': [dict(s) for s in students],
             'total': total,
             'page': page,
             'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
+            'total_pages': (total + per_page - 1) // per_page,
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
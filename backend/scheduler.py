@@ -0,0 +1,267 @@
+"""
+Background job scheduler.
+
+Jobs are registered with a fixed interval and a jitter fraction, and run
+one at a time on a scheduler thread. Before each run the scheduler takes a
+lease on the job's row in scheduled_jobs, so however many app processes and
+standalone workers share the database, only one runs a given job at a time.
+Run counts, failures and durations are kept in memory for /api/metrics and
+on the job's row for other processes.
+
+Run as a standalone worker against the same database:
+    python scheduler.py            # loop until SIGINT/SIGTERM
+    python scheduler.py --once     # run every job once and exit
+"""
+import os
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+
+import alert_rules
+import cache
+import notifications
+from database import get_db_connection
+
+ALERT_RULES_INTERVAL = float(os.environ.get('ALERT_RULES_INTERVAL', 60))
+MAINTENANCE_INTERVAL = float(os.environ.get('MAINTENANCE_INTERVAL', 3600))
+
+# Longest the scheduler thread sleeps before re-checking for due jobs
+MAX_SLEEP = 5.0
+
+
+@dataclass
+class Job:
+    name: str
+    func: object            # func(conn) -> dict or None
+    interval: float         # seconds between runs
+    jitter: float = 0.1     # +/- fraction of the interval added to each wait
+    lease: float = 300      # seconds another runner is locked out for
+
+    def next_delay(self, rng=random):
+        return self.interval * (1 + rng.uniform(-self.jitter, self.jitter))
+
+
+registry = {}
+
+
+def job(name, interval, jitter=0.1, lease=300):
+    """Register `func(conn)` to run every `interval` seconds"""
+    def decorator(func):
+        registry[name] = Job(name, func, interval, jitter, lease)
+        return func
+    return decorator
+
+
+class JobStats:
+    """Run counters and durations for one job in this process"""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = None
+        self.last_started = None
+        self.last_error = None
+        self.last_result = None
+
+    def to_dict(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'avg_ms': round(self.total_ms / self.runs, 2) if self.runs else 0.0,
+            'max_ms': round(self.max_ms, 2),
+            'last_ms': None if self.last_ms is None else round(self.last_ms, 2),
+            'last_started': self.last_started,
+            'last_error': self.last_error,
+            'last_result': self.last_result,
+        }
+
+
+class Scheduler:
+    """Runs registered jobs on a background thread (or in the foreground)"""
+
+    def __init__(self, jobs=None, owner=None):
+        self.jobs = dict(jobs if jobs is not None else registry)
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self.stats = {name: JobStats() for name in self.jobs}
+        self._rng = random.Random()
+        self._due = {name: time.monotonic() + j.next_delay(self._rng) for name, j in self.jobs.items()}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _acquire(self, conn, job):
+        now = time.time()
+        c = conn.execute('''INSERT INTO scheduled_jobs (name, owner, lease_expires)
+                            VALUES (?, ?, ?)
+                            ON CONFLICT(name) DO UPDATE
+                            SET owner = excluded.owner, lease_expires = excluded.lease_expires
+                            WHERE scheduled_jobs.lease_expires < ?
+                            OR scheduled_jobs.owner = excluded.owner''',
+                         (job.name, self.owner, now + job.lease, now))
+        conn.commit()
+        return c.rowcount == 1
+
+    def _release(self, conn, job, started, duration_ms, error):
+        conn.execute('''UPDATE scheduled_jobs
+                        SET owner = NULL, lease_expires = 0,
+                            runs = runs + 1, failures = failures + ?,
+                            last_started = ?, last_duration_ms = ?, last_error = ?
+                        WHERE name = ? AND owner = ?''',
+                     (1 if error else 0, started, duration_ms, error, job.name, self.owner))
+        conn.commit()
+
+    def run_job(self, name):
+        """Run one job now if no other runner holds its lease; returns True if it ran"""
+        job, stats = self.jobs[name], self.stats[name]
+        conn = get_db_connection()
+        try:
+            if not self._acquire(conn, job):
+                with self._lock:
+                    stats.skipped += 1
+                return False
+
+            started = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            start = time.perf_counter()
+            error = result = None
+            try:
+                result = job.func(conn)
+            except Exception as e:
+                conn.rollback()
+                error = f'{type(e).__name__}: {e}'
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._release(conn, job, started, duration_ms, error)
+
+            with self._lock:
+                stats.runs += 1
+                stats.failures += 1 if error else 0
+                stats.total_ms += duration_ms
+                stats.max_ms = max(stats.max_ms, duration_ms)
+                stats.last_ms = duration_ms
+                stats.last_started = started
+                stats.last_error = error
+                stats.last_result = result
+            return True
+        finally:
+            conn.close()
+
+    def run_pending(self):
+        """Run every due job; returns seconds until the next one is due"""
+        for name, job in self.jobs.items():
+            if self._stop.is_set():
+                break
+            if time.monotonic() >= self._due[name]:
+                try:
+                    self.run_job(name)
+                except Exception as e:
+                    # The database itself is unavailable; try again next interval
+                    with self._lock:
+                        self.stats[name].failures += 1
+                        self.stats[name].last_error = f'{type(e).__name__}: {e}'
+                self._due[name] = time.monotonic() + job.next_delay(self._rng)
+        if not self._due:
+            return MAX_SLEEP
+        return max(0.0, min(self._due.values()) - time.monotonic())
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self._stop.wait(min(self.run_pending(), MAX_SLEEP))
+
+    def start(self):
+        """Run jobs on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'owner': self.owner,
+                'running': self._thread is not None and self._thread.is_alive(),
+                'jobs': {name: dict(stats.to_dict(), interval=self.jobs[name].interval)
+                         for name, stats in self.stats.items()},
+            }
+
+
+_scheduler = None
+
+
+def start():
+    """Start the process-wide scheduler with every registered job"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler().start()
+    return _scheduler
+
+
+def stats():
+    """Metrics of the process-wide scheduler, or None if it is not running here"""
+    return _scheduler.to_dict() if _scheduler is not None else None
+
+
+def job_status():
+    """Last run of every job by any process, from the scheduled_jobs table"""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''SELECT name, owner, lease_expires > ? AS running, runs, failures,
+                                     last_started, last_duration_ms, last_error
+                              FROM scheduled_jobs ORDER BY name''', (time.time(),)).fetchall()
+    finally:
+        conn.close()
+    return {row['name']: {k: row[k] for k in row.keys() if k != 'name'} for row in rows}
+
+
+@job('alert_rules', ALERT_RULES_INTERVAL)
+def evaluate_alert_rules(conn):
+    """Evaluate wellbeing and attendance alert rules over new records"""
+    result = alert_rules.run(conn)
+    if result['alerts_created']:
+        cache.invalidate('alerts')
+        notifications.publish_alerts(result['alerts_created'])
+    return {'alerts_created': result['alerts_created'], 'processed': result['processed']}
+
+
+@job('db_maintenance', MAINTENANCE_INTERVAL, lease=1800)
+def database_maintenance(conn):
+    """Refresh planner statistics and checkpoint the WAL"""
+    conn.execute('PRAGMA optimize')
+    busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    return {'wal_pages': log_pages, 'checkpointed': checkpointed}
+
+
+if __name__ == '__main__':
+    import argparse
+    import signal
+    from database import init_db
+
+    parser = argparse.ArgumentParser(description='Run scheduled jobs against the wellbeing database')
+    parser.add_argument('--once', action='store_true', help='run every job once and exit')
+    parser.add_argument('--job', action='append', choices=sorted(registry),
+                        help='only run this job (repeatable)')
+    args = parser.parse_args()
+
+    init_db()
+    scheduler = Scheduler({name: registry[name] for name in (args.job or registry)})
+    if args.once:
+        for name in scheduler.jobs:
+            ran = scheduler.run_job(name)
+            print(name, scheduler.stats[name].to_dict() if ran else 'skipped: lease held elsewhere')
+    else:
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        print(f'Scheduler {scheduler.owner} running jobs: {", ".join(scheduler.jobs)}', flush=True)
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
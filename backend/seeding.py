@@ -0,0 +1,274 @@
+"""
+Synthetic data generator for demos, load tests and hardware sizing.
+
+The student id range is split into fixed work units. Each unit draws its rows
+from its own RNG seeded with (seed, first student), so a given configuration
+always produces the same database no matter how many worker processes
+generate it. Rows are written with executemany in large transactions.
+"""
+import multiprocessing
+import random
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+
+from migrations import defer_ddl, restore_deferred_ddl
+import alert_rules
+
+FIRST_NAMES = [
+    'Emma', 'Liam', 'Olivia', 'Noah', 'Ava', 'Ethan', 'Sophia', 'Mason', 'Isabella', 'William',
+    'Mia', 'James', 'Charlotte', 'Benjamin', 'Amelia', 'Lucas', 'Harper', 'Henry', 'Evelyn', 'Alexander',
+    'Abigail', 'Michael', 'Emily', 'Daniel', 'Elizabeth', 'Jacob', 'Sofia', 'Logan', 'Avery', 'Jackson',
+    'Ella', 'Sebastian', 'Scarlett', 'Aiden', 'Grace', 'Matthew', 'Chloe', 'Samuel', 'Victoria', 'David',
+    'Riley', 'Joseph', 'Aria', 'Carter', 'Lily', 'Owen', 'Aurora', 'Wyatt', 'Zoey', 'John',
+    'Penelope', 'Jack', 'Layla', 'Luke', 'Nora', 'Jayden', 'Camila', 'Dylan', 'Hannah', 'Grayson',
+    'Zoe', 'Levi', 'Lillian', 'Isaac', 'Addison', 'Gabriel', 'Eleanor', 'Julian', 'Natalie', 'Mateo',
+    'Luna', 'Anthony', 'Savannah', 'Jaxon', 'Brooklyn', 'Lincoln', 'Leah', 'Joshua', 'Stella', 'Christopher',
+    'Hazel', 'Andrew', 'Ellie', 'Theodore', 'Paisley', 'Caleb', 'Audrey', 'Ryan', 'Skylar', 'Asher',
+    'Violet', 'Nathan', 'Claire', 'Thomas', 'Bella', 'Leo', 'Lucy', 'Isaiah', 'Anna', 'Charles'
+]
+
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
+    'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Flores',
+    'Green', 'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell', 'Mitchell', 'Carter', 'Roberts',
+    'Gomez', 'Phillips', 'Evans', 'Turner', 'Diaz', 'Parker', 'Cruz', 'Edwards', 'Collins', 'Reyes',
+    'Stewart', 'Morris', 'Morales', 'Murphy', 'Cook', 'Rogers', 'Gutierrez', 'Ortiz', 'Morgan', 'Cooper',
+    'Peterson', 'Bailey', 'Reed', 'Kelly', 'Howard', 'Ramos', 'Kim', 'Cox', 'Ward', 'Richardson',
+    'Watson', 'Brooks', 'Chavez', 'Wood', 'James', 'Bennett', 'Gray', 'Mendoza', 'Ruiz', 'Hughes',
+    'Price', 'Alvarez', 'Castillo', 'Sanders', 'Patel', 'Myers', 'Long', 'Ross', 'Foster', 'Jimenez'
+]
+
+MOODS = ['Happy', 'Neutral', 'Stressed', 'Anxious']
+STAFF_USERS = ['kayla', 'abigail', 'john']
+STRESS_LEVELS = range(1, 11)
+SLEEP_LEVELS = range(3, 11)
+
+# Seeded alerts only cover the most recent days, as a live system would;
+# thresholds come from the alert rule config
+ALERT_DAYS = 2
+
+
+@dataclass
+class SeedConfig:
+    """Scale and shape of a generated dataset"""
+    students: int = 30000
+    days: int = 14
+    tracked_fraction: float = 1 / 60     # students with daily wellbeing/attendance records
+    survey_rate: float = 1.0             # chance a tracked student submits on a given day
+    attendance_rate: float = 0.8
+    low_attendance_fraction: float = 0.1  # tracked students attending ~50% of classes
+    assignments: int = 2
+    seed: int = None
+    workers: int = 1
+    batch_size: int = 50000              # target rows per work unit
+    commit_every: int = 500000           # rows per transaction
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a config from user input, coercing values to the field types"""
+        types = {'students': int, 'days': int, 'assignments': int, 'seed': int,
+                 'workers': int, 'batch_size': int, 'commit_every': int}
+        values = {}
+        for f in fields(cls):
+            if f.name in data and data[f.name] is not None:
+                values[f.name] = types.get(f.name, float)(data[f.name])
+        config = cls(**values)
+        config.validate()
+        return config
+
+    def validate(self):
+        if self.students < 1 or self.days < 1 or self.assignments < 0:
+            raise ValueError('students and days must be positive')
+        for name in ('tracked_fraction', 'survey_rate', 'attendance_rate', 'low_attendance_fraction'):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f'{name} must be between 0 and 1')
+        if self.workers < 1 or self.batch_size < 1 or self.commit_every < 1:
+            raise ValueError('workers, batch_size and commit_every must be positive')
+
+    def work_units(self):
+        """Split student numbers 1..N into ranges of roughly batch_size rows"""
+        rows_per_student = 1 + self.tracked_fraction * (2 * self.days * self.survey_rate + self.assignments)
+        step = max(1, int(self.batch_size / rows_per_student))
+        return [(start, min(start + step, self.students + 1))
+                for start in range(1, self.students + 1, step)]
+
+
+def generate_unit(args):
+    """Generate all rows for students numbered [start, end)
+
+    Runs in worker processes, so it only takes and returns plain data.
+    """
+    config, start, end, id_offset, assignment_ids, now = args
+    rng = random.Random(f'{config.seed}:{start}')
+    rules = alert_rules.config
+    n = end - start
+    numbers = range(start, end)
+
+    firsts = rng.choices(FIRST_NAMES, k=n)
+    lasts = rng.choices(LAST_NAMES, k=n)
+    students = [
+        (id_offset + i, f'STU{10000 + i}', first, last, f'{first.lower()}.{last.lower()}{i}@university.edu')
+        for i, first, last in zip(numbers, firsts, lasts)
+    ]
+
+    tracked = sorted(rng.sample(numbers, round(n * config.tracked_fraction)))
+    low_attendance = set(rng.sample(tracked, round(len(tracked) * config.low_attendance_fraction)))
+
+    timestamps = [(now - timedelta(days=d)).strftime('%Y-%m-%d %H:%M:%S') for d in range(config.days)]
+    dates = [ts[:10] for ts in timestamps]
+
+    wellbeing, attendance, grades, alerts = [], [], [], []
+    for i in tracked:
+        sid = id_offset + i
+        submitted = [d for d in range(config.days) if config.survey_rate >= 1 or rng.random() < config.survey_rate]
+        stress = rng.choices(STRESS_LEVELS, k=len(submitted))
+        sleep = rng.choices(SLEEP_LEVELS, k=len(submitted))
+        moods = rng.choices(MOODS, k=len(submitted))
+        for d, st, sl, mood in zip(submitted, stress, sleep, moods):
+            wellbeing.append((sid, sl, st, mood, timestamps[d]))
+            if d < ALERT_DAYS and st >= rules.high_stress_at_or_above:
+                alerts.append((sid, 'high_stress',
+                               f'High stress level ({st}/10) reported. Immediate attention may be needed.',
+                               timestamps[d]))
+            if d < ALERT_DAYS and sl <= rules.low_sleep_at_or_below:
+                alerts.append((sid, 'low_sleep',
+                               f'Low sleep quality ({sl}/10) reported. Student may need support.',
+                               timestamps[d]))
+
+        rate = 0.5 if i in low_attendance else config.attendance_rate
+        present = [rng.random() < rate for _ in range(config.days)]
+        attendance.extend((sid, dates[d], p) for d, p in enumerate(present))
+        attendance_rate = sum(present) / config.days
+        if attendance_rate < rules.low_attendance_below:
+            _, _, first, last, _ = students[i - start]
+            alerts.append((sid, 'low_attendance',
+                           f'Low attendance ({round(attendance_rate * 100, 1)}%) - below '
+                           f'{round(rules.low_attendance_below * 100)}% threshold. '
+                           f'Student {first} {last} requires intervention.',
+                           timestamps[0]))
+
+        grades.extend((sid, aid, rng.randint(40, 100)) for aid in assignment_ids)
+
+    return {'students': students, 'wellbeing_records': wellbeing,
+            'attendance': attendance, 'grades': grades, 'alerts': alerts}
+
+
+INSERTS = {
+    'students': '''INSERT INTO students (id, student_id, first_name, last_name, email)
+                   VALUES (?, ?, ?, ?, ?)''',
+    'wellbeing_records': '''INSERT INTO wellbeing_records (student_id, sleep_level, stress_level, mood, recorded_date)
+                            VALUES (?, ?, ?, ?, ?)''',
+    'attendance': '''INSERT INTO attendance (student_id, class_date, present)
+                     VALUES (?, ?, ?)''',
+    'grades': '''INSERT INTO grades (student_id, assignment_id, grade)
+                 VALUES (?, ?, ?)''',
+    'alerts': '''INSERT INTO alerts (student_id, alert_type, message, created_date)
+                 VALUES (?, ?, ?, ?)''',
+}
+
+
+def _drop_derived(c):
+    """Drop secondary indexes and triggers on the seeded tables; returns how many"""
+    c.execute(f'''SELECT type, name, sql FROM sqlite_master
+                  WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+                  AND tbl_name IN ({', '.join('?' * len(INSERTS))})''', list(INSERTS))
+    objects = c.fetchall()
+    defer_ddl(c, objects)
+    return len(objects)
+
+
+def seed(conn, config=None, progress=print):
+    """Populate the database described by `config`; returns a summary dict
+
+    Returns None if the sample staff accounts already exist.
+    """
+    from werkzeug.security import generate_password_hash
+
+    config = config or SeedConfig()
+    config.validate()
+    if config.seed is None:
+        config.seed = random.randrange(2 ** 32)
+
+    c = conn.cursor()
+    c.execute('SELECT 1 FROM users WHERE username = ?', (STAFF_USERS[0],))
+    if c.fetchone():
+        progress('Sample data already exists')
+        return None
+
+    started = time.perf_counter()
+    counts = dict.fromkeys(INSERTS, 0)
+    deferred = 0
+    conn.execute('PRAGMA synchronous = OFF')
+    try:
+        hashed_pw = generate_password_hash('password123')
+        c.executemany('''INSERT INTO users (username, password, email, role)
+                         VALUES (?, ?, ?, 'staff')''',
+                      [(name, hashed_pw, f'{name}@university.edu') for name in STAFF_USERS])
+
+        assignment_ids = []
+        due = datetime(2024, 12, 20)
+        for n in range(1, config.assignments + 1):
+            c.execute('''INSERT INTO assignments (title, description, due_date)
+                         VALUES (?, ?, ?)''',
+                      (f'Assignment {n}', f'Assignment number {n}',
+                       (due + timedelta(weeks=n - 1)).strftime('%Y-%m-%d')))
+            assignment_ids.append(c.lastrowid)
+
+        c.execute('SELECT COALESCE(MAX(id), 0) FROM students')
+        id_offset = c.fetchone()[0]
+
+        # On a fresh database it is much cheaper to build secondary indexes and
+        # trigger-maintained tables once after the load than row by row
+        deferred = _drop_derived(c) if id_offset == 0 else 0
+        now = datetime.utcnow()
+        units = [(config, start, end, id_offset, assignment_ids, now) for start, end in config.work_units()]
+
+        progress(f'Generating {config.students:,} students over {config.days} days '
+                 f'in {len(units)} units (seed {config.seed})...')
+        if config.workers > 1 and len(units) > 1:
+            pool = multiprocessing.get_context('spawn').Pool(config.workers)
+            chunks = pool.imap(generate_unit, units)
+        else:
+            pool = None
+            chunks = map(generate_unit, units)
+
+        try:
+            pending = 0
+            for done, chunk in enumerate(chunks, 1):
+                for table, sql in INSERTS.items():
+                    c.executemany(sql, chunk[table])
+                    counts[table] += len(chunk[table])
+                    pending += len(chunk[table])
+                if pending >= config.commit_every:
+                    conn.commit()
+                    pending = 0
+                    progress(f'  {done}/{len(units)} units written ({counts["students"]:,} students)')
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        if deferred:
+            progress(f'Rebuilding {deferred} indexes and triggers...')
+            restore_deferred_ddl(c)
+        # The generated alerts stand in for rule runs over the seeded records
+        alert_rules.mark_processed(c)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Batches committed before the failure stay, but the rollback only
+        # brings back the indexes and triggers if nothing was committed yet.
+        # If the process dies instead, init_db() restores them.
+        if deferred:
+            restore_deferred_ddl(c)
+            conn.commit()
+        raise
+    finally:
+        conn.execute('PRAGMA synchronous = NORMAL')
+
+    elapsed = time.perf_counter() - started
+    progress(f'Seeded {counts["students"]:,} students, {counts["wellbeing_records"]:,} wellbeing records, '
+             f'{counts["attendance"]:,} attendance records in {elapsed:.1f}s')
+    return {'seed': config.seed, 'rows': counts, 'seconds': round(elapsed, 2)}
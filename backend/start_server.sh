@@ -1,4 +1,12 @@
 #!/bin/bash
-cd /Users/gayathrivkondapalli/Portal/backend
-export PYTHONPATH=/Users/gayathrivkondapalli/Portal/backend
-/Library/Frameworks/Python.framework/Versions/3.13/bin/python3 app.py
+# Start the API. Production (default) runs gunicorn with gunicorn.conf.py;
+# `./start_server.sh dev` runs the single-process Flask development server.
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$PWD${PYTHONPATH:+:$PYTHONPATH}"
+PYTHON="${PYTHON:-python3}"
+
+if [ "$1" = "dev" ]; then
+    exec "$PYTHON" app.py
+fi
+exec "$PYTHON" -m gunicorn -c gunicorn.conf.py wsgi:app
@@ -0,0 +1,82 @@
+"""
+Cold-start benchmark: time from launching a fresh Python process to the
+app's first response.
+
+Each run starts a new interpreter that imports the app, builds it with
+create_app() and answers GET /health through the test client, reporting each
+phase. "fresh" runs use a new database every time (first deployment: full
+schema creation and migrations); "current" runs reuse one that is already
+migrated, which is what every restart and worker boot sees.
+
+Usage:
+    python startup_benchmark.py                 # 10 runs of each
+    python startup_benchmark.py --runs 30 --output startup.json
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = r'''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({'TESTING': True})
+created = time.perf_counter()
+response = application.test_client().get('/health')
+assert response.status_code == 200, response.status_code
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000,
+                  'create_app_ms': (created - imported) * 1000,
+                  'first_response_ms': (done - created) * 1000}))
+'''
+
+
+def run_once(db_path):
+    """Launch one child process; returns its phase timings plus the wall time"""
+    env = dict(os.environ, DB_PATH=db_path, SCHEDULER_ENABLED='0')
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['total_ms'] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def summarize(samples):
+    return {phase: {'median': round(statistics.median(s[phase] for s in samples), 2),
+                    'min': round(min(s[phase] for s in samples), 2),
+                    'max': round(max(s[phase] for s in samples), 2)}
+            for phase in samples[0]}
+
+
+def benchmark(runs):
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = [run_once(os.path.join(tmp, f'fresh-{i}.db')) for i in range(runs)]
+        current_db = os.path.join(tmp, 'current.db')
+        run_once(current_db)
+        current = [run_once(current_db) for _ in range(runs)]
+    return {'runs': runs, 'python': sys.version.split()[0],
+            'fresh': summarize(fresh), 'current': summarize(current)}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure cold start to first response')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = benchmark(args.runs)
+    for kind in ('fresh', 'current'):
+        print(f'{kind} database ({args.runs} runs, median / min / max ms)')
+        for phase, stats in results[kind].items():
+            print(f"  {phase:<18} {stats['median']:>8.1f} {stats['min']:>8.1f} {stats['max']:>8.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -8,7 +8,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app
 from database import init_db, get_db_connection
+import alert_rules
+import notifications
+import database
 import json
+import threading
+import time
 
 
 @pytest.fixture
@@ -26,6 +31,31 @@ def setup_db():
     yield
 
 
+@pytest.fixture
+def rules_db(tmp_path, monkeypatch):
+    """Temporary database with two students and default alert rules"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'alerts.db'))
+    monkeypatch.setattr(alert_rules, 'config', alert_rules.AlertRuleConfig())
+    init_db()
+    conn = get_db_connection()
+    conn.executemany('''INSERT INTO students (id, student_id, first_name, last_name, email)
+                        VALUES (?, ?, ?, ?, ?)''',
+                     [(1, 'STU10001', 'Emma', 'Smith', 'emma@university.edu'),
+                      (2, 'STU10002', 'Liam', 'Jones', 'liam@university.edu')])
+    conn.commit()
+    conn.close()
+    yield
+
+
+def add_wellbeing(rows, days_ago=0):
+    conn = get_db_connection()
+    conn.executemany('''INSERT INTO wellbeing_records (student_id, stress_level, sleep_level, mood, recorded_date)
+                        VALUES (?, ?, ?, ?, datetime('now', ?))''',
+                     [(*row, f'-{days_ago} days') for row in rows])
+    conn.commit()
+    conn.close()
+
+
 class TestAlertsEndpoints:
     """Test alerts endpoints"""
 
@@ -110,3 +140,340 @@ class TestAlertsEndpoints:
         # Check that we have different alert types
         alert_types = [a['alert_type'] for a in data]
         assert 'high_stress' in alert_types or 'low_attendance' in alert_types
+
+
+class TestConditionalRequests:
+    """Test ETag / Last-Modified handling on alert feeds"""
+
+    def test_unchanged_feed_returns_304(self, client, setup_db):
+        """Test that a matching If-None-Match skips the body"""
+        first = client.get('/api/alerts/unread')
+        etag = first.headers['ETag']
+        assert etag.startswith('W/')
+        assert 'Last-Modified' in first.headers
+
+        second = client.get('/api/alerts/unread', headers={'If-None-Match': etag})
+        assert second.status_code == 304
+        assert second.data == b''
+        assert second.headers['ETag'] == etag
+
+    def test_if_modified_since_alone_is_not_a_match(self, client, setup_db):
+        """Test that a write in the same second as the last response is not
+        hidden behind a 304"""
+        first = client.get('/api/alerts/unread')
+        client.post('/api/alerts/create',
+            data=json.dumps({'student_id': 4, 'alert_type': 'low_sleep', 'message': 'Same second'}),
+            content_type='application/json'
+        )
+        response = client.get('/api/alerts/unread',
+                              headers={'If-Modified-Since': first.headers['Last-Modified']})
+        assert response.status_code == 200
+
+    def test_write_changes_etag(self, client, setup_db):
+        """Test that creating an alert invalidates the client's copy"""
+        etag = client.get('/api/alerts/unread').headers['ETag']
+        client.post('/api/alerts/create',
+            data=json.dumps({'student_id': 4, 'alert_type': 'low_sleep', 'message': 'ETag test'}),
+            content_type='application/json'
+        )
+
+        response = client.get('/api/alerts/unread', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_etag_differs_per_url(self, client, setup_db):
+        """Test that different resources never share a validator"""
+        unread = client.get('/api/alerts/unread').headers['ETag']
+        student = client.get('/api/alerts/student/1').headers['ETag']
+        assert unread != student
+
+
+class TestUnreadFeed:
+    """Test unread alert pagination, filters and counts"""
+
+    def add_alerts(self, rows):
+        conn = get_db_connection()
+        conn.executemany('''INSERT INTO alerts (student_id, alert_type, message, created_date)
+                            VALUES (?, ?, 'msg', ?)''', rows)
+        conn.commit()
+        conn.close()
+
+    def test_cursor_pages_cover_every_alert(self, client, rules_db):
+        """Test that keyset pages follow (created_date, id) without gaps or repeats"""
+        # Equal timestamps must be split by id across page boundaries
+        self.add_alerts([(1 + i % 2, 'note', f'2025-10-0{1 + i // 3} 09:00:00') for i in range(7)])
+
+        ids, after = [], ''
+        for _ in range(4):
+            response = client.get(f'/api/alerts/unread?limit=3&after={after}')
+            assert response.status_code == 200
+            ids += [a['id'] for a in json.loads(response.data)]
+            after = response.headers.get('X-Next-Cursor')
+            if not after:
+                break
+        assert ids == [7, 6, 5, 4, 3, 2, 1]
+
+        response = client.get('/api/alerts/unread?after=bogus')
+        assert response.status_code == 400
+
+    def test_cursor_header_exposed_cross_origin(self, client, rules_db):
+        """Test that browsers on the SPA's origin may read the cursor header"""
+        self.add_alerts([(1, 'note', '2025-10-01'), (2, 'note', '2025-10-02')])
+        response = client.get('/api/alerts/unread?limit=1', headers={'Origin': 'http://localhost:3000'})
+
+        assert response.headers['X-Next-Cursor']
+        assert 'X-Next-Cursor' in response.headers['Access-Control-Expose-Headers']
+
+    def test_filters(self, client, rules_db):
+        """Test filtering by alert type and student"""
+        self.add_alerts([(1, 'high_stress', '2025-10-01'), (1, 'low_sleep', '2025-10-02'),
+                         (2, 'high_stress', '2025-10-03'), (2, 'note', '2025-10-04')])
+
+        def ids(query):
+            return [a['id'] for a in json.loads(client.get(f'/api/alerts/unread?{query}').data)]
+
+        assert ids('alert_type=high_stress') == [3, 1]
+        assert ids('alert_type=high_stress,low_sleep&student_id=1') == [2, 1]
+        assert ids('alert_type=note&alert_type=low_sleep') == [4, 2]
+        assert ids('student_id=2') == [4, 3]
+
+    def test_counts_follow_writes(self, client, rules_db):
+        """Test that the maintained counters track inserts, reads and deletes"""
+        self.add_alerts([(1, 'high_stress', '2025-10-01'), (2, 'high_stress', '2025-10-02'),
+                         (1, 'low_sleep', '2025-10-03')])
+
+        def counts():
+            response = client.get('/api/alerts/unread/counts')
+            assert response.status_code == 200
+            return json.loads(response.data)
+
+        assert counts() == {'total': 3, 'by_type': {'high_stress': 2, 'low_sleep': 1}}
+        client.put('/api/alerts/mark-read/1')
+        client.put('/api/alerts/mark-read/3')
+        assert counts() == {'total': 1, 'by_type': {'high_stress': 1}}
+
+        conn = get_db_connection()
+        conn.execute('UPDATE alerts SET is_read = 0 WHERE id = 3')
+        conn.execute('DELETE FROM alerts WHERE id = 2')
+        conn.commit()
+        conn.close()
+        assert counts() == {'total': 1, 'by_type': {'low_sleep': 1}}
+
+
+    def test_bulk_acknowledge(self, client, rules_db):
+        """Test marking alerts read by ids and by filters in one request"""
+        self.add_alerts([(1, 'high_stress', '2025-09-01'), (1, 'low_sleep', '2025-09-02'),
+                         (2, 'high_stress', '2025-10-01'), (2, 'low_sleep', '2025-10-02'),
+                         (2, 'note', '2025-10-03')])
+
+        def acknowledge(body):
+            return client.post('/api/alerts/mark-read', data=json.dumps(body),
+                               content_type='application/json')
+
+        response = acknowledge({'ids': [1, 3, 99]})
+        assert response.status_code == 200
+        assert json.loads(response.data)['updated'] == 2
+
+        response = acknowledge({'older_than': '2025-10-02', 'alert_type': ['low_sleep', 'high_stress']})
+        assert json.loads(response.data) == {'message': 'Alerts marked as read', 'updated': 1,
+                                             'by_type': {'low_sleep': 1}}
+
+        counts = json.loads(client.get('/api/alerts/unread/counts').data)
+        assert counts == {'total': 2, 'by_type': {'low_sleep': 1, 'note': 1}}
+        assert [a['id'] for a in json.loads(client.get('/api/alerts/unread').data)] == [5, 4]
+
+        assert json.loads(acknowledge({'student_id': 2}).data)['updated'] == 2
+        for body in ({}, {'ids': []}, {'ids': ['1']}, {'older_than': 'soon'}):
+            assert acknowledge(body).status_code == 400
+
+
+class TestAlertRules:
+    """Test the incremental alert rule engine"""
+
+    def check(self, client):
+        response = client.post('/api/alerts/check-wellbeing')
+        assert response.status_code == 200
+        return json.loads(response.data)
+
+    def test_only_new_records_are_evaluated(self, client, rules_db):
+        """Test that the watermark skips records already evaluated"""
+        add_wellbeing([(1, 9, 6, 'Stressed'), (2, 4, 2, 'Tired')])
+        add_wellbeing([(2, 9, 6, None)], days_ago=10)
+
+        result = self.check(client)
+        assert result['alerts_created'] == 2
+        assert {(a['student_id'], a['alert_type']) for a in result['alerts']} == \
+            {(1, 'high_stress'), (2, 'low_sleep')}
+        # The pre-rule-engine `students` key is still returned
+        assert {(s['id'], s['stress_level'], s['sleep_level']) for s in result['students']} == \
+            {(1, 9, 6), (2, 4, 2)}
+
+        result = self.check(client)
+        assert result['alerts_created'] == 0
+        assert result['processed'] == {'wellbeing': 0, 'attendance': 0}
+        assert result['students'] == []
+
+    def test_open_alerts_are_not_duplicated(self, client, rules_db):
+        """Test that a student gets one open alert per type"""
+        add_wellbeing([(1, 9, 6, None), (1, 10, 6, None)])
+        assert self.check(client)['alerts_created'] == 1
+        add_wellbeing([(1, 8, 6, None)])
+        assert self.check(client)['alerts_created'] == 0
+
+        conn = get_db_connection()
+        conn.execute('UPDATE alerts SET is_read = 1')
+        conn.commit()
+        conn.close()
+        add_wellbeing([(1, 8, 6, None)])
+        assert self.check(client)['alerts_created'] == 1
+
+    def test_low_attendance_rule(self, client, rules_db):
+        """Test that attendance below the threshold over the window alerts"""
+        conn = get_db_connection()
+        conn.executemany('''INSERT INTO attendance (student_id, class_date, present)
+                            VALUES (?, date('now', ?), ?)''',
+                         [(1, f'-{d} days', d % 3 == 0) for d in range(6)] +
+                         [(2, f'-{d} days', 1) for d in range(6)])
+        conn.commit()
+        conn.close()
+
+        result = self.check(client)
+        assert [(a['student_id'], a['alert_type']) for a in result['alerts']] == [(1, 'low_attendance')]
+        assert '33.3%' in result['alerts'][0]['message']
+
+    def test_configured_rules(self, client, rules_db):
+        """Test that thresholds and rules follow the active config"""
+        alert_rules.configure(alert_rules.AlertRuleConfig.from_dict(
+            {'high_stress_at_or_above': 10, 'concerning_moods': ['anxious'], 'disabled': ['low_sleep']}))
+        add_wellbeing([(1, 9, 1, 'Anxious'), (2, 10, 6, 'Happy')])
+
+        result = self.check(client)
+        assert {(a['student_id'], a['alert_type']) for a in result['alerts']} == \
+            {(1, 'concerning_mood'), (2, 'high_stress')}
+
+    def test_unknown_rule_rejected(self):
+        """Test that disabling an unknown alert type is an error"""
+        with pytest.raises(ValueError):
+            alert_rules.AlertRuleConfig.from_dict({'disabled': ['sleepy']})
+
+
+def parse_events(body):
+    """(event, id, data) for each Server-Sent Event in `body`"""
+    events = []
+    for block in body.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+    return events
+
+
+class TestAlertStream:
+    """Test the Server-Sent Events alert feed"""
+
+    def add_alerts(self, count):
+        conn = get_db_connection()
+        conn.executemany("INSERT INTO alerts (student_id, alert_type, message) VALUES (1, 'note', ?)",
+                         [(f'note {i}',) for i in range(count)])
+        conn.commit()
+        conn.close()
+
+    def test_stream_resumes_after_since_id(self, client, rules_db, monkeypatch):
+        """Test that unread alerts after the cursor are replayed in id order"""
+        monkeypatch.setattr(notifications, 'HEARTBEAT_SECONDS', 0.05)
+        monkeypatch.setattr(notifications, 'STREAM_MAX_SECONDS', 0.2)
+        self.add_alerts(4)
+        client.put('/api/alerts/mark-read/3')
+
+        response = client.get('/api/alerts/stream?since_id=1')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert 'Content-Encoding' not in response.headers
+        body = response.get_data()
+        assert body.startswith(b'retry: ')
+        assert b': keepalive' in body
+
+        events = parse_events(body)
+        assert [(e, i) for e, i, _ in events] == [('alert', '2'), ('alert', '4')]
+        assert events[0][2]['sid'] == 'STU10001'
+
+        # Reconnecting browsers resume from Last-Event-ID
+        response = client.get('/api/alerts/stream', headers={'Last-Event-ID': '2'})
+        assert [i for _, i, _ in parse_events(response.get_data())] == ['4']
+
+    def test_stream_pushes_new_and_read_alerts(self, client, rules_db, monkeypatch):
+        """Test that alerts created and acknowledged after connecting are pushed"""
+        # Long heartbeat: delivery has to come from the notification hub
+        monkeypatch.setattr(notifications, 'HEARTBEAT_SECONDS', 30)
+        monkeypatch.setattr(notifications, 'STREAM_MAX_SECONDS', 1)
+        self.add_alerts(1)
+
+        def write():
+            other = app.test_client()
+            time.sleep(0.1)
+            response = other.post('/api/alerts/create',
+                data=json.dumps({'student_id': 2, 'alert_type': 'note', 'message': 'Check in'}),
+                content_type='application/json')
+            # Give the stream time to read the new alert before it is acknowledged
+            time.sleep(0.2)
+            other.put('/api/alerts/mark-read/1')
+            other.put(f"/api/alerts/mark-read/{json.loads(response.data)['alert_id']}")
+
+        start = time.monotonic()
+        response = client.get('/api/alerts/stream')
+        writer = threading.Thread(target=write)
+        writer.start()
+        body = response.get_data()
+        writer.join()
+
+        events = parse_events(body)
+        assert events[0][0] == 'alert' and events[0][2]['message'] == 'Check in'
+        read = [i for e, _, data in events if e == 'alert_read' for i in data['ids']]
+        assert read == [1, 2]
+        assert time.monotonic() - start < 5
+
+    def mark_read_elsewhere(self, alert_id):
+        """Acknowledge as another worker would: no event on this process's hub"""
+        conn = get_db_connection()
+        conn.execute('UPDATE alerts SET is_read = 1 WHERE id = ?', (alert_id,))
+        conn.commit()
+        conn.close()
+
+    def test_stream_resyncs_after_acknowledgement_elsewhere(self, client, rules_db, monkeypatch):
+        """Test that a heartbeat notices alerts read by another process"""
+        monkeypatch.setattr(notifications, 'HEARTBEAT_SECONDS', 0.1)
+        monkeypatch.setattr(notifications, 'STREAM_MAX_SECONDS', 0.6)
+        self.add_alerts(2)
+
+        def write():
+            time.sleep(0.2)
+            self.mark_read_elsewhere(1)
+
+        response = client.get('/api/alerts/stream?since_id=0')
+        writer = threading.Thread(target=write)
+        writer.start()
+        body = response.get_data()
+        writer.join()
+
+        events = [e for e, _, _ in parse_events(body)]
+        assert events == ['alert', 'alert', 'resync']
+
+    def test_streams_beyond_limit_poll(self, client, rules_db, monkeypatch):
+        """Test that clients over the stream limit get one round per connection"""
+        monkeypatch.setattr(notifications, 'MAX_STREAMS', 0)
+        self.add_alerts(2)
+
+        start = time.monotonic()
+        body = client.get('/api/alerts/stream?since_id=0').get_data()
+        assert time.monotonic() - start < 1
+        assert body.startswith(f'retry: {notifications.POLL_RETRY_MS}'.encode())
+        assert [i for _, i, _ in parse_events(body)] == ['1', '2']
+        assert notifications.hub.stats()['subscribers'] == 0
+
+        # The last id marker carries the version; reads elsewhere show up on the next poll
+        last_event_id = [line[4:] for line in body.decode().splitlines() if line.startswith('id: ')][-1]
+        self.mark_read_elsewhere(2)
+        body = client.get('/api/alerts/stream', headers={'Last-Event-ID': last_event_id}).get_data()
+        assert [e for e, _, _ in parse_events(body)] == ['resync']
+
+        body = client.get('/api/alerts/stream', headers={'Last-Event-ID': last_event_id.split(':')[0]}).get_data()
+        assert parse_events(body) == []
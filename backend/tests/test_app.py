@@ -0,0 +1,55 @@
+"""
+Test cases for the app factory and WSGI entry point
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from database import get_db_connection
+from migrations import LATEST_VERSION, current_version
+import database
+import importlib
+import json
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Path of a database that does not exist yet"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'factory.db'))
+    yield tmp_path / 'factory.db'
+    database.close_pool()
+
+
+class TestAppFactory:
+    """Test create_app() and wsgi.py"""
+
+    def test_config_overrides_defaults(self, fresh_db):
+        """Test that config is applied and the schema check can be skipped"""
+        app = create_app({'INIT_DB': False, 'TESTING': True, 'JWT_SECRET_KEY': 'test-key'})
+        assert app.config['JWT_SECRET_KEY'] == 'test-key'
+        assert not fresh_db.exists()
+
+        response = app.test_client().get('/health')
+        assert json.loads(response.data) == {'status': 'healthy'}
+        assert json.loads(app.test_client().get('/missing').data) == {'error': 'Not found'}
+
+    def test_apps_are_independent(self, fresh_db):
+        """Test that each call builds a separate app with every blueprint"""
+        first, second = create_app({'TESTING': True}), create_app({'INIT_DB': False})
+        assert first is not second
+        assert set(first.blueprints) == set(second.blueprints) >= {'core', 'auth', 'alerts', 'exports'}
+
+        conn = get_db_connection()
+        assert current_version(conn) == LATEST_VERSION
+        conn.close()
+
+    def test_wsgi_checks_schema_once(self, fresh_db):
+        """Test that the WSGI module migrates the database and leaves no pooled connections"""
+        import wsgi
+        importlib.reload(wsgi)
+        assert fresh_db.exists()
+        assert database._pool is None
+        assert wsgi.app.config['INIT_DB'] is False
+        assert wsgi.app.test_client().get('/health').status_code == 200
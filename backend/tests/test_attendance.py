@@ -7,7 +7,10 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app
-from database import init_db, get_db_connection
+from database import init_db, get_db_connection, seed_sample_data
+from seeding import SeedConfig
+import database
+import io
 import json
 
 
@@ -82,3 +85,127 @@ class TestAttendanceEndpoints:
         assert response.status_code == 200
         data = json.loads(response.data)
         assert isinstance(data, list)
+
+
+@pytest.fixture
+def seeded_db(tmp_path, monkeypatch):
+    """Temporary database filled by the sample data generator"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'attendance.db'))
+    init_db()
+    seed_sample_data(SeedConfig(students=200, days=5, tracked_fraction=0.25, seed=3))
+    yield
+
+
+class TestAttendanceAnalytics:
+    """Test attendance analytics against generated data"""
+
+    def test_correlation_is_streamed(self, client, seeded_db):
+        """Test that the per-student correlation is streamed as a JSON array"""
+        response = client.get('/api/attendance/attendance-grades-correlation?days=30')
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == 'application/json'
+
+        data = json.loads(response.data)
+        assert len(data) == 50
+        assert {'id', 'attendance_rate', 'avg_grade'} <= set(data[0])
+
+
+class TestAttendanceBatch:
+    """Test recording a whole register at once"""
+
+    def test_record_register(self, client, seeded_db):
+        """Test that a register is stored in one batch with per-row ids"""
+        register = [{'student_id': sid, 'class_date': '2025-12-06', 'present': sid % 3 != 0}
+                    for sid in range(1, 201)]
+        response = client.post('/api/attendance/record-batch',
+            data=json.dumps(register),
+            content_type='application/json'
+        )
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data['inserted'] == 200
+        ids = [r['record_id'] for r in data['results']]
+        assert len(set(ids)) == 200
+
+        conn = get_db_connection()
+        rows = conn.execute('''SELECT id, student_id, present FROM attendance
+                               WHERE class_date = '2025-12-06' ORDER BY id''').fetchall()
+        conn.close()
+        assert [r['id'] for r in rows] == ids
+        assert [r['student_id'] for r in rows] == list(range(1, 201))
+        assert sum(r['present'] for r in rows) == 134
+
+    def test_invalid_register_is_rejected_whole(self, client, seeded_db):
+        """Test that one bad row rejects the batch and is reported by index"""
+        response = client.post('/api/attendance/record-batch',
+            data=json.dumps({'records': [
+                {'student_id': 1, 'class_date': '2025-12-07'},
+                {'student_id': 2, 'class_date': '07/12/2025'},
+                {'student_id': 99999, 'class_date': '2025-12-07'},
+            ]}),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+        data = json.loads(response.data)
+        assert [e['index'] for e in data['errors']] == [1, 2]
+        assert 'class_date' in data['errors'][0]['error']
+
+        conn = get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM attendance WHERE class_date = '2025-12-07'").fetchone()[0]
+        conn.close()
+        assert count == 0
+
+    def test_empty_batch_rejected(self, client, setup_db):
+        """Test that an empty batch is a bad request"""
+        response = client.post('/api/attendance/record-batch',
+            data=json.dumps([]),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+
+
+class TestAttendanceImport:
+    """Test importing attendance registers from CSV"""
+
+    def test_import_register_upload(self, client, seeded_db):
+        """Test that a CSV upload resolves student codes and reports rejects"""
+        conn = get_db_connection()
+        codes = [r[0] for r in conn.execute('SELECT student_id FROM students ORDER BY id LIMIT 3')]
+        conn.close()
+
+        lines = ['student_id,class_date,present',
+                 f'{codes[0]},2025-11-03,present',
+                 f'{codes[1]},2025-11-03,absent',
+                 'STU99999,2025-11-03,1',
+                 f'{codes[2]},03/11/2025,1',
+                 f'{codes[2]},2025-11-03,maybe',
+                 f'{codes[2]},2025-11-03,']
+        response = client.post('/api/attendance/import?chunk_size=2',
+            data={'file': (io.BytesIO('\n'.join(lines).encode()), 'register.csv')},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['rows'] == 6
+        assert data['imported'] == 3
+        assert data['chunks'] == 2
+        assert data['rejected'] == 3
+        assert [r['line'] for r in data['rejects']] == [4, 5, 6]
+        assert data['rejects'][0]['error'] == 'Unknown student STU99999'
+
+        conn = get_db_connection()
+        rows = conn.execute('''SELECT s.student_id, a.present FROM attendance a
+                               JOIN students s ON s.id = a.student_id
+                               WHERE a.class_date = '2025-11-03' ORDER BY a.id''').fetchall()
+        conn.close()
+        assert [tuple(r) for r in rows] == [(codes[0], 1), (codes[1], 0), (codes[2], 1)]
+
+    def test_import_missing_columns(self, client, setup_db):
+        """Test that a file without the required columns is rejected"""
+        response = client.post('/api/attendance/import',
+            data='student_id,date\nSTU10001,2025-11-03\n',
+            content_type='text/csv'
+        )
+        assert response.status_code == 400
+        assert 'class_date' in json.loads(response.data)['error']
@@ -9,6 +9,13 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app
 from database import init_db, get_db_connection
+from hashing import HashPool, HashingBusy, HashingTimeout
+from werkzeug.security import generate_password_hash
+import hashing
+import provisioning
+import database
+import io
+import time
 import json
 
 
@@ -145,3 +152,278 @@ class TestAuthEndpoints:
             content_type='application/json'
         )
         assert response.status_code == 400
+
+
+@pytest.fixture
+def auth_db(tmp_path, monkeypatch):
+    """Temporary database with one user whose hash uses outdated parameters"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'auth.db'))
+    init_db()
+    conn = get_db_connection()
+    conn.execute('''INSERT INTO users (username, password, email, role)
+                    VALUES ('legacy', ?, 'legacy@test.com', 'staff')''',
+                 (generate_password_hash('secret', method='pbkdf2:sha256:1000'),))
+    conn.commit()
+    conn.close()
+    yield
+
+
+def login(client, username='legacy', password='secret'):
+    return client.post('/api/auth/login',
+        data=json.dumps({'username': username, 'password': password}),
+        content_type='application/json'
+    )
+
+
+def staff_headers(client):
+    """Authorization header of the staff user in auth_db"""
+    token = json.loads(login(client).data)['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def stored_hash(username='legacy'):
+    conn = get_db_connection()
+    pwhash = conn.execute('SELECT password FROM users WHERE username = ?', (username,)).fetchone()[0]
+    conn.close()
+    return pwhash
+
+
+class TestPasswordHashing:
+    """Test pooled hashing, rehash-on-login and backpressure"""
+
+    def test_login_rehashes_outdated_hash(self, client, auth_db):
+        """Test that a successful login upgrades the stored hash parameters"""
+        assert hashing.needs_rehash(stored_hash())
+        assert login(client).status_code == 200
+        assert stored_hash().startswith(hashing.HASH_METHOD + '$')
+        assert not hashing.needs_rehash(stored_hash())
+
+        upgraded = stored_hash()
+        assert login(client).status_code == 200
+        assert login(client, password='wrong').status_code == 401
+        assert stored_hash() == upgraded
+
+    def test_worker_processes_hash(self):
+        """Test that hashes computed on a worker process verify"""
+        pool = HashPool(workers=1)
+        try:
+            pwhash = pool.run(hashing.hash_password, 'secret', 'pbkdf2:sha256:1000')
+            assert pool.run(hashing.verify_password, pwhash, 'secret') is True
+            assert pool.run(hashing.verify_password, pwhash, 'wrong') is False
+        finally:
+            pool.shutdown()
+        assert pool.stats()['pending'] == 0
+
+    def test_timed_out_jobs_keep_their_slots(self):
+        """Test that a job still running after its timeout stays counted"""
+        pool = HashPool(workers=1, max_pending=2, timeout=30)
+        try:
+            # Start the worker process before shortening the timeout
+            assert pool.run(abs, -1) == 1
+            pool.timeout = 0.1
+            for _ in range(2):
+                with pytest.raises(HashingTimeout):
+                    pool.run(time.sleep, 1)
+            assert pool.stats()['pending'] == 2
+            with pytest.raises(HashingBusy):
+                pool.run(abs, -1)
+
+            deadline = time.monotonic() + 10
+            while pool.stats()['pending'] and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert pool.stats()['pending'] == 0
+            pool.timeout = 30
+            assert pool.run(abs, -2) == 2
+        finally:
+            pool.shutdown()
+
+    def test_full_pool_rejects_logins(self, client, auth_db, monkeypatch):
+        """Test that logins fail fast with 503 when too many hashes are queued"""
+        monkeypatch.setattr(hashing, 'pool', HashPool(workers=0, max_pending=0))
+        response = login(client)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert hashing.pool.stats()['rejected'] == 1
+        with pytest.raises(HashingBusy):
+            hashing.hash_password_async('secret')
+
+    def test_login_latency_metrics(self, client, auth_db):
+        """Test that login latency is reported in /api/metrics"""
+        before = json.loads(client.get('/api/metrics').data)['password_hashing']['latency']['login']['count']
+        login(client)
+        login(client, password='wrong')
+        metrics = json.loads(client.get('/api/metrics').data)['password_hashing']
+        assert metrics['latency']['login']['count'] == before + 2
+        assert metrics['latency']['login']['max_ms'] >= metrics['latency']['login']['p50_ms'] > 0
+        assert metrics['pool']['workers'] == hashing.pool.workers
+
+
+ROSTER = """student_id,first_name,last_name,email,username,password
+STU20001,Ava,Brown,ava@university.edu,ava,initial-1
+STU20002,Noah,Green,noah@university.edu,,
+STU20001,Ava,Again,ava2@university.edu,ava2,x
+STU20003,Mia,White,legacy@test.com,mia,x
+STU20004,Leo,Black,,leo,x
+STU10001,Emma,Smith,emma@university.edu,emma,x
+"""
+
+
+class TestProvisioning:
+    """Test bulk account provisioning from a roster"""
+
+    @pytest.fixture
+    def roster_db(self, auth_db):
+        conn = get_db_connection()
+        conn.execute('''INSERT INTO students (student_id, first_name, last_name, email)
+                        VALUES ('STU10001', 'Emma', 'Smith', 'emma@university.edu')''')
+        conn.commit()
+        conn.close()
+        yield
+
+    def test_roster_creates_and_links_accounts(self, roster_db):
+        """Test that accounts are created, linked and duplicates reported"""
+        credentials = []
+        conn = get_db_connection()
+        summary = provisioning.provision(conn, io.StringIO(ROSTER), chunk_size=2, workers=0,
+                                         hash_method='pbkdf2:sha256:1000',
+                                         on_credential=lambda entry, pw: credentials.append((entry, pw)))
+        conn.close()
+
+        assert (summary.rows, summary.created, summary.linked) == (6, 2, 1)
+        assert (summary.rejected, summary.duplicates) == (3, 2)
+        assert sorted(r['line'] for r in summary.rejects) == [4, 5, 6]
+        assert summary.generated == 1
+        assert [entry['username'] for entry, _ in credentials] == ['STU20002']
+
+        conn = get_db_connection()
+        rows = conn.execute('''SELECT s.student_id, u.username, u.password, u.role
+                               FROM students s JOIN users u ON u.id = s.user_id
+                               ORDER BY s.student_id''').fetchall()
+        conn.close()
+        assert [(r['student_id'], r['username'], r['role']) for r in rows] == \
+            [('STU10001', 'emma', 'student'), ('STU20001', 'ava', 'student'),
+             ('STU20002', 'STU20002', 'student')]
+        assert hashing.verify_password(rows[1]['password'], 'initial-1')
+        assert hashing.verify_password(rows[2]['password'], credentials[0][1])
+
+        # Running the same roster again only reports duplicates
+        conn = get_db_connection()
+        again = provisioning.provision(conn, io.StringIO(ROSTER), workers=0)
+        conn.close()
+        assert (again.created, again.linked, again.rejected) == (0, 0, 6)
+
+    def test_rejected_row_does_not_claim_its_keys(self, roster_db):
+        """Test that keys of a row rejected against the database stay free
+        for later rows, while repeats within the file are still caught"""
+        roster = ('student_id,first_name,last_name,email,username\n'
+                  'STU20003,Mia,White,legacy@test.com,mia\n'
+                  'STU20005,Mia,White,mia@university.edu,mia\n'
+                  'STU20006,Max,Gray,mia@university.edu,max\n')
+        # One chunk per row, then the whole roster in one chunk
+        for chunk_size, suffix in ((1, ''), (1000, '-b')):
+            conn = get_db_connection()
+            summary = provisioning.provision(
+                conn, io.StringIO(roster.replace('mia', f'mia{suffix}').replace('STU2000', f'STU2{suffix}')),
+                chunk_size=chunk_size, workers=0, hash_method='pbkdf2:sha256:1000')
+            conn.close()
+            assert (summary.created, summary.rejected) == (1, 2)
+            assert [r['line'] for r in summary.rejects] == [2, 4]
+
+    def test_pool_map_keeps_order_and_bounds(self):
+        """Test bulk jobs on the bounded pool"""
+        pool = HashPool(workers=2, max_pending=1, timeout=5)
+        try:
+            results = pool.map(pow, [(i, 2) for i in range(6)])
+            assert results == [0, 1, 4, 9, 16, 25]
+            assert pool.stats()['pending'] == 0
+        finally:
+            pool.shutdown()
+
+    def test_parallel_hashing(self, roster_db):
+        """Test that passwords hashed on worker processes verify"""
+        roster = 'student_id,first_name,last_name,email,password\n' + ''.join(
+            f'STU3{i:04d},F{i},L{i},s{i}@university.edu,pw{i}\n' for i in range(20))
+        conn = get_db_connection()
+        summary = provisioning.provision(conn, io.StringIO(roster), workers=2,
+                                         hash_method='pbkdf2:sha256:1000')
+        pwhash = conn.execute("SELECT password FROM users WHERE username = 'STU30007'").fetchone()[0]
+        conn.close()
+        assert summary.created == 20
+        assert hashing.verify_password(pwhash, 'pw7')
+
+    def test_provision_endpoint(self, client, roster_db, monkeypatch):
+        """Test uploading a roster, and rejecting one without required columns"""
+        monkeypatch.setattr(provisioning, 'PROVISION_WORKERS', 0)
+        response = client.post('/api/auth/provision', data=ROSTER, content_type='text/csv',
+                               headers=staff_headers(client))
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        # Existing students are never linked over HTTP
+        assert (data['created'], data['linked'], data['duplicates']) == (2, 0, 3)
+        conn = get_db_connection()
+        assert conn.execute("SELECT user_id FROM students WHERE student_id = 'STU10001'").fetchone()[0] is None
+        conn.close()
+
+        response = login(client, 'ava', 'initial-1')
+        assert response.status_code == 200
+
+        response = client.post('/api/auth/provision', data='student_id,email\n', content_type='text/csv',
+                               headers=staff_headers(client))
+        assert response.status_code == 400
+
+    def test_provision_endpoint_requires_staff(self, client, roster_db):
+        """Test that only signed-in staff may provision accounts"""
+        response = client.post('/api/auth/provision', data=ROSTER, content_type='text/csv')
+        assert response.status_code == 401
+
+        client.post('/api/auth/register', data=json.dumps({
+            'username': 'pupil', 'password': 'pw', 'email': 'pupil@test.com', 'role': 'student'}),
+            content_type='application/json')
+        token = json.loads(login(client, 'pupil', 'pw').data)['access_token']
+        response = client.post('/api/auth/provision', data=ROSTER, content_type='text/csv',
+                               headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 403
+
+    def test_provision_endpoint_streams_credentials(self, client, roster_db, monkeypatch):
+        """Test that generated passwords come back with the summary"""
+        monkeypatch.setattr(hashing.pool, 'workers', 0)
+        monkeypatch.setattr(hashing, 'HASH_METHOD', 'pbkdf2:sha256:1000')
+        roster = 'student_id,first_name,last_name,email\n' + ''.join(
+            f'STU4{i:04d},F{i},L{i},t{i}@university.edu\n' for i in range(5))
+        response = client.post('/api/auth/provision?chunk_size=2', data=roster, content_type='text/csv',
+                               headers=staff_headers(client))
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert (data['created'], data['generated'], data['chunks']) == (5, 5, 3)
+        assert [c['username'] for c in data['credentials']] == [f'STU4{i:04d}' for i in range(5)]
+        assert login(client, 'STU40003', data['credentials'][3]['password']).status_code == 200
+
+    def test_provision_endpoint_limits_rows(self, client, roster_db, monkeypatch):
+        """Test that rosters over the request limit are refused before any work"""
+        monkeypatch.setattr(provisioning, 'MAX_REQUEST_ROWS', 3)
+        response = client.post('/api/auth/provision', data=ROSTER, content_type='text/csv',
+                               headers=staff_headers(client))
+        assert response.status_code == 413
+
+        conn = get_db_connection()
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'ava'").fetchone()[0] == 0
+        conn.close()
+
+    def test_provision_endpoint_counts_records(self, client, roster_db, monkeypatch):
+        """Test that the row limit counts CSV records, not physical lines"""
+        monkeypatch.setattr(hashing.pool, 'workers', 0)
+        monkeypatch.setattr(hashing, 'HASH_METHOD', 'pbkdf2:sha256:1000')
+        monkeypatch.setattr(provisioning, 'MAX_REQUEST_ROWS', 3)
+        roster = ('student_id,first_name,last_name,email\n\n'
+                  'STU50001,"Mary\nAnne",Lee,m1@university.edu\n\n\n'
+                  'STU50002,Bo,Lee,m2@university.edu\n\n'
+                  'STU50003,Cy,Lee,m3@university.edu\n')
+        response = client.post('/api/auth/provision', data=roster, content_type='text/csv',
+                               headers=staff_headers(client))
+        assert response.status_code == 200
+        assert json.loads(response.data)['created'] == 3
+
+        response = client.post('/api/auth/provision', data=roster + 'STU50004,Di,Lee,m4@university.edu\n',
+                               content_type='text/csv', headers=staff_headers(client))
+        assert response.status_code == 413
+
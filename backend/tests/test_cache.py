@@ -0,0 +1,118 @@
+"""
+Test cases for the response cache
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from database import init_db, get_db_connection
+import cache
+import json
+
+
+@pytest.fixture
+def client():
+    """Create test client"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def setup_db():
+    """Setup test database with empty caches"""
+    init_db()
+    cache.invalidate('students', 'wellbeing_records', 'attendance', 'grades', 'alerts')
+    yield
+
+
+class TestResponseCache:
+    """Test caching of dashboard aggregates"""
+
+    def test_repeat_request_is_a_hit(self, client, setup_db):
+        """Test that the second dashboard load is served from cache"""
+        first = client.get('/api/grades/statistics')
+        second = client.get('/api/grades/statistics')
+
+        assert first.headers['X-Cache'] == 'MISS'
+        assert second.headers['X-Cache'] == 'HIT'
+        assert json.loads(first.data) == json.loads(second.data)
+
+    def test_write_invalidates_dependent_cache(self, client, setup_db):
+        """Test that recording a grade refreshes grade statistics"""
+        before = json.loads(client.get('/api/grades/statistics').data)
+        client.post('/api/grades/record',
+            data=json.dumps({'student_id': 1, 'assignment_id': 1, 'grade': 55}),
+            content_type='application/json'
+        )
+        response = client.get('/api/grades/statistics')
+
+        assert response.headers['X-Cache'] == 'MISS'
+        assert json.loads(response.data)['total_grades'] == before['total_grades'] + 1
+
+    def test_unrelated_write_keeps_cache(self, client, setup_db):
+        """Test that attendance writes leave grade statistics cached"""
+        client.get('/api/grades/statistics')
+        client.post('/api/attendance/record',
+            data=json.dumps({'student_id': 1, 'class_date': '2025-12-06', 'present': True}),
+            content_type='application/json'
+        )
+        assert client.get('/api/grades/statistics').headers['X-Cache'] == 'HIT'
+
+    def test_write_from_another_process_is_a_miss(self, client, setup_db):
+        """Test that a write which skips invalidate() (another worker, a CLI)
+        still refreshes the cached body and its ETag together"""
+        before = client.get('/api/grades/statistics')
+        conn = get_db_connection()
+        conn.execute("INSERT INTO grades (student_id, assignment_id, grade) VALUES (1, 1, 60)")
+        conn.commit()
+        conn.close()
+        response = client.get('/api/grades/statistics',
+                              headers={'If-None-Match': before.headers['ETag']})
+
+        assert response.status_code == 200
+        assert response.headers['X-Cache'] == 'MISS'
+        assert json.loads(response.data)['total_grades'] == json.loads(before.data)['total_grades'] + 1
+
+    def test_streamed_response_is_cached(self, client, setup_db):
+        """Test that a streamed body is collected and replayed from cache"""
+        first = client.get('/api/wellbeing/heatmap-data')
+        body = first.data
+        second = client.get('/api/wellbeing/heatmap-data')
+
+        assert second.headers['X-Cache'] == 'HIT'
+        assert second.data == body
+
+    def test_cache_stats_exposed(self, client, setup_db):
+        """Test that hit and miss counters appear in metrics"""
+        client.get('/api/attendance/summary')
+        client.get('/api/attendance/summary')
+        stats = json.loads(client.get('/api/metrics').data)['response_cache']
+
+        summary = stats['routes.attendance.get_attendance_summary']
+        assert summary['hits'] >= 1
+        assert summary['misses'] >= 1
+
+
+class TestCacheInternals:
+    """Test ResponseCache bookkeeping directly"""
+
+    def test_lru_bound(self):
+        """Test that the oldest entry is evicted beyond maxsize"""
+        store = cache.ResponseCache('test-lru', ttl=60, maxsize=2, tables=[])
+        for key in 'abc':
+            store.put(key, store.generation(), (key.encode(), 'text/plain'))
+        assert store.get('a') is None
+        assert store.get('c') == (b'c', 'text/plain')
+
+    def test_write_during_miss_is_not_stored(self):
+        """Test that a result computed before a write is discarded"""
+        store = cache.ResponseCache('test-race', ttl=60, maxsize=2, tables=['grades'])
+        cache._caches['test-race'] = store
+        generation = store.generation()
+        cache.invalidate('grades')
+        store.put('k', generation, (b'stale', 'text/plain'))
+        assert store.get('k') is None
+        del cache._caches['test-race']
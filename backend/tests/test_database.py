@@ -4,9 +4,14 @@ Test cases for database operations
 import pytest
 import sys
 import os
+import sqlite3
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import init_db, get_db_connection, seed_sample_data
+from database import init_db, get_db_connection, seed_sample_data, ConnectionPool, PoolTimeout
+from migrations import apply_migrations, current_version, rebuild_derived, LATEST_VERSION
+from seeding import SeedConfig
+import seeding
+import database
 
 
 class TestDatabase:
@@ -114,3 +119,369 @@ class TestDatabase:
             assert 'first_name' in result.keys()
         
         conn.close()
+
+
+class TestConnectionPool:
+    """Test pooled database connections"""
+
+    def test_connection_is_reused_after_close(self):
+        """Test that a closed connection goes back to the pool"""
+        init_db()
+        conn = get_db_connection()
+        raw = conn._conn
+        conn.close()
+
+        conn = get_db_connection()
+        assert conn._conn is raw
+        conn.close()
+
+    def test_closed_connection_cannot_be_used(self):
+        """Test that a released proxy no longer reaches the connection"""
+        conn = get_db_connection()
+        conn.close()
+        conn.close()  # closing twice is harmless
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.cursor()
+
+    def test_pragmas_applied(self):
+        """Test that pooled connections get the tuning pragmas"""
+        conn = get_db_connection()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        conn.close()
+
+    def test_open_transaction_rolled_back_on_release(self):
+        """Test that uncommitted work is discarded when returned to the pool"""
+        init_db()
+        conn = get_db_connection()
+        conn.execute("INSERT INTO assignments (title, due_date) VALUES ('pool-rollback', '2025-01-01')")
+        conn.close()
+
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM assignments WHERE title = 'pool-rollback'")
+        assert c.fetchone()[0] == 0
+        conn.close()
+
+    def test_pool_timeout(self, tmp_path):
+        """Test that an exhausted pool times out instead of growing"""
+        pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, timeout=0.05)
+        conn = pool.acquire()
+
+        with pytest.raises(PoolTimeout):
+            pool.acquire()
+
+        stats = pool.stats()
+        assert stats['size'] == 1
+        assert stats['in_use'] == 1
+        assert stats['timeouts'] == 1
+        conn.close()
+        assert pool.stats()['idle'] == 1
+        pool.close()
+
+
+class TestMigrations:
+    """Test versioned schema migrations"""
+
+    def test_schema_version_recorded(self):
+        """Test that init_db records the latest migration"""
+        init_db()
+        conn = get_db_connection()
+        assert current_version(conn) == LATEST_VERSION
+        conn.close()
+
+    def test_current_schema_skips_ddl(self, tmp_path, monkeypatch):
+        """Test that a database stamped with the latest version is not re-checked"""
+        monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'stamped.db'))
+        init_db()
+        conn = get_db_connection()
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION
+        conn.execute('DROP TABLE staff')
+        conn.commit()
+        conn.close()
+
+        def has_staff():
+            conn = get_db_connection()
+            found = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'staff'").fetchone()
+            conn.close()
+            return found is not None
+
+        init_db()
+        assert not has_staff()
+
+        # An older stamp (e.g. after a code upgrade) runs the full check again
+        conn = get_db_connection()
+        conn.execute('PRAGMA user_version = 0')
+        conn.close()
+        init_db()
+        assert has_staff()
+
+    def test_hot_query_indexes_exist(self):
+        """Test that the index migration created the hot-path indexes"""
+        init_db()
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        indexes = {row[0] for row in c.fetchall()}
+
+        for name in ['idx_wellbeing_student_date', 'idx_attendance_student_date',
+                     'idx_alerts_unread_created', 'idx_alerts_student',
+                     'idx_grades_student', 'idx_grades_assignment']:
+            assert name in indexes, f"Index {name} should exist"
+        conn.close()
+
+    def test_migrations_are_idempotent(self):
+        """Test that re-running migrations applies nothing"""
+        init_db()
+        conn = get_db_connection()
+        assert apply_migrations(conn) == []
+        conn.close()
+
+    def test_unread_alerts_use_index(self):
+        """Test that the unread alert feed is served from an index"""
+        init_db()
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute('''EXPLAIN QUERY PLAN
+                     SELECT id FROM alerts WHERE is_read = 0 ORDER BY created_date DESC''')
+        plan = ' '.join(row[3] for row in c.fetchall())
+        assert 'USING' in plan and 'INDEX' in plan
+        assert 'TEMP B-TREE' not in plan
+        conn.close()
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the database module at an empty file for this test"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'test.db'))
+    init_db()
+    yield
+
+
+class TestSeeding:
+    """Test the synthetic data generator"""
+
+    def _snapshot(self):
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute('SELECT student_id, first_name, last_name FROM students ORDER BY id')
+        students = [tuple(r) for r in c.fetchall()]
+        c.execute('SELECT student_id, stress_level, sleep_level, mood FROM wellbeing_records ORDER BY id')
+        records = [tuple(r) for r in c.fetchall()]
+        conn.close()
+        return students, records
+
+    def test_seed_scales_with_config(self, temp_db):
+        """Test that the configured scale is generated"""
+        summary = seed_sample_data(SeedConfig(students=600, days=5, tracked_fraction=0.5, seed=7))
+
+        assert summary['rows']['students'] == 600
+        assert summary['rows']['wellbeing_records'] == 300 * 5
+        assert summary['rows']['attendance'] == 300 * 5
+        assert summary['rows']['grades'] == 300 * 2
+
+        students, records = self._snapshot()
+        assert len(students) == 600
+        assert len(records) == 1500
+
+    def test_seed_is_deterministic(self, temp_db, tmp_path, monkeypatch):
+        """Test that the same seed produces the same rows"""
+        config = dict(students=400, days=3, tracked_fraction=0.25, seed=42)
+        seed_sample_data(SeedConfig(**config))
+        first = self._snapshot()
+
+        monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'second.db'))
+        init_db()
+        seed_sample_data(SeedConfig(**config))
+        assert self._snapshot() == first
+
+    def test_seed_twice_is_skipped(self, temp_db):
+        """Test that seeding an already seeded database is a no-op"""
+        assert seed_sample_data(SeedConfig(students=10, days=1, seed=1)) is not None
+        assert seed_sample_data(SeedConfig(students=10, days=1, seed=1)) is None
+
+    def test_seed_restores_indexes(self, temp_db):
+        """Test that indexes dropped for the bulk load are rebuilt"""
+        seed_sample_data(SeedConfig(students=50, days=2, seed=3))
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'idx_wellbeing_student_date'")
+        assert c.fetchone()[0] == 1
+        conn.close()
+
+    def test_failed_seed_restores_indexes(self, temp_db, monkeypatch):
+        """Test that a seed failing after an intermediate commit still
+        leaves every index and trigger in place"""
+        def count_objects():
+            conn = get_db_connection()
+            count = conn.execute("SELECT COUNT(*) FROM sqlite_master "
+                                 "WHERE type IN ('index', 'trigger')").fetchone()[0]
+            conn.close()
+            return count
+
+        before = count_objects()
+        generate_unit = seeding.generate_unit
+        calls = []
+
+        def failing_unit(unit):
+            calls.append(unit)
+            if len(calls) > 1:
+                raise RuntimeError('generator crashed')
+            return generate_unit(unit)
+
+        monkeypatch.setattr(seeding, 'generate_unit', failing_unit)
+        with pytest.raises(RuntimeError):
+            seed_sample_data(SeedConfig(students=2000, days=2, tracked_fraction=0.5,
+                                        batch_size=500, commit_every=1, seed=9))
+
+        assert count_objects() == before
+        conn = get_db_connection()
+        unread = conn.execute('SELECT COUNT(*) FROM alerts WHERE is_read = 0').fetchone()[0]
+        counted = conn.execute('SELECT COALESCE(SUM(unread), 0) FROM alert_unread_counts').fetchone()[0]
+        conn.close()
+        assert unread > 0
+        assert counted == unread
+
+    def test_interrupted_seed_is_repaired_on_startup(self, temp_db):
+        """Test that indexes and triggers a killed seed left dropped are
+        rebuilt by the next init_db(), despite the current schema stamp"""
+        conn = get_db_connection()
+        before = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type IN ('index', 'trigger')").fetchone()[0]
+        c = conn.cursor()
+        seeding._drop_derived(c)
+        c.execute("INSERT INTO students (student_id, first_name, last_name, email) "
+                  "VALUES ('STU99999', 'Kim', 'Lee', 'kim@university.edu')")
+        c.execute("INSERT INTO alerts (student_id, alert_type, message) VALUES (1, 'note', 'loaded')")
+        conn.commit()
+        conn.close()
+
+        init_db()
+
+        conn = get_db_connection()
+        after = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type IN ('index', 'trigger')").fetchone()[0]
+        unread = conn.execute('SELECT COUNT(*) FROM alerts WHERE is_read = 0').fetchone()[0]
+        counted = conn.execute('SELECT COALESCE(SUM(unread), 0) FROM alert_unread_counts').fetchone()[0]
+        leftover = conn.execute('SELECT COUNT(*) FROM deferred_ddl').fetchone()[0]
+        conn.close()
+        assert after == before
+        assert counted == unread
+        assert leftover == 0
+
+    def test_config_rejects_bad_values(self):
+        """Test config validation for user-supplied scale"""
+        with pytest.raises(ValueError):
+            SeedConfig.from_dict({'students': 0})
+        with pytest.raises(ValueError):
+            SeedConfig.from_dict({'tracked_fraction': 2})
+        assert SeedConfig.from_dict({'students': '100'}).students == 100
+
+
+class TestDerivedTables:
+    """Test trigger-maintained summary tables"""
+
+    def _latest(self, student_id):
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM student_wellbeing_latest WHERE student_id = ?', (student_id,))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    def _record(self, student_id, stress, recorded_date):
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute('''INSERT INTO wellbeing_records (student_id, stress_level, sleep_level, mood, recorded_date)
+                     VALUES (?, ?, 5, 'Neutral', ?)''', (student_id, stress, recorded_date))
+        conn.commit()
+        record_id = c.lastrowid
+        conn.close()
+        return record_id
+
+    def test_latest_follows_newest_record(self, temp_db):
+        """Test that the summary keeps the most recent submission"""
+        self._record(1, 4, '2025-01-02 09:00:00')
+        self._record(1, 7, '2025-01-03 09:00:00')
+        # A back-dated submission must not replace the newer one
+        self._record(1, 2, '2025-01-01 09:00:00')
+
+        latest = self._latest(1)
+        assert latest['latest_stress'] == 7
+        assert latest['last_submission'] == '2025-01-03 09:00:00'
+
+    def test_latest_recomputed_on_delete(self, temp_db):
+        """Test that deleting the newest record falls back to the previous one"""
+        self._record(2, 3, '2025-01-02 09:00:00')
+        newest = self._record(2, 9, '2025-01-03 09:00:00')
+
+        conn = get_db_connection()
+        conn.execute('DELETE FROM wellbeing_records WHERE id = ?', (newest,))
+        conn.commit()
+        conn.close()
+
+        assert self._latest(2)['latest_stress'] == 3
+
+    def test_seeding_rebuilds_latest(self, temp_db):
+        """Test that the bulk loader repopulates the summary after dropping triggers"""
+        seed_sample_data(SeedConfig(students=100, days=3, tracked_fraction=0.2, seed=5))
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute('SELECT COUNT(*) FROM student_wellbeing_latest')
+        assert c.fetchone()[0] == 20
+        c.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'")
+        assert c.fetchone()[0] > 0
+        conn.close()
+
+    def test_daily_rollups_track_inserts(self, temp_db):
+        """Test that day and student-day rollups aggregate new records"""
+        self._record(1, 4, '2025-01-02 09:00:00')
+        self._record(1, 8, '2025-01-02 18:00:00')
+        self._record(2, 6, '2025-01-02 12:00:00')
+
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute("SELECT * FROM wellbeing_daily_rollup WHERE day = '2025-01-02'")
+        day = c.fetchone()
+        assert day['record_count'] == 3
+        assert day['stress_sum'] == 18 and day['stress_count'] == 3
+        assert day['stress_min'] == 4 and day['stress_max'] == 8
+
+        c.execute("SELECT * FROM wellbeing_student_daily_rollup WHERE student_id = 1 AND day = '2025-01-02'")
+        student_day = c.fetchone()
+        assert student_day['record_count'] == 2
+        assert student_day['stress_sum'] == 12
+        conn.close()
+
+    def test_daily_rollups_match_backfill(self, temp_db):
+        """Test that incremental maintenance agrees with a full rebuild"""
+        seed_sample_data(SeedConfig(students=60, days=4, tracked_fraction=0.5, seed=11))
+        for stress, date in [(9, '2025-03-01 08:00:00'), (None, '2025-03-01 09:00:00')]:
+            self._record(3, stress, date)
+
+        conn = get_db_connection()
+        conn.execute("DELETE FROM wellbeing_records WHERE id = (SELECT MIN(id) FROM wellbeing_records)")
+        conn.commit()
+        c = conn.cursor()
+        snapshot = lambda: [tuple(r) for r in c.execute(
+            'SELECT * FROM wellbeing_student_daily_rollup ORDER BY student_id, day').fetchall()]
+        incremental = snapshot()
+        rebuild_derived(c)
+        assert snapshot() == incremental
+        conn.close()
+
+    def test_table_versions_bump_on_write(self, temp_db):
+        """Test that writes bump only the written table's version"""
+        conn = get_db_connection()
+        c = conn.cursor()
+        read = lambda: dict(c.execute('SELECT table_name, version FROM table_versions').fetchall())
+        before = read()
+        conn.close()
+
+        self._record(1, 5, '2025-01-01 10:00:00')
+
+        conn = get_db_connection()
+        c = conn.cursor()
+        after = read()
+        assert after['wellbeing_records'] == before['wellbeing_records'] + 1
+        assert after['grades'] == before['grades']
+        conn.close()
@@ -0,0 +1,134 @@
+"""
+Test cases for CSV export endpoints
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from flask_jwt_extended import create_access_token
+from database import init_db, get_db_connection
+import database
+import csv
+import gzip
+import io
+import json
+
+
+@pytest.fixture
+def client():
+    """Create test client"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def export_db(tmp_path, monkeypatch):
+    """Temporary database with two cohorts and a few records each"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'exports.db'))
+    init_db()
+    conn = get_db_connection()
+    conn.executemany('''INSERT INTO students (id, student_id, first_name, last_name, email, enrolled_date)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     [(1, 'STU10001', 'Emma', 'Smith', 'emma@university.edu', '2024-09-01 09:00:00'),
+                      (2, 'STU10002', 'Liam', 'Jones', 'liam@university.edu', '2025-09-01 09:00:00')])
+    conn.execute("INSERT INTO assignments (id, title, due_date) VALUES (1, 'Essay', '2025-01-01')")
+    conn.executemany('INSERT INTO attendance (student_id, class_date, present) VALUES (?, ?, ?)',
+                     [(1, '2025-10-01', 1), (2, '2025-10-01', 0), (1, '2025-10-02', 1),
+                      (2, '2025-10-03', 1), (1, '2025-11-01', 0)])
+    conn.executemany('''INSERT INTO wellbeing_records (student_id, stress_level, mood, recorded_date)
+                        VALUES (?, ?, ?, ?)''',
+                     [(1, 4, 'fine, thanks', '2025-10-01 08:00:00'),
+                      (2, 9, 'stressed', '2025-10-02 23:59:00')])
+    conn.executemany('INSERT INTO grades (student_id, assignment_id, grade) VALUES (?, ?, ?)',
+                     [(1, 1, 80), (2, 1, 60)])
+    conn.execute("UPDATE wellbeing_records SET mental_health_notes = 'private' WHERE student_id = 1")
+    conn.executemany('INSERT INTO users (id, username, password, email, role) VALUES (?, ?, ?, ?, ?)',
+                     [(1, 'lead', '-', 'lead@university.edu', 'course_lead'),
+                      (2, 'STU10001', '-', 'emma@university.edu', 'student')])
+    conn.commit()
+    conn.close()
+    yield
+
+
+def bearer(user_id):
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+
+@pytest.fixture
+def staff(client, export_db):
+    """Send the course lead's token with every request"""
+    client.environ_base['HTTP_AUTHORIZATION'] = bearer(1)['Authorization']
+    yield
+    client.environ_base.pop('HTTP_AUTHORIZATION', None)
+
+
+def read_csv(response):
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+class TestExports:
+    """Test streamed CSV exports"""
+
+    def test_export_attendance_date_range(self, client, staff):
+        """Test that from/to are inclusive and rows come out in date order"""
+        response = client.get('/api/export/attendance.csv?from=2025-10-01&to=2025-10-02')
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == 'text/csv'
+        assert 'attendance_2025-10-01_2025-10-02.csv' in response.headers['Content-Disposition']
+
+        rows = read_csv(response)
+        assert [(r['student_code'], r['class_date'], r['present']) for r in rows] == [
+            ('STU10001', '2025-10-01', '1'),
+            ('STU10002', '2025-10-01', '0'),
+            ('STU10001', '2025-10-02', '1'),
+        ]
+
+    def test_export_wellbeing_cohort(self, client, staff):
+        """Test that the cohort filter selects students by enrolment year"""
+        rows = read_csv(client.get('/api/export/wellbeing.csv?cohort=2025&to=2025-10-02'))
+        assert len(rows) == 1
+        assert rows[0]['first_name'] == 'Liam'
+        assert rows[0]['stress_level'] == '9'
+
+        rows = read_csv(client.get('/api/export/wellbeing.csv'))
+        assert rows[0]['mood'] == 'fine, thanks'
+
+    def test_export_grades_and_performance(self, client, staff):
+        """Test grade and per-student analytics exports"""
+        grades = read_csv(client.get('/api/export/grades.csv'))
+        assert {r['assignment_title'] for r in grades} == {'Essay'}
+
+        performance = read_csv(client.get('/api/export/performance.csv?cohort=2024'))
+        assert [r['id'] for r in performance] == ['1']
+        assert float(performance[0]['attendance_rate']) == pytest.approx(2 / 3)
+
+    def test_export_gzip(self, client, staff):
+        """Test that exports are compressed for clients that accept it"""
+        response = client.get('/api/export/attendance.csv', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert len(gzip.decompress(response.data).splitlines()) == 6
+
+    def test_export_rejects_bad_requests(self, client, staff):
+        """Test unknown datasets and malformed filters"""
+        assert client.get('/api/export/users.csv').status_code == 404
+        response = client.get('/api/export/attendance.csv?from=01-10-2025')
+        assert response.status_code == 400
+        assert 'from' in json.loads(response.data)['error']
+        assert client.get('/api/export/performance.csv?from=2025-10-01').status_code == 400
+
+    def test_export_requires_staff(self, client, export_db):
+        """Test that exports need a staff token"""
+        assert client.get('/api/export/attendance.csv').status_code == 401
+        response = client.get('/api/export/attendance.csv', headers=bearer(2))
+        assert response.status_code == 403
+
+    def test_export_wellbeing_leaves_out_notes(self, client, staff):
+        """Test that free-text notes never leave in a bulk export"""
+        response = client.get('/api/export/wellbeing.csv')
+        assert 'mental_health_notes' not in read_csv(response)[0]
+        assert 'private' not in response.get_data(as_text=True)
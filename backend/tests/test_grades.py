@@ -0,0 +1,162 @@
+"""
+Test cases for grades endpoints
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from database import init_db, get_db_connection
+import database
+import json
+
+
+@pytest.fixture
+def client():
+    """Create test client"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def setup_db():
+    """Setup test database"""
+    init_db()
+    yield
+
+
+@pytest.fixture
+def gradebook_db(tmp_path, monkeypatch):
+    """Temporary database with two students, their grades and attendance"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'grades.db'))
+    init_db()
+    conn = get_db_connection()
+    conn.executemany('''INSERT INTO students (id, student_id, first_name, last_name, email)
+                        VALUES (?, ?, ?, ?, ?)''',
+                     [(1, 'STU10001', 'Emma', 'Smith', 'emma@university.edu'),
+                      (2, 'STU10002', 'Liam', 'Jones', 'liam@university.edu')])
+    conn.executemany("INSERT INTO assignments (id, title, due_date) VALUES (?, ?, '2025-01-01')",
+                     [(1, 'Essay'), (2, 'Exam')])
+    conn.executemany('INSERT INTO grades (student_id, assignment_id, grade) VALUES (?, ?, ?)',
+                     [(1, 1, 80), (1, 2, 60), (2, 1, 90)])
+    # Emma attends 3 of 4 classes, Liam 1 of 2
+    conn.executemany("INSERT INTO attendance (student_id, class_date, present) VALUES (?, date('now', ?), ?)",
+                     [(1, '-1 days', 1), (1, '-2 days', 1), (1, '-3 days', 1), (1, '-4 days', 0),
+                      (2, '-1 days', 1), (2, '-2 days', 0)])
+    conn.commit()
+    conn.close()
+    yield
+
+
+class TestGradesEndpoints:
+    """Test grades endpoints"""
+
+    def test_record_grade(self, client, setup_db):
+        """Test recording a grade"""
+        response = client.post('/api/grades/record',
+            data=json.dumps({
+                'student_id': 1,
+                'assignment_id': 1,
+                'grade': 72,
+                'feedback': 'Good work'
+            }),
+            content_type='application/json'
+        )
+        assert response.status_code == 201
+        assert 'grade_id' in json.loads(response.data)
+
+    def test_record_grade_missing_fields(self, client, setup_db):
+        """Test recording a grade without an assignment"""
+        response = client.post('/api/grades/record',
+            data=json.dumps({'student_id': 1, 'grade': 72}),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+
+    def test_get_grade_statistics(self, client, setup_db):
+        """Test fetching grade statistics"""
+        response = client.get('/api/grades/statistics')
+        assert response.status_code == 200
+        assert 'class_average' in json.loads(response.data)
+
+
+class TestGradesAnalytics:
+    """Test grade/attendance analytics against known data"""
+
+    def test_performance_by_attendance_rates(self, client, gradebook_db):
+        """Test that attendance rates are not skewed by the number of grades"""
+        response = client.get('/api/grades/performance-by-attendance')
+        rows = {row['id']: row for row in json.loads(response.data)}
+
+        assert rows[1]['avg_grade'] == 70
+        assert rows[1]['attendance_rate'] == 0.75
+        assert rows[1]['total_attendance_records'] == 4
+        assert rows[2]['avg_grade'] == 90
+        assert rows[2]['attendance_rate'] == 0.5
+
+    def test_correlation_counts_each_class_once(self, client, gradebook_db):
+        """Test that a student with two grades still has four classes"""
+        response = client.get('/api/attendance/attendance-grades-correlation?days=30')
+        rows = {row['id']: row for row in json.loads(response.data)}
+
+        assert rows[1]['total_classes'] == 4
+        assert rows[1]['present_count'] == 3
+        assert rows[1]['min_grade'] == 60 and rows[1]['max_grade'] == 80
+        assert rows[2]['total_classes'] == 2
+
+
+class TestGradesBatch:
+    """Test recording a grade sheet at once"""
+
+    def test_record_grade_batch(self, client, gradebook_db):
+        """Test that a grade sheet is stored and feeds the statistics"""
+        response = client.post('/api/grades/record-batch',
+            data=json.dumps([
+                {'student_id': 1, 'assignment_id': 2, 'grade': 70, 'feedback': 'Better'},
+                {'student_id': 2, 'assignment_id': 2, 'grade': '85.5'},
+            ]),
+            content_type='application/json'
+        )
+        assert response.status_code == 201
+        assert json.loads(response.data)['inserted'] == 2
+
+        response = client.get('/api/grades/assignment/2')
+        grades = {g['student_id']: g['grade'] for g in json.loads(response.data)}
+        assert grades[2] == 85.5
+
+    def test_unknown_assignment_rejected(self, client, gradebook_db):
+        """Test that grades for a missing assignment are reported per row"""
+        response = client.post('/api/grades/record-batch',
+            data=json.dumps([
+                {'student_id': 1, 'assignment_id': 3, 'grade': 70},
+                {'student_id': 2, 'assignment_id': 1},
+            ]),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+        errors = json.loads(response.data)['errors']
+        assert errors == [{'index': 0, 'error': 'Unknown assignment 3'},
+                          {'index': 1, 'error': 'grade is required'}]
+
+
+class TestGradesImport:
+    """Test importing gradebooks from CSV"""
+
+    def test_import_gradebook_body(self, client, gradebook_db):
+        """Test that a raw CSV body is imported with per-line rejects"""
+        body = ('﻿student_id,assignment_id,grade,feedback\n'
+                'STU10002,2,75,"Solid, well argued"\n'
+                'STU10001,9,50,\n'
+                'STU10001,2,,\n')
+        response = client.post('/api/grades/import', data=body.encode(), content_type='text/csv')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert (data['imported'], data['rejected']) == (1, 2)
+        assert data['rejects'] == [{'line': 3, 'error': 'Unknown assignment 9'},
+                                   {'line': 4, 'error': 'grade is required'}]
+
+        grades = json.loads(client.get('/api/grades/student/2').data)
+        assert {'grade': 75.0, 'feedback': 'Solid, well argued'}.items() <= \
+            next(g for g in grades if g['assignment_title'] == 'Exam').items()
@@ -0,0 +1,128 @@
+"""
+Test cases for the background job scheduler
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from database import init_db, get_db_connection
+from scheduler import Job, Scheduler
+import scheduler
+import database
+import json
+import time
+
+
+@pytest.fixture
+def client():
+    """Create test client"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    """Temporary database for job runs"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'jobs.db'))
+    init_db()
+    yield
+
+
+def counting_job(calls):
+    def func(conn):
+        calls.append(time.monotonic())
+        return {'calls': len(calls)}
+    return func
+
+
+class TestScheduler:
+    """Test job registry, leases and metrics"""
+
+    def test_run_records_metrics(self, job_db):
+        """Test that a run updates in-process stats and the job's row"""
+        calls = []
+        runner = Scheduler({'count': Job('count', counting_job(calls), interval=60)})
+
+        assert runner.run_job('count')
+        assert runner.run_job('count')
+        stats = runner.to_dict()['jobs']['count']
+        assert (stats['runs'], stats['failures']) == (2, 0)
+        assert stats['last_result'] == {'calls': 2}
+        assert stats['max_ms'] >= stats['last_ms'] >= 0
+
+        status = scheduler.job_status()['count']
+        assert (status['runs'], status['running'], status['owner']) == (2, 0, None)
+
+    def test_lease_allows_a_single_runner(self, job_db):
+        """Test that a second runner skips a job while the lease is held"""
+        calls = []
+        jobs = {'count': Job('count', counting_job(calls), interval=60)}
+        first, second = Scheduler(jobs, owner='first'), Scheduler(jobs, owner='second')
+
+        conn = get_db_connection()
+        assert first._acquire(conn, jobs['count'])
+        conn.close()
+        assert not second.run_job('count')
+        assert second.to_dict()['jobs']['count']['skipped'] == 1
+        assert calls == []
+
+        # An expired lease can be taken over
+        conn = get_db_connection()
+        conn.execute("UPDATE scheduled_jobs SET lease_expires = 0 WHERE name = 'count'")
+        conn.commit()
+        conn.close()
+        assert second.run_job('count')
+
+    def test_failures_release_the_lease(self, job_db):
+        """Test that a failing job is recorded and can run again"""
+        def broken(conn):
+            raise RuntimeError('boom')
+
+        runner = Scheduler({'broken': Job('broken', broken, interval=60)})
+        assert runner.run_job('broken')
+        assert runner.run_job('broken')
+        stats = runner.to_dict()['jobs']['broken']
+        assert stats['failures'] == 2
+        assert stats['last_error'] == 'RuntimeError: boom'
+        assert scheduler.job_status()['broken']['failures'] == 2
+
+    def test_background_thread_runs_due_jobs(self, job_db):
+        """Test that the scheduler thread runs jobs at their interval"""
+        calls = []
+        runner = Scheduler({'count': Job('count', counting_job(calls), interval=0.05, jitter=0.2)})
+        runner.start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(calls) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            runner.stop(timeout=5)
+        assert len(calls) >= 3
+        gaps = [b - a for a, b in zip(calls, calls[1:])]
+        assert min(gaps) >= 0.04 * 0.8 - 0.005
+
+    def test_jitter_bounds(self):
+        """Test that delays stay within the jitter fraction"""
+        job = Job('count', None, interval=100, jitter=0.1)
+        delays = [job.next_delay() for _ in range(200)]
+        assert all(90 <= d <= 110 for d in delays)
+        assert len(set(delays)) > 1
+
+    def test_alert_rules_job(self, client, job_db):
+        """Test that the registered alert job evaluates new records"""
+        conn = get_db_connection()
+        conn.execute('''INSERT INTO students (id, student_id, first_name, last_name, email)
+                        VALUES (1, 'STU10001', 'Emma', 'Smith', 'emma@university.edu')''')
+        conn.execute('INSERT INTO wellbeing_records (student_id, stress_level, sleep_level) VALUES (1, 9, 6)')
+        conn.commit()
+        conn.close()
+
+        runner = Scheduler({'alert_rules': scheduler.registry['alert_rules']})
+        assert runner.run_job('alert_rules')
+        assert runner.to_dict()['jobs']['alert_rules']['last_result']['alerts_created'] == 1
+
+        metrics = json.loads(client.get('/api/metrics').data)
+        assert metrics['scheduler']['jobs']['alert_rules']['runs'] == 1
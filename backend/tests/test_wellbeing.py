@@ -8,7 +8,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app
 from database import init_db, get_db_connection
+import database
+import gzip
 import json
+import zlib
 
 
 @pytest.fixture
@@ -149,3 +152,194 @@ class TestWellbeingEndpoints:
         for student in data['students']:
             name = f"{student['first_name']} {student['last_name']} {student['email']}"
             assert 'emma' in name.lower()
+
+
+@pytest.fixture
+def student_db(tmp_path, monkeypatch):
+    """Temporary database holding a handful of students"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'wellbeing.db'))
+    init_db()
+    conn = get_db_connection()
+    conn.executemany('''INSERT INTO students (id, student_id, first_name, last_name, email)
+                        VALUES (?, ?, ?, ?, ?)''',
+                     [(1, 'STU10001', 'Emma', 'Smith', 'emma.smith1@university.edu'),
+                      (2, 'STU10002', 'Liam', 'Jones', 'liam.jones2@university.edu'),
+                      (3, 'STU10003', 'Olivia', 'Brown', 'olivia.brown3@university.edu')])
+    conn.commit()
+    conn.close()
+    yield
+
+
+class TestStudentsStatus:
+    """Test the students-status view against known data"""
+
+    def test_status_shows_latest_submission(self, client, student_db):
+        """Test that status reflects each student's most recent survey"""
+        for stress in (3, 6):
+            client.post('/api/wellbeing/record',
+                data=json.dumps({'student_id': 2, 'sleep_level': 7, 'stress_level': stress, 'mood': 'calm'}),
+                content_type='application/json'
+            )
+
+        response = client.get('/api/wellbeing/students-status?page=1&per_page=10')
+        students = {s['student_id']: s for s in json.loads(response.data)['students']}
+
+        assert students['STU10002']['latest_stress'] == 6
+        assert students['STU10002']['has_filled_today'] == 1
+        assert students['STU10001']['has_filled_today'] == 0
+        assert students['STU10001']['latest_stress'] is None
+
+    def test_search_total_follows_updates(self, client, student_db):
+        """Test that a cached search total is dropped when a student is renamed or removed"""
+        url = '/api/wellbeing/students-status?search=Emma&page=1&per_page=10'
+        assert json.loads(client.get(url).data)['total'] == 1
+
+        for sql, total in (("UPDATE students SET first_name = 'Emma' WHERE id = 2", 2),
+                           ('DELETE FROM students WHERE id = 1', 1)):
+            conn = get_db_connection()
+            conn.execute(sql)
+            conn.commit()
+            conn.close()
+            assert json.loads(client.get(url).data)['total'] == total
+
+    def test_stress_charts_read_rollups(self, client, student_db):
+        """Test that chart endpoints aggregate today's submissions"""
+        for student_id, stress in ((1, 4), (1, 6), (3, 8)):
+            client.post('/api/wellbeing/record',
+                data=json.dumps({'student_id': student_id, 'sleep_level': 6, 'stress_level': stress}),
+                content_type='application/json'
+            )
+
+        over_time = json.loads(client.get('/api/wellbeing/stress-over-time?days=7').data)
+        assert over_time[-1]['avg_stress'] == 6.0
+
+        heatmap = {row['id']: row for row in json.loads(client.get('/api/wellbeing/heatmap-data').data)}
+        assert heatmap[1]['avg_stress'] == 5.0
+        assert heatmap[1]['record_count'] == 2
+        assert heatmap[3]['min_sleep'] == 6
+        assert 2 not in heatmap
+
+    def test_search_uses_full_text_index(self, client, student_db):
+        """Test substring search through the trigram index"""
+        response = client.get('/api/wellbeing/students-status?search=liam.jon&page=1&per_page=10')
+        data = json.loads(response.data)
+        assert data['total'] == 1
+        assert data['students'][0]['student_id'] == 'STU10002'
+
+        response = client.get('/api/wellbeing/students-status?search=STU1000&page=1&per_page=10')
+        assert json.loads(response.data)['total'] == 3
+
+    def test_search_index_follows_updates(self, client, student_db):
+        """Test that renamed students are found under their new name"""
+        conn = get_db_connection()
+        conn.execute("UPDATE students SET last_name = 'Zephyrine' WHERE id = 3")
+        conn.commit()
+        conn.close()
+
+        response = client.get('/api/wellbeing/students-status?search=zephyr&page=1&per_page=10')
+        data = json.loads(response.data)
+        assert [s['id'] for s in data['students']] == [3]
+
+    def test_short_search_falls_back_to_like(self, client, student_db):
+        """Test that terms too short for trigrams still match"""
+        response = client.get('/api/wellbeing/students-status?search=em&page=1&per_page=10')
+        names = [s['first_name'] for s in json.loads(response.data)['students']]
+        assert 'Emma' in names
+
+    def test_cursor_pagination_walks_all_students(self, client, student_db):
+        """Test that following next_cursor visits every student once in name order"""
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = client.get(f'/api/wellbeing/students-status?per_page=2&after={cursor}')
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            seen += [s['last_name'] for s in data['students']]
+            cursor = data['next_cursor']
+
+        assert seen == ['Brown', 'Jones', 'Smith']
+
+    def test_cursor_pagination_matches_page_numbers(self, client, student_db):
+        """Test that the cursor from page 1 leads to the same rows as page 2"""
+        first = json.loads(client.get('/api/wellbeing/students-status?page=1&per_page=1').data)
+        by_page = json.loads(client.get('/api/wellbeing/students-status?page=2&per_page=1').data)
+        by_cursor = json.loads(client.get(
+            f"/api/wellbeing/students-status?per_page=1&after={first['next_cursor']}").data)
+        assert by_cursor['students'] == by_page['students']
+
+    def test_invalid_cursor_rejected(self, client, student_db):
+        """Test that a malformed cursor is a client error"""
+        response = client.get('/api/wellbeing/students-status?after=not-a-cursor')
+        assert response.status_code == 400
+
+    def test_columnar_format(self, client, student_db):
+        """Test that ?format=columnar sends each key once"""
+        for student_id, stress in ((1, 4), (3, 8)):
+            client.post('/api/wellbeing/record',
+                data=json.dumps({'student_id': student_id, 'sleep_level': 6, 'stress_level': stress}),
+                content_type='application/json'
+            )
+
+        rows = json.loads(client.get('/api/wellbeing/heatmap-data').data)
+        response = client.get('/api/wellbeing/heatmap-data?format=columnar')
+        data = json.loads(response.data)
+
+        assert data['columns'] == list(rows[0].keys())
+        assert data['data']['id'] == [row['id'] for row in rows]
+        assert data['data']['avg_stress'] == [row['avg_stress'] for row in rows]
+
+    def test_gzip_negotiation(self, client, student_db):
+        """Test that large streamed bodies are gzipped when accepted"""
+        plain = client.get('/api/wellbeing/students-status?per_page=50')
+        for i in range(60):
+            client.post('/api/wellbeing/record',
+                data=json.dumps({'student_id': 1 + i % 3, 'sleep_level': 6, 'stress_level': 5}),
+                content_type='application/json'
+            )
+
+        response = client.get('/api/wellbeing/stress-over-time?student_id=1&days=7',
+                              headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert len(json.loads(gzip.decompress(response.data))) == 20
+
+        response = client.get('/api/wellbeing/stress-over-time?student_id=1&days=7',
+                              headers={'Accept-Encoding': 'deflate'})
+        assert response.headers['Content-Encoding'] == 'deflate'
+        assert len(json.loads(zlib.decompress(response.data))) == 20
+
+        assert 'Content-Encoding' not in plain.headers
+
+    def test_record_batch_raises_alerts_in_bulk(self, client, student_db):
+        """Test that a survey batch is stored with its alerts in one go"""
+        response = client.post('/api/wellbeing/record-batch',
+            data=json.dumps([
+                {'student_id': 1, 'sleep_level': 7, 'stress_level': 3},
+                {'student_id': 2, 'sleep_level': 2, 'stress_level': 9, 'mood': 'anxious'},
+                {'student_id': 3, 'sleep_level': 3, 'stress_level': 5, 'comments': 'Tired'},
+            ]),
+            content_type='application/json'
+        )
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data['inserted'] == 3
+        assert data['alerts_created'] == 3
+
+        conn = get_db_connection()
+        alerts = conn.execute('SELECT student_id, alert_type FROM alerts ORDER BY id').fetchall()
+        notes = conn.execute('SELECT mental_health_notes FROM wellbeing_records WHERE student_id = 3').fetchone()[0]
+        conn.close()
+        assert [tuple(a) for a in alerts] == [(2, 'high_stress'), (2, 'low_sleep'), (3, 'low_sleep')]
+        assert notes == 'Comments: Tired'
+
+        status = json.loads(client.get('/api/wellbeing/students-status').data)
+        assert all(s['has_filled_today'] for s in status['students'])
+
+    def test_record_batch_validates_levels(self, client, student_db):
+        """Test that out-of-range levels reject the batch"""
+        response = client.post('/api/wellbeing/record-batch',
+            data=json.dumps([{'student_id': 1, 'stress_level': 11}]),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+        assert json.loads(response.data)['errors'][0]['index'] == 0
@@ -0,0 +1,124 @@
+"""
+Test cases for the group-commit write queue
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from database import init_db, get_db_connection
+from write_queue import WriteQueue, QueueFull
+import write_queue
+import database
+import json
+import threading
+
+
+@pytest.fixture
+def client():
+    """Create test client"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def queue_db(tmp_path, monkeypatch):
+    """Temporary database with one student"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'queue.db'))
+    init_db()
+    conn = get_db_connection()
+    conn.execute('''INSERT INTO students (id, student_id, first_name, last_name, email)
+                    VALUES (1, 'STU10001', 'Emma', 'Smith', 'emma@university.edu')''')
+    conn.commit()
+    conn.close()
+    yield
+
+
+def insert_alert(message):
+    def write(c):
+        c.execute("INSERT INTO alerts (student_id, alert_type, message) VALUES (1, 'note', ?)", (message,))
+        return c.lastrowid
+    return write
+
+
+class TestWriteQueue:
+    """Test batching, per-write failures and backpressure"""
+
+    def test_concurrent_writes_share_commits(self, queue_db):
+        """Test that simultaneous submissions are committed in few batches"""
+        queue = WriteQueue(max_delay_ms=50)
+        try:
+            futures = [queue.submit(insert_alert(f'm{i}')) for i in range(100)]
+            ids = [f.result(timeout=10) for f in futures]
+        finally:
+            queue.close(timeout=10)
+
+        assert ids == sorted(ids) and len(set(ids)) == 100
+        stats = queue.stats()
+        assert stats['writes'] == 100
+        assert stats['batches'] < 10
+
+        conn = get_db_connection()
+        assert conn.execute('SELECT COUNT(*) FROM alerts').fetchone()[0] == 100
+        conn.close()
+
+    def test_failing_write_fails_alone(self, queue_db):
+        """Test that one bad write is rolled back without its batch"""
+        def broken(c):
+            c.execute("INSERT INTO alerts (student_id, alert_type, message) VALUES (1, 'note', 'partial')")
+            raise ValueError('bad row')
+
+        queue = WriteQueue(max_delay_ms=50)
+        try:
+            good = queue.submit(insert_alert('kept'))
+            bad = queue.submit(broken)
+            also_good = queue.submit(insert_alert('also kept'))
+            assert good.result(timeout=10) and also_good.result(timeout=10)
+            with pytest.raises(ValueError):
+                bad.result(timeout=10)
+        finally:
+            queue.close(timeout=10)
+
+        conn = get_db_connection()
+        messages = [r[0] for r in conn.execute('SELECT message FROM alerts ORDER BY id')]
+        conn.close()
+        assert messages == ['kept', 'also kept']
+        assert queue.stats()['failed_writes'] == 1
+
+    def test_full_queue_rejects(self, queue_db):
+        """Test that submissions fail fast when the writer is behind"""
+        release = threading.Event()
+        queue = WriteQueue(max_batch=1, max_pending=1)
+        try:
+            blocked = queue.submit(lambda c: release.wait(10))
+            # Only fits once the writer has taken the blocked write
+            queue.submit(insert_alert('waiting'))
+            with pytest.raises(QueueFull):
+                queue.submit(insert_alert('rejected'), timeout=0.05)
+        finally:
+            release.set()
+            queue.close(timeout=10)
+        assert blocked.result(timeout=10) is True
+
+    def test_write_behind_survey(self, client, queue_db, monkeypatch):
+        """Test that survey submissions go through the queue in write-behind mode"""
+        monkeypatch.setattr(write_queue, 'WRITE_BEHIND', True)
+        monkeypatch.setattr(write_queue, '_queues', {})
+        try:
+            response = client.post('/api/wellbeing/record',
+                data=json.dumps({'student_id': 1, 'sleep_level': 2, 'stress_level': 9}),
+                content_type='application/json'
+            )
+            assert response.status_code == 201
+            record_id = json.loads(response.data)['record_id']
+            assert write_queue.stats()['wellbeing']['writes'] == 1
+        finally:
+            write_queue.close_all()
+
+        conn = get_db_connection()
+        assert conn.execute('SELECT id FROM wellbeing_records').fetchone()[0] == record_id
+        alerts = {r[0] for r in conn.execute('SELECT alert_type FROM alerts WHERE student_id = 1')}
+        conn.close()
+        assert alerts == {'high_stress', 'low_sleep'}
@@ -0,0 +1,88 @@
+"""
+HTTP validators (ETag / Last-Modified) driven by per-table change versions.
+
+Triggers bump table_versions on every write, so a GET can tell whether the
+client's copy is current with a single primary-key lookup and answer 304
+without running its query or serializing a body. Versions live in the
+database, so every worker process agrees on them.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, g, request
+import database
+
+
+def read_versions(tables):
+    """Return ({table: version}, last modified datetime) for `tables`"""
+    conn = database.get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f'''SELECT table_name, version, updated_at FROM table_versions
+                      WHERE table_name IN ({', '.join('?' * len(tables))})''', list(tables))
+        rows = c.fetchall()
+    finally:
+        conn.close()
+
+    versions = {row['table_name']: row['version'] for row in rows}
+    stamps = [row['updated_at'] for row in rows if row['updated_at']]
+    modified = None
+    if stamps:
+        modified = datetime.strptime(max(stamps), '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return versions, modified
+
+
+def request_versions(tables):
+    """{table: version} for `tables`, read at most once per request
+
+    conditional() and the response cache both go through this, so a cached
+    body is always keyed on the same versions as the ETag sent with it.
+    """
+    known = g.setdefault('table_versions', {})
+    missing = [t for t in tables if t not in known]
+    if missing:
+        versions, _ = read_versions(missing)
+        known.update({t: versions.get(t, 0) for t in missing})
+    return {t: known[t] for t in tables}
+
+
+def make_etag(versions):
+    """Weak ETag for the current URL at the given table versions
+
+    Includes today's date because several views use date('now') windows.
+    """
+    today = datetime.now(timezone.utc).date().isoformat()
+    raw = repr((database.DB_PATH, request.full_path, sorted(versions.items()), today))
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def conditional(*tables):
+    """Add ETag/Last-Modified to a GET view and answer a matching
+    If-None-Match with 304"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions, modified = read_versions(tables)
+            g.setdefault('table_versions', {}).update({t: versions.get(t, 0) for t in tables})
+            etag = make_etag(versions)
+
+            # If-Modified-Since is not honoured: updated_at only has second
+            # resolution and ignores the date the ETag folds in, so a write
+            # in the same second would be answered with a stale 304
+            not_modified = bool(request.if_none_match and request.if_none_match.contains_weak(etag))
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if modified:
+                response.last_modified = modified
+            # Let browsers keep the body but revalidate before reusing it
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,195 @@
+"""
+Group-commit write queue.
+
+Request threads submit small write functions and wait on a future. A single
+writer thread collects whatever has been submitted within MAX_DELAY_MS (up to
+MAX_BATCH writes), runs the batch in one transaction and commits once, so
+a surge costs one fsync and one write-lock acquisition per batch instead of
+per request. Each write runs under its own savepoint: a failing write fails
+only its own future.
+
+Enable write-behind for survey submissions with WRITE_BEHIND=1.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from database import get_db_connection
+
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '0') == '1'
+MAX_BATCH = int(os.environ.get('WRITE_QUEUE_MAX_BATCH', 500))
+MAX_DELAY_MS = float(os.environ.get('WRITE_QUEUE_MAX_DELAY_MS', 5))
+MAX_PENDING = int(os.environ.get('WRITE_QUEUE_MAX_PENDING', 10000))
+
+# How long a request waits for room in the queue or for its commit
+SUBMIT_TIMEOUT = 2.0
+RESULT_TIMEOUT = 30.0
+
+
+class QueueFull(RuntimeError):
+    """The writer is too far behind to accept more work"""
+
+
+class WriteQueue:
+    """Single writer thread that commits submitted writes in batches"""
+
+    def __init__(self, max_batch=MAX_BATCH, max_delay_ms=MAX_DELAY_MS,
+                 max_pending=MAX_PENDING, after_batch=None, after_commit=None):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.after_batch = after_batch      # after_batch(cursor) runs before the commit
+        self.after_commit = after_commit    # after_commit(after_batch result) runs after it
+        self._queue = queue.Queue(max_pending)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._writes = 0
+        self._failed_writes = 0
+        self._failed_batches = 0
+        self._max_batch_seen = 0
+        self._commit_ms = 0.0
+        self._max_commit_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+        self._thread.start()
+
+    def submit(self, write, timeout=SUBMIT_TIMEOUT):
+        """Queue `write(cursor)`; the future resolves to its return value once committed"""
+        if self._closed:
+            raise QueueFull('Write queue is closed')
+        future = Future()
+        try:
+            self._queue.put((write, future), timeout=timeout)
+        except queue.Full:
+            raise QueueFull('Write queue is full') from None
+        return future
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back for the outer loop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        start = time.perf_counter()
+        results = []
+        outcome = None
+        conn = None
+        try:
+            conn = get_db_connection()
+            c = conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+            for write, future in batch:
+                c.execute('SAVEPOINT queued_write')
+                try:
+                    results.append((future, write(c), None))
+                    c.execute('RELEASE queued_write')
+                except Exception as e:
+                    c.execute('ROLLBACK TO queued_write')
+                    c.execute('RELEASE queued_write')
+                    results.append((future, None, e))
+            if self.after_batch:
+                outcome = self.after_batch(c)
+            conn.commit()
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            with self._lock:
+                self._failed_batches += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            if conn is not None:
+                conn.close()
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        failed = sum(1 for _, _, error in results if error is not None)
+        with self._lock:
+            self._batches += 1
+            self._writes += len(batch) - failed
+            self._failed_writes += failed
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._commit_ms += elapsed_ms
+            self._max_commit_ms = max(self._max_commit_ms, elapsed_ms)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        if self.after_commit:
+            try:
+                self.after_commit(outcome)
+            except Exception:
+                pass
+
+    def close(self, timeout=None):
+        """Stop accepting writes, finish queued ones and stop the writer"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self._queue.qsize(),
+                'batches': self._batches,
+                'writes': self._writes,
+                'failed_writes': self._failed_writes,
+                'failed_batches': self._failed_batches,
+                'avg_batch': round(self._writes / self._batches, 2) if self._batches else 0.0,
+                'max_batch': self._max_batch_seen,
+                'avg_batch_ms': round(self._commit_ms / self._batches, 2) if self._batches else 0.0,
+                'max_batch_ms': round(self._max_commit_ms, 2),
+            }
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(name, after_batch=None, after_commit=None):
+    """The process-wide queue called `name`, started on first use"""
+    with _queues_lock:
+        q = _queues.get(name)
+        if q is None:
+            q = _queues[name] = WriteQueue(after_batch=after_batch, after_commit=after_commit)
+        return q
+
+
+def stats():
+    """Batch metrics for every started queue"""
+    with _queues_lock:
+        return {name: q.stats() for name, q in _queues.items()}
+
+
+@atexit.register
+def close_all():
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for q in queues:
+        q.close(timeout=RESULT_TIMEOUT)
@@ -0,0 +1,16 @@
+"""
+WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The schema is checked here rather than in create_app(): once in the gunicorn
+master when the app is preloaded, or once per worker otherwise. The pool the
+check used is closed again so forked workers never share a SQLite connection.
+"""
+from app import create_app
+from database import init_db, close_pool
+
+init_db()
+close_pool()
+
+app = create_app({'INIT_DB': False})
@@ -1,58 +1,124 @@
 import React, { useState, useEffect } from 'react';
-import { wellbeingAPI, alertsAPI } from '../utils/api';
+import { alertsAPI, ALERT_TYPE_GROUPS, nextAlertsCursor } from '../utils/api';
 import '../styles/Alerts.css';
 
 // filterType: 'wellbeing' (stress/sleep), 'attendance', or 'all'
 const AlertsList = ({ filterType = 'all', title }) => {
   const [alerts, setAlerts] = useState([]);
+  const [cursor, setCursor] = useState(null);
+  const [unreadCount, setUnreadCount] = useState(0);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
 
+  // Filtering happens on the server; the feed is paged
+  const alertTypes = ALERT_TYPE_GROUPS[filterType] || null;
+  const filterParams = alertTypes ? { alert_type: alertTypes.join(',') } : {};
+
   useEffect(() => {
-    fetchAlerts();
+    let stream = null;
+    let closed = false;
+
+    fetchAlerts().then((lastId) => {
+      if (closed || lastId === null) return;
+      // Push alerts raised or dismissed elsewhere instead of polling
+      stream = alertsAPI.streamAlerts(lastId);
+      stream.addEventListener('alert', (event) => {
+        const alert = JSON.parse(event.data);
+        if (matchesFilter(alert)) {
+          setAlerts((prev) => (prev.some((a) => a.id === alert.id) ? prev : [alert, ...prev]));
+          fetchCount();
+        }
+      });
+      stream.addEventListener('alert_read', (event) => {
+        const { ids } = JSON.parse(event.data);
+        setAlerts((prev) => prev.filter((a) => !ids.includes(a.id)));
+        fetchCount();
+      });
+      stream.addEventListener('resync', () => fetchAlerts());
+    });
+
+    return () => {
+      closed = true;
+      if (stream) stream.close();
+    };
   }, [filterType]);
 
+  const matchesFilter = (alert) => !alertTypes || alertTypes.includes(alert.alert_type);
+
+  // The badge counts every unread alert, not just the loaded page
+  const fetchCount = async () => {
+    try {
+      const { data } = await alertsAPI.getUnreadCounts();
+      setUnreadCount(alertTypes
+        ? alertTypes.reduce((sum, type) => sum + (data.by_type[type] || 0), 0)
+        : data.total);
+    } catch (err) {
+      console.error('Failed to load alert counts', err);
+    }
+  };
+
+  // Returns the newest alert id seen, for the stream to resume after
+  // (0 if there is none, so the stream starts at the newest alert)
   const fetchAlerts = async () => {
     try {
       setLoading(true);
-      const response = await alertsAPI.getUnreadAlerts();
-      let filteredAlerts = response.data || [];
+      const [response] = await Promise.all([
+        alertsAPI.getUnreadAlerts(filterParams),
+        fetchCount()
+      ]);
+      const unread = response.data || [];
       
-      // Filter based on type
-      if (filterType === 'wellbeing') {
-        filteredAlerts = filteredAlerts.filter(alert => 
-          alert.alert_type === 'high_stress' || 
-          alert.alert_type === 'low_sleep' ||
-          alert.alert_type === 'wellbeing'
-        );
-      } else if (filterType === 'attendance') {
-        filteredAlerts = filteredAlerts.filter(alert => 
-          alert.alert_type === 'low_attendance' || 
-          alert.alert_type === 'attendance' ||
-          alert.message?.toLowerCase().includes('attendance') ||
-          alert.message?.toLowerCase().includes('absent')
-        );
-      }
-      
-      setAlerts(filteredAlerts);
+      setAlerts(unread);
+      setCursor(nextAlertsCursor(response));
       setError(null);
+      return unread.reduce((max, alert) => Math.max(max, alert.id), 0);
     } catch (err) {
       setError('Failed to load alerts');
       console.error(err);
+      return null;
     } finally {
       setLoading(false);
     }
   };
 
+  const handleLoadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await alertsAPI.getUnreadAlerts({ ...filterParams, after: cursor });
+      setAlerts((prev) => {
+        const seen = new Set(prev.map((a) => a.id));
+        return [...prev, ...(response.data || []).filter((a) => !seen.has(a.id))];
+      });
+      setCursor(nextAlertsCursor(response));
+    } catch (err) {
+      console.error('Failed to load more alerts', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleMarkRead = async (alertId) => {
     try {
       await alertsAPI.markAlertRead(alertId);
       setAlerts((prev) => prev.filter((a) => a.id !== alertId));
+      fetchCount();
     } catch (err) {
       console.error('Failed to mark alert as read', err);
     }
   };
 
+  const handleMarkAllRead = async () => {
+    const ids = alerts.map((a) => a.id);
+    try {
+      await alertsAPI.markAlertsRead({ ids });
+      setAlerts((prev) => prev.filter((a) => !ids.includes(a.id)));
+      fetchCount();
+    } catch (err) {
+      console.error('Failed to mark alerts as read', err);
+    }
+  };
+
   const getAlertColor = (alertType) => {
     switch (alertType) {
       case 'high_stress':
@@ -92,7 +158,12 @@ const AlertsList = ({ filterType = 'all', title }) => {
     <div className="alerts-container">
       <div className="alerts-header">
         <h3>{getTitle()}</h3>
-        <span className="alert-count">{alerts.length} new</span>
+        <span className="alert-count">{unreadCount} new</span>
+        {alerts.length > 1 && (
+          <button className="dismiss-btn" onClick={handleMarkAllRead}>
+            ✓ Dismiss all
+          </button>
+        )}
       </div>
 
       {error && <div className="error">{error}</div>}
@@ -124,6 +195,11 @@ const AlertsList = ({ filterType = 'all', title }) => {
               </button>
             </div>
           ))}
+          {cursor && (
+            <button className="load-more-btn" onClick={handleLoadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -2,32 +2,31 @@ import React, { useState, useEffect } from 'react';
 import AbsentStudents from '../components/AbsentStudents';
 import AttendanceGradesChart from '../components/AttendanceGradesChart';
 import AlertsList from '../components/Alerts';
-import { attendanceAPI, alertsAPI } from '../utils/api';
+import { attendanceAPI, alertsAPI, ALERT_TYPE_GROUPS } from '../utils/api';
 import '../styles/Dashboard.css';
 
 const CourseLeadDashboard = () => {
   const [activeTab, setActiveTab] = useState('overview');
   const [summary, setSummary] = useState(null);
   const [attendanceAlerts, setAttendanceAlerts] = useState([]);
+  const [attendanceAlertCount, setAttendanceAlertCount] = useState(0);
   const [loading, setLoading] = useState(true);
   const username = localStorage.getItem('username');
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [summaryRes, alertsRes] = await Promise.all([
+        const attendanceTypes = ALERT_TYPE_GROUPS.attendance;
+        const [summaryRes, alertsRes, countsRes] = await Promise.all([
           attendanceAPI.getAttendanceSummary(),
-          alertsAPI.getUnreadAlerts()
+          // Only the newest few are shown; the badge uses the counters
+          alertsAPI.getUnreadAlerts({ alert_type: attendanceTypes.join(','), limit: 5 }),
+          alertsAPI.getUnreadCounts()
         ]);
         setSummary(summaryRes.data);
-        // Filter only attendance-related alerts
-        const filtered = (alertsRes.data || []).filter(alert => 
-          alert.alert_type === 'attendance' || 
-          alert.alert_type === 'low_attendance' ||
-          alert.message?.toLowerCase().includes('attendance') ||
-          alert.message?.toLowerCase().includes('absent')
-        );
-        setAttendanceAlerts(filtered);
+        setAttendanceAlerts(alertsRes.data || []);
+        setAttendanceAlertCount(attendanceTypes.reduce(
+          (sum, type) => sum + (countsRes.data.by_type[type] || 0), 0));
       } catch (err) {
         console.error('Failed to fetch data', err);
       } finally {
@@ -80,7 +79,7 @@ const CourseLeadDashboard = () => {
           className={`nav-btn ${activeTab === 'alerts' ? 'active' : ''}`}
           onClick={() => setActiveTab('alerts')}
         >
-          🔔 Alerts {attendanceAlerts.length > 0 && <span className="alert-count">{attendanceAlerts.length}</span>}
+          🔔 Alerts {attendanceAlertCount > 0 && <span className="alert-count">{attendanceAlertCount}</span>}
         </button>
       </nav>
 
@@ -118,7 +117,7 @@ const CourseLeadDashboard = () => {
               <h3>⚠️ Attendance Alerts</h3>
               {attendanceAlerts.length > 0 ? (
                 <ul className="alert-list">
-                  {attendanceAlerts.slice(0, 5).map((alert, idx) => (
+                  {attendanceAlerts.map((alert, idx) => (
                     <li key={idx} className="alert-item attendance-alert">
                       <span className="alert-icon">📉</span>
                       <span>{alert.message}</span>
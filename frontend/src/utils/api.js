@@ -59,12 +59,30 @@ export const gradesAPI = {
   getPerformanceByAttendance: () => apiClient.get('/grades/performance-by-attendance'),
 };
 
+// Alert types shown by the filtered alert panels
+export const ALERT_TYPE_GROUPS = {
+  wellbeing: ['high_stress', 'low_sleep', 'concerning_mood', 'wellbeing'],
+  attendance: ['low_attendance', 'attendance'],
+};
+
+// Cursor for the page after an unread alerts response, or null on the last page
+export const nextAlertsCursor = (response) => response.headers['x-next-cursor'] || null;
+
 export const alertsAPI = {
   createAlert: (studentId, alertType, message) =>
     apiClient.post('/alerts/create', { student_id: studentId, alert_type: alertType, message }),
   getStudentAlerts: (studentId, includeRead = false) =>
     apiClient.get(`/alerts/student/${studentId}?include_read=${includeRead}`),
-  getUnreadAlerts: () => apiClient.get('/alerts/unread'),
+  // params: limit, after (nextAlertsCursor of the previous page),
+  // alert_type (comma-separated), student_id
+  getUnreadAlerts: (params = {}) => apiClient.get('/alerts/unread', { params }),
+  getUnreadCounts: () => apiClient.get('/alerts/unread/counts'),
   markAlertRead: (alertId) => apiClient.put(`/alerts/mark-read/${alertId}`),
+  // filters: ids and/or student_id, alert_type, older_than (YYYY-MM-DD)
+  markAlertsRead: (filters) => apiClient.post('/alerts/mark-read', filters),
   checkWellbeingAlerts: () => apiClient.post('/alerts/check-wellbeing'),
+  // Server-Sent Events: 'alert', 'alert_read' and 'resync'. Without a
+  // sinceId the stream starts at the newest alert.
+  streamAlerts: (sinceId) => new EventSource(
+    sinceId ? `${API_BASE_URL}/alerts/stream?since_id=${sinceId}` : `${API_BASE_URL}/alerts/stream`),
 };